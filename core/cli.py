@@ -79,19 +79,21 @@ def change_hysteria2_sni(sni: str):
 
 
 @cli.command('backup-hysteria')
-def backup_hysteria2():
+@click.option('--incremental', is_flag=True, default=False, help='Only back up changes since the last backup when a recent full backup exists')
+def backup_hysteria2(incremental: bool):
     try:
-        cli_api.backup_hysteria2()
+        cli_api.backup_hysteria2(incremental)
         click.echo('Hysteria configuration backed up successfully.')
     except Exception as e:
         click.echo(f'{e}', err=True)
 
 @cli.command('restore-hysteria2')
 @click.argument('backup_file_path', type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
-def restore_hysteria2(backup_file_path):
+@click.option('--with-incrementals', is_flag=True, default=False, help='Also replay the incremental backups taken on top of this full backup')
+def restore_hysteria2(backup_file_path, with_incrementals: bool):
     """Restores Hysteria configuration from a backup ZIP file."""
     try:
-        cli_api.restore_hysteria2(backup_file_path)
+        cli_api.restore_hysteria2(backup_file_path, with_incrementals)
         click.echo('Hysteria configuration restored successfully.')
     except Exception as e:
         click.echo(f'{e}', err=True)
@@ -167,7 +169,7 @@ def bulk_user_add(traffic_gb: float, expiration_days: int, count: int, prefix: s
 def edit_user(username: str, new_username: str, new_password: str, new_traffic_limit: int, new_expiration_days: int, renew_password: bool, renew_creation_date: bool, blocked: bool | None, unlimited_ip: bool | None, note: str | None):
     try:
         cli_api.kick_users_by_name(username)
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_users_traffic([username])
         cli_api.edit_user(
             username=username, 
             new_username=new_username, 
@@ -206,12 +208,28 @@ def remove_user(usernames: tuple[str]):
     try:
         usernames_list = list(usernames)
         cli_api.kick_users_by_name(usernames_list)
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_users_traffic(usernames_list)
         cli_api.remove_users(usernames_list)
         click.echo(f"Users '{', '.join(usernames)}' removed successfully.")
     except Exception as e:
         click.echo(f'{e}', err=True)
 
+@cli.command('bulk-edit-users')
+@click.argument('operation', type=click.Choice(['block', 'unblock', 'extend', 'reset', 'set-quota']))
+@click.option('--users', '-u', multiple=True, help='Username to change (repeatable). Overrides the filters.')
+@click.option('--status', '-s', type=click.Choice(['Online', 'Offline', 'On-hold']), help='Only users with this status.')
+@click.option('--blocked', '-b', type=bool, help='Only blocked (true) or unblocked (false) users.')
+@click.option('--prefix', '-p', type=str, help='Only usernames starting with this prefix.')
+@click.option('--days', '-d', type=int, help='Days to add for extend.')
+@click.option('--traffic-gb', '-t', type=float, help='New traffic limit in GB for set-quota (0 for unlimited).')
+def bulk_edit_users(operation: str, users: tuple[str], status: str | None, blocked: bool | None, prefix: str | None, days: int | None, traffic_gb: float | None):
+    """Applies one change to many users at once."""
+    try:
+        res = cli_api.bulk_edit_users(operation, list(users), status, blocked, prefix, days, traffic_gb)
+        click.echo(f"Matched {res['matched']} users, modified {res['modified']}, kicked {res['kicked']}.")
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
 @cli.command('kick-user')
 @click.argument('usernames', nargs=-1, required=True)
 def kick_user(usernames: tuple[str]):
@@ -272,6 +290,44 @@ def traffic_status(no_gui):
         click.echo(f'{e}', err=True)
 
 
+@cli.command('traffic-rollup')
+@click.option('--since', '-s', required=False, help='Rebuild buckets from this time, e.g. 2h or 2024-05-01 (default: 2h)', type=str)
+def traffic_rollup(since: str | None):
+    """Downsamples traffic history from minutes to hours and days."""
+    try:
+        cli_api.traffic_rollup(since)
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
+@cli.command('traffic-history')
+@click.option('--username', '-u', required=True, help='Username to show history for', type=str)
+@click.option('--since', '-s', default='24h', help='Range start, e.g. 24h, 7d or 2024-05-01 (default: 24h)', type=str)
+@click.option('--until', required=False, help='Range end (default: now)', type=str)
+@click.option('--granularity', '-g', type=click.Choice(['minute', 'hour', 'day']), help='Bucket size (default: picked from the range)')
+def traffic_history(username: str, since: str, until: str | None, granularity: str | None):
+    """Shows a user's traffic over time."""
+    try:
+        res = cli_api.get_user_traffic_history(username, since, until, granularity)
+        pretty_print(res)
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
+@cli.command('traffic-top')
+@click.option('--since', '-s', required=False, help='Range start, e.g. 24h, 7d or 2024-05-01 (default: all time)', type=str)
+@click.option('--until', required=False, help='Range end (default: now)', type=str)
+@click.option('--limit', '-l', default=10, help='Number of users to show', type=int)
+@click.option('--by', '-b', type=click.Choice(['total', 'upload', 'download']), default='total', help='Sort key')
+def traffic_top(since: str | None, until: str | None, limit: int, by: str):
+    """Shows the users with the most traffic in a range."""
+    try:
+        res = cli_api.get_top_traffic_users(since, until, limit, by)
+        pretty_print(res)
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
 @cli.command('server-info')
 def server_info():
     try:
@@ -348,10 +404,11 @@ def node():
 @click.option('--pinSHA256', required=False, type=str, help='Optional: Public key SHA256 pin.')
 @click.option('--obfs', required=False, type=str, help='Optional: Obfuscation key.')
 @click.option('--insecure', is_flag=True, default=False, help='Optional: Skip certificate verification.')
-def add_node(name, ip, port, sni, pinsha256, obfs, insecure):
+@click.option('--health-url', required=False, type=str, help='Optional: HTTP URL probed instead of the UDP port.')
+def add_node(name, ip, port, sni, pinsha256, obfs, insecure, health_url):
     """Add a new external node."""
     try:
-        output = cli_api.add_node(name, ip, sni, pinSHA256=pinsha256, port=port, obfs=obfs, insecure=insecure)
+        output = cli_api.add_node(name, ip, sni, pinSHA256=pinsha256, port=port, obfs=obfs, insecure=insecure, health_url=health_url)
         click.echo(output.strip())
     except Exception as e:
         click.echo(f'{e}', err=True)
@@ -375,6 +432,16 @@ def list_nodes():
     except Exception as e:
         click.echo(f'{e}', err=True)
 
+@node.command('probe')
+@click.option('--timeout', required=False, type=float, help='Per-node probe timeout in seconds.')
+def probe_nodes(timeout):
+    """Probe all external nodes and refresh the health cache."""
+    try:
+        output = cli_api.probe_nodes(timeout)
+        click.echo(output.strip())
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
 @node.command('generate-cert')
 def generate_cert():
     """Generate a self-signed certificate for nodes."""
@@ -738,6 +805,18 @@ def change_webpanel_exp(minutes: int):
         click.echo(f'{e}', err=True)
 
 
+@cli.command('change-webpanel-workers')
+@click.option('--workers', '-w', required=True, help='Number of WebPanel worker processes', type=int)
+def change_webpanel_workers(workers: int):
+    """Changes the number of WebPanel worker processes."""
+    try:
+        cli_api.change_webpanel_workers(workers)
+        click.echo(f'WebPanel now runs with {workers} worker process(es).')
+        click.echo('WebPanel service has been restarted.')
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
 @cli.command('change-webpanel-root')
 @click.option('--path', '-p', required=False, help='New root path. If not provided, a random one will be generated.', type=str)
 def change_webpanel_root(path: str | None):
@@ -1,15 +1,28 @@
 import os
+import time
+import logging
+import threading
+import functools
 import subprocess
+from concurrent.futures import Future
+from collections import deque
+from dataclasses import dataclass, asdict
 from enum import Enum
+from contextlib import contextmanager
 from datetime import datetime
 import json
 from typing import Any, Optional
 from dotenv import dotenv_values
 import re
+import sys
 import secrets
 import string
 
-import traffic
+# Modules that cost a MongoDB connection or a heavy import tree (traffic, requests) are
+# imported inside the functions that need them, so short CLI calls don't pay for them.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import metrics
+import profiler
 
 DEBUG = False
 SCRIPT_DIR = '/etc/hysteria/core/scripts'
@@ -19,6 +32,11 @@ WEBPANEL_ENV_FILE = '/etc/hysteria/core/scripts/webpanel/.env'
 NORMALSUB_ENV_FILE = '/etc/hysteria/core/scripts/normalsub/.env'
 TELEGRAM_ENV_FILE = '/etc/hysteria/core/scripts/telegrambot/.env'
 NODES_JSON_PATH = "/etc/hysteria/nodes.json"
+RESTORE_PROGRESS_FILE = '/tmp/hysteria_restore_progress.json'
+# Touched whenever users change, so every process drops its cached user list.
+USERS_CHANGED_STAMP = '/tmp/blitz_users_changed'
+# How long list_users() serves a snapshot; 0 disables caching.
+USER_LIST_CACHE_TTL = float(os.getenv('USER_LIST_CACHE_TTL', '5'))
 
 
 class Command(Enum):
@@ -32,6 +50,7 @@ class Command(Enum):
     GET_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'get_user.py')
     ADD_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'add_user.py')
     BULK_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'bulk_users.py')
+    BULK_EDIT_USERS = os.path.join(SCRIPT_DIR, 'hysteria2', 'bulk_edit_users.py')
     EDIT_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'edit_user.py')
     RESET_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'reset_user.py')
     REMOVE_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'remove_user.py')
@@ -45,6 +64,7 @@ class Command(Enum):
     TRAFFIC_STATUS = 'traffic.py'  # won't be called directly (it's a python module)
     UPDATE_GEO = os.path.join(SCRIPT_DIR, 'hysteria2', 'update_geo.py')
     LIST_USERS = os.path.join(SCRIPT_DIR, 'hysteria2', 'list_users.py')
+    TRAFFIC_HISTORY = os.path.join(SCRIPT_DIR, 'hysteria2', 'traffic_history.py')
     SERVER_INFO = os.path.join(SCRIPT_DIR, 'hysteria2', 'server_info.py')
     BACKUP_HYSTERIA2 = os.path.join(SCRIPT_DIR, 'hysteria2', 'backup.py')
     RESTORE_HYSTERIA2 = os.path.join(SCRIPT_DIR, 'hysteria2', 'restore.py')
@@ -93,6 +113,88 @@ class ScriptNotFoundError(HysteriaError):
 # region Utils
 
 
+SUBPROCESS_DURATION = metrics.histogram(
+    'blitz_subprocess_duration_seconds', 'Wall time of commands spawned by cli_api, by script.', ('script',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+SUBPROCESS_FAILURES = metrics.counter(
+    'blitz_subprocess_failures_total', 'Commands spawned by cli_api that failed or could not start, by script.', ('script',))
+SUBPROCESS_OUTPUT_BYTES = metrics.counter(
+    'blitz_subprocess_output_bytes_total', 'Bytes of output read from commands spawned by cli_api, by script.', ('script',))
+SUBPROCESS_SLOW = metrics.counter(
+    'blitz_subprocess_slow_total', 'Commands spawned by cli_api that took longer than SLOW_COMMAND_THRESHOLD, by script.', ('script',))
+
+# Commands slower than this many seconds are logged as warnings; 0 disables.
+SLOW_COMMAND_THRESHOLD = float(os.getenv('SLOW_COMMAND_THRESHOLD', '5.0'))
+RECENT_COMMANDS_SIZE = 500
+_recent_commands: deque['CommandTiming'] = deque(maxlen=RECENT_COMMANDS_SIZE)
+logger = logging.getLogger('cli_api')
+
+
+@dataclass
+class CommandTiming:
+    '''
+    One finished run_cmd/run_cmd_and_stream call. exit_status is None if the command could not be started.
+    `command` holds the script name and argument count only: arguments can be user passwords or tokens.
+    '''
+    script: str
+    command: str
+    started_at: float
+    duration: float = 0.0
+    exit_status: Optional[int] = None
+    output_bytes: int = 0
+
+
+def _runs_script(command: list[str]) -> bool:
+    return len(command) > 1 and (os.path.basename(command[0]).startswith('python') or command[0] in ('bash', 'sh'))
+
+
+def _script_name(command: list[str]) -> str:
+    '''Labels a command by the script it runs, e.g. "add_user.py" for ['python3', '.../add_user.py', ...].'''
+    return os.path.basename(command[1] if _runs_script(command) else command[0])
+
+
+def _redacted_command(command: list[str]) -> str:
+    '''Describes a command without its arguments, e.g. "add_user.py <5 args>".'''
+    args = len(command) - (2 if _runs_script(command) else 1)
+    return f"{_script_name(command)} <{args} args>"
+
+
+@contextmanager
+def _timed_subprocess(command: list[str]):
+    '''
+    Times the block and yields a CommandTiming for it to fill in with the exit status and output size.
+    The result goes to the metrics registry, the recent-commands buffer and the current call trace.
+    '''
+    timing = CommandTiming(_script_name(command), _redacted_command(command), time.time())
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.duration = elapsed = time.perf_counter() - start
+        SUBPROCESS_DURATION.observe(elapsed, script=timing.script)
+        SUBPROCESS_OUTPUT_BYTES.inc(timing.output_bytes, script=timing.script)
+        if timing.exit_status != 0:
+            SUBPROCESS_FAILURES.inc(script=timing.script)
+        metrics.record_call('subprocess', timing.script, elapsed)
+        _recent_commands.append(timing)
+        if SLOW_COMMAND_THRESHOLD and elapsed >= SLOW_COMMAND_THRESHOLD:
+            SUBPROCESS_SLOW.inc(script=timing.script)
+            logger.warning(f"Slow command {timing.script} took {elapsed:.3f}s (exit status {timing.exit_status})")
+
+
+def recent_commands(limit: int = 20, slowest: bool = True) -> list[dict[str, Any]]:
+    '''
+    Returns up to `limit` of the last RECENT_COMMANDS_SIZE commands run by this process,
+    slowest first, or newest first if `slowest` is False.
+    '''
+    commands = list(_recent_commands)
+    if slowest:
+        commands.sort(key=lambda timing: timing.duration, reverse=True)
+    else:
+        commands.reverse()
+    return [asdict(timing) for timing in commands[:limit]]
+
+
 def run_cmd(command: list[str]) -> str:
     '''
     Runs a command and returns its stdout if successful.
@@ -101,7 +203,10 @@ def run_cmd(command: list[str]) -> str:
     if DEBUG:
         print(f"Executing command: {' '.join(command)}")
     try:
-        process = subprocess.run(command, capture_output=True, text=True, shell=False, check=False)
+        with _timed_subprocess(command) as timing:
+            process = subprocess.run(command, capture_output=True, text=True, shell=False, check=False)
+            timing.exit_status = process.returncode
+            timing.output_bytes = len(process.stdout or '') + len(process.stderr or '')
 
         if process.returncode != 0:
             error_output = process.stderr.strip() if process.stderr.strip() else process.stdout.strip()
@@ -128,21 +233,23 @@ def run_cmd_and_stream(command: list[str]):
     if DEBUG:
         print(f"Executing command: {' '.join(command)}")
     try:
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        if process.stdout:
-            for line in iter(process.stdout.readline, ''):
-                print(line, end='')
-            process.stdout.close()
-        
-        return_code = process.wait()
+        with _timed_subprocess(command) as timing:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                universal_newlines=True
+            )
+
+            if process.stdout:
+                for line in iter(process.stdout.readline, ''):
+                    print(line, end='')
+                    timing.output_bytes += len(line)
+                process.stdout.close()
+
+            return_code = timing.exit_status = process.wait()
 
         if return_code != 0:
             raise CommandExecutionError(f"Process failed with exit code {return_code}")
@@ -163,6 +270,94 @@ def generate_password() -> str:
     except Exception as e:
         raise PasswordGenerationError(f"Failed to generate password using secrets module: {e}")
 
+
+class SnapshotCache:
+    '''
+    Holds the result of `loader` for `ttl` seconds. Concurrent callers on a miss wait for
+    a single load instead of starting their own. The cache is dropped by invalidate() in
+    this process and by touching `stamp_path` from any process.
+    '''
+
+    def __init__(self, loader, ttl: float, stamp_path: str):
+        self.loader = loader
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._expires = 0.0
+        self._stamp: Optional[int] = None
+        self._generation = 0
+        self._pending: Optional[Future] = None
+
+    def _read_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self) -> Any:
+        stamp = self._read_stamp()
+        with self._lock:
+            if time.monotonic() < self._expires and stamp == self._stamp:
+                return self._value
+            future = self._pending
+            leader = future is None
+            if leader:
+                future = self._pending = Future()
+                generation = self._generation
+        if not leader:
+            return future.result()
+
+        try:
+            value = self.loader()
+        except BaseException as e:
+            with self._lock:
+                self._pending = None
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._pending = None
+            # A load that overlapped an invalidation may have read old data; serve it once, don't keep it.
+            if generation == self._generation and self.ttl > 0:
+                self._value, self._expires, self._stamp = value, time.monotonic() + self.ttl, stamp
+        future.set_result(value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._expires = 0.0
+            self._value = None
+        try:
+            with open(self.stamp_path, 'a'):
+                os.utime(self.stamp_path)
+        except OSError:
+            pass
+
+
+def _load_users() -> list[dict[str, Any]] | None:
+    if res := run_cmd(['python3', Command.LIST_USERS.value]):
+        return json.loads(res)
+
+
+_user_list = SnapshotCache(_load_users, USER_LIST_CACHE_TTL, USERS_CHANGED_STAMP)
+
+
+def invalidate_user_list():
+    '''Drops the cached list_users() snapshot in every process.'''
+    _user_list.invalidate()
+
+
+def _changes_users(func):
+    '''Invalidates the cached user list after the wrapped call, even if it failed part-way.'''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invalidate_user_list()
+    return wrapper
+
 # endregion
 
 # region APIs
@@ -226,24 +421,62 @@ def change_hysteria2_sni(sni: str):
     run_cmd(['python3', Command.CHANGE_SNI_HYSTERIA2.value, sni])
 
 
-def backup_hysteria2():
-    '''Backups Hysteria configuration.  Raises an exception on failure.'''
+def backup_hysteria2(incremental: bool = False):
+    '''
+    Backups Hysteria configuration.  Raises an exception on failure.
+    With incremental, only changes since the previous backup are saved while a recent full backup exists.
+    '''
+    command = ['python3', Command.BACKUP_HYSTERIA2.value]
+    if incremental:
+        command.append('--incremental')
     try:
-        run_cmd(['python3', Command.BACKUP_HYSTERIA2.value])
+        run_cmd(command)
     except subprocess.CalledProcessError as e:
         raise Exception(f"Backup failed: {e}")
     except Exception as ex:
         raise
 
 
-def restore_hysteria2(backup_file_path: str):
-    '''Restores Hysteria configuration from the given backup file.'''
+@_changes_users
+def restore_hysteria2(backup_file_path: str, with_incrementals: bool = False, progress=None):
+    '''
+    Restores Hysteria configuration from the given backup file, optionally replaying its incremental backups.
+    If given, progress(percent, message) is called as the restore advances.
+    '''
+    command = ['python3', Command.RESTORE_HYSTERIA2.value, backup_file_path]
+    if with_incrementals:
+        command.append('--with-incrementals')
+    if progress is None:
+        run_cmd(command)
+        return
+
+    if DEBUG:
+        print(f"Executing command: {' '.join(command)}")
     try:
-        run_cmd(['python3', Command.RESTORE_HYSTERIA2.value, backup_file_path])
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Restore failed: {e}")
-    except Exception as ex:
-        raise
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    except FileNotFoundError as e:
+        raise ScriptNotFoundError(f"Script or command not found: {command[0]}. Original error: {e}")
+
+    output = []
+    with process:
+        for line in process.stdout:
+            if line.startswith('PROGRESS '):
+                _, percent, message = line.rstrip('\n').split(' ', 2)
+                progress(int(percent), message)
+            else:
+                output.append(line)
+    if process.returncode != 0:
+        error_output = ''.join(output).strip() or f"Command exited with status {process.returncode} without specific error message."
+        raise CommandExecutionError(f"Command '{' '.join(command)}' failed with exit code {process.returncode}: {error_output}")
+
+
+def get_restore_progress() -> dict[str, Any] | None:
+    '''Returns the state, percent and message of the running or last restore, or None if there was none.'''
+    try:
+        with open(RESTORE_PROGRESS_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
 
 
 def enable_hysteria2_obfs():
@@ -290,10 +523,12 @@ def set_hysteria2_config_file(data: dict[str, Any]):
 
 def list_users() -> dict[str, dict[str, Any]] | None:
     '''
-    Lists all users.
+    Lists all users. Concurrent calls share one list_users.py run, and its result is
+    reused for USER_LIST_CACHE_TTL seconds or until users are changed.
     '''
-    if res := run_cmd(['python3', Command.LIST_USERS.value]):
-        return json.loads(res)
+    users = _user_list.get()
+    # Callers get their own dicts, so changing one can't corrupt the shared snapshot.
+    return [dict(user) for user in users] if users else users
 
 
 def get_user(username: str) -> dict[str, Any] | None:
@@ -304,6 +539,7 @@ def get_user(username: str) -> dict[str, Any] | None:
         return json.loads(res)
 
 
+@_changes_users
 def add_user(username: str, traffic_limit: int, expiration_days: int, password: str | None, creation_date: str | None, unlimited: bool, note: str | None):
     '''
     Adds a new user with the given parameters, respecting positional argument requirements.
@@ -327,6 +563,7 @@ def add_user(username: str, traffic_limit: int, expiration_days: int, password:
         
     run_cmd(command)
 
+@_changes_users
 def bulk_user_add(traffic_gb: float, expiration_days: int, count: int, prefix: str, start_number: int, unlimited: bool):
     """
     Executes the bulk user creation script with specified parameters.
@@ -346,6 +583,7 @@ def bulk_user_add(traffic_gb: float, expiration_days: int, count: int, prefix: s
         
     run_cmd(command)
 
+@_changes_users
 def edit_user(username: str, new_username: str | None, new_password: str | None, new_traffic_limit: int | None, new_expiration_days: int | None, renew_password: bool, renew_creation_date: bool, blocked: bool | None, unlimited_ip: bool | None, note: str | None):
     '''
     Edits an existing user's details by calling the new edit_user.py script with named flags.
@@ -393,6 +631,47 @@ def edit_user(username: str, new_username: str | None, new_password: str | None,
     run_cmd(command_args)
 
 
+@_changes_users
+def bulk_edit_users(operation: str, usernames: list[str] | None = None, status: str | None = None, blocked: bool | None = None,
+                    prefix: str | None = None, days: int | None = None, traffic_gb: float | None = None) -> dict[str, int]:
+    '''
+    Applies one operation (block, unblock, extend, reset, set-quota) to many users at once.
+    Targets are either the given usernames or every user matching the filters.
+    Returns counts of matched, modified and kicked users.
+    '''
+    if operation not in ('block', 'unblock', 'extend', 'reset', 'set-quota'):
+        raise InvalidInputError(f"Error: unknown operation '{operation}'.")
+    if not usernames and not (status or blocked is not None or prefix):
+        raise InvalidInputError('Error: usernames or at least one filter must be provided.')
+    if operation == 'extend' and (days is None or days <= 0):
+        raise InvalidInputError('Error: days must be a positive number for extend.')
+    if operation == 'set-quota' and (traffic_gb is None or traffic_gb < 0):
+        raise InvalidInputError('Error: traffic limit must be a non-negative number for set-quota.')
+
+    command_args = ['python3', Command.BULK_EDIT_USERS.value, operation]
+    if usernames:
+        command_args.extend(['--users', *usernames])
+    else:
+        if status:
+            command_args.extend(['--status', status])
+        if blocked is not None:
+            command_args.extend(['--blocked', 'true' if blocked else 'false'])
+        if prefix:
+            command_args.extend(['--prefix', prefix])
+    if days is not None:
+        command_args.extend(['--days', str(days)])
+    if traffic_gb is not None:
+        command_args.extend(['--traffic-gb', str(traffic_gb)])
+
+    # One flush up front so usage accrued under the old limits is saved before they change.
+    if usernames:
+        flush_users_traffic(usernames)
+    else:
+        traffic_status(display_output=False)
+    return json.loads(run_cmd(command_args))
+
+
+@_changes_users
 def reset_user(username: str):
     '''
     Resets a user's configuration.
@@ -400,6 +679,7 @@ def reset_user(username: str):
     run_cmd(['python3', Command.RESET_USER.value, username])
 
 
+@_changes_users
 def remove_users(usernames: list[str]):
     '''
     Removes one or more users by username.
@@ -412,13 +692,16 @@ def kick_users_by_name(usernames: list[str]):
     '''Kicks one or more users by username.'''
     if not usernames:
         raise InvalidInputError('Username(s) must be provided to kick.')
-    script_path = Command.KICK_USER_SCRIPT.value
-    if not os.path.exists(script_path):
-        raise ScriptNotFoundError(f"Kick user script not found at: {script_path}")
+    # Kicked in-process through the shared API client, so long-running callers
+    # (web panel, bot) reuse one pooled connection instead of starting kickuser.py.
+    import hysteria_api
     try:
-        subprocess.run(['python3', script_path, *usernames], check=True)
-    except subprocess.CalledProcessError as e:
-        raise CommandExecutionError(f"Failed to execute kick user script: {e}")
+        failures = hysteria_api.kick_clients(usernames)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        raise CommandExecutionError(f"Failed to kick users: {e}")
+    if failures:
+        batch, e = failures[0]
+        raise CommandExecutionError(f"Failed to kick users {', '.join(batch)}: {e}")
         
 def show_user_uri(username: str, qrcode: bool, ipv: int, all: bool, singbox: bool, normalsub: bool) -> str | None:
     '''
@@ -462,6 +745,7 @@ def show_user_uri_json(usernames: list[str]) -> list[dict[str, Any]] | None:
 
 
 def traffic_status(no_gui=False, display_output=True):
+    import traffic
     if no_gui:
         data = traffic.traffic_status(no_gui=True)
         traffic.kick_expired_users()
@@ -471,6 +755,94 @@ def traffic_status(no_gui=False, display_output=True):
     return data
 
 
+def profile_service(target: str, seconds: int, fmt: str = 'collapsed') -> str:
+    '''
+    Samples the NormalSub server or the traffic tick for `seconds` and returns the profile
+    as collapsed stacks or speedscope JSON. The traffic tick runs once a minute, so profile it
+    for at least 60 seconds.
+    '''
+    if fmt not in profiler.FORMATS:
+        raise InvalidInputError(f"Invalid format: {fmt}. Use one of {', '.join(profiler.FORMATS)}.")
+    if not 1 <= seconds <= profiler.MAX_SECONDS:
+        raise InvalidInputError(f"Profile duration must be between 1 and {profiler.MAX_SECONDS} seconds.")
+
+    if target == 'normalsub':
+        import requests
+        port = dotenv_values(NORMALSUB_ENV_FILE).get('AIOHTTP_LISTEN_PORT') or '28261'
+        try:
+            response = requests.get(f'http://127.0.0.1:{port}/debug/profile',
+                                    params={'seconds': seconds, 'format': fmt}, timeout=seconds + 10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise HysteriaError(f"Could not profile NormalSub: {e}")
+        return response.text
+
+    if target == 'traffic':
+        import traffic
+        profiler.request_profile('traffic', seconds)
+        time.sleep(seconds)
+        # A pass that started inside the window records its profile before releasing this lock.
+        with traffic.flush_lock():
+            pass
+        profile = profiler.collect_requested('traffic')
+        if not profile.samples:
+            raise HysteriaError("No traffic pass ran while profiling; profile for at least 60 seconds.")
+        return profile.render(fmt, 'traffic')
+
+    raise InvalidInputError(f"Invalid profile target: {target}. Use 'normalsub' or 'traffic'.")
+
+
+def flush_users_traffic(usernames: list[str]):
+    '''
+    Saves pending traffic for the given users only. Use this instead of a full
+    traffic_status pass before editing or removing specific users.
+    '''
+    if not usernames:
+        return None
+    import traffic
+    return traffic.flush_users_traffic(usernames)
+
+
+def traffic_rollup(since: str | None = None):
+    '''
+    Downsamples recent minute traffic buckets into hour and day buckets.
+    '''
+    command = ['python3', Command.TRAFFIC_HISTORY.value, 'rollup']
+    if since:
+        command.extend(['--since', since])
+    run_cmd(command)
+
+
+def get_user_traffic_history(username: str, since: str = '24h', until: str | None = None, granularity: str | None = None) -> list[dict[str, Any]]:
+    '''
+    Returns a user's upload/download per time bucket. `since`/`until` take a window
+    such as '24h' or '7d', or an ISO date.
+    '''
+    command = ['python3', Command.TRAFFIC_HISTORY.value, 'user', username, '--since', since]
+    if until:
+        command.extend(['--until', until])
+    if granularity:
+        command.extend(['--granularity', granularity])
+    return json.loads(run_cmd(command))
+
+
+def get_top_traffic_users(since: str | None = None, until: str | None = None, limit: int = 10, by: str = 'total') -> list[dict[str, Any]]:
+    '''
+    Returns the users with the most traffic, heaviest first. With `since` (e.g. '24h')
+    usage is summed from the traffic history; without it the all-time counters are used.
+    '''
+    if by not in ('total', 'upload', 'download'):
+        raise InvalidInputError(f"Error: invalid sort key '{by}'.")
+    if limit <= 0:
+        raise InvalidInputError('Error: limit must be a positive number.')
+    command = ['python3', Command.TRAFFIC_HISTORY.value, 'top', '--limit', str(limit), '--by', by]
+    if since:
+        command.extend(['--since', since])
+    if until:
+        command.extend(['--until', until])
+    return json.loads(run_cmd(command))
+
+
 # Next Update:
 # TODO: it's better to return json
 # TODO: After json todo need fix Telegram Bot and WebPanel
@@ -511,7 +883,7 @@ def edit_ip_address(ipv4: str, ipv6: str):
     if ipv6:
         run_cmd(['python3', Command.IP_ADD.value, 'edit', '-6', ipv6])
 
-def add_node(name: str, ip: str, sni: Optional[str] = None, pinSHA256: Optional[str] = None, port: Optional[int] = None, obfs: Optional[str] = None, insecure: Optional[bool] = None):
+def add_node(name: str, ip: str, sni: Optional[str] = None, pinSHA256: Optional[str] = None, port: Optional[int] = None, obfs: Optional[str] = None, insecure: Optional[bool] = None, health_url: Optional[str] = None):
     """
     Adds a new external node.
     """
@@ -526,6 +898,8 @@ def add_node(name: str, ip: str, sni: Optional[str] = None, pinSHA256: Optional[
         command.extend(['--obfs', obfs])
     if insecure:
         command.append('--insecure')
+    if health_url:
+        command.extend(['--health-url', health_url])
     return run_cmd(command)
 
 def delete_node(name: str):
@@ -540,6 +914,15 @@ def list_nodes():
     """
     return run_cmd(['python3', Command.NODE_MANAGER.value, 'list'])
 
+def probe_nodes(timeout: Optional[float] = None):
+    """
+    Probes all external nodes concurrently and refreshes the health cache.
+    """
+    command = ['python3', Command.NODE_MANAGER.value, 'probe']
+    if timeout:
+        command.extend(['--timeout', str(timeout)])
+    return run_cmd(command)
+
 def generate_node_cert():
     """
     Generates a self-signed certificate for nodes.
@@ -814,6 +1197,15 @@ def change_webpanel_expiration(expiration_minutes: int):
     )
 
 
+def change_webpanel_workers(workers: int):
+    '''Changes the number of WebPanel worker processes. More than one worker switches sessions to MongoDB.'''
+    if not workers or workers < 1:
+        raise InvalidInputError('Error: Worker count must be a positive integer.')
+    run_cmd(
+        ['bash', Command.SHELL_WEBPANEL.value, 'changeworkers', str(workers)]
+    )
+
+
 def change_webpanel_root_path(root_path: str | None = None):
     '''Changes the root path for the WebPanel. A new random path is generated if not provided.'''
     cmd_args = ['bash', Command.SHELL_WEBPANEL.value, 'changeroot']
@@ -4,11 +4,13 @@ import (
 	"context"
 	"crypto/subtle"
 	"encoding/json"
+	"fmt"
 	"io"
 	"log"
 	"net/http"
 	"os"
 	"strings"
+	"sync/atomic"
 	"time"
 
 	"go.mongodb.org/mongo-driver/bson"
@@ -17,10 +19,10 @@ import (
 )
 
 const (
-	listenAddr     = "127.0.0.1:28262"
-	mongoURI       = "mongodb://localhost:27017"
-	dbName         = "blitz_panel"
-	collectionName = "users"
+	listenAddr      = "127.0.0.1:28262"
+	defaultMongoURI = "mongodb://localhost:27017"
+	dbName          = "blitz_panel"
+	collectionName  = "users"
 )
 
 type User struct {
@@ -48,6 +50,47 @@ type httpAuthResponse struct {
 
 var userCollection *mongo.Collection
 
+// Auth outcomes exported on /metrics: hits are accepted logins, misses are
+// unknown users and rejects are known users turned away, by reason.
+var (
+	authHits          atomic.Int64
+	authMisses        atomic.Int64
+	authRejectReasons = []string{"invalid_request", "password", "blocked", "expired", "quota"}
+	authRejects       = map[string]*atomic.Int64{}
+	authLookupNanos   atomic.Int64
+	authLookups       atomic.Int64
+)
+
+func init() {
+	for _, reason := range authRejectReasons {
+		authRejects[reason] = &atomic.Int64{}
+	}
+}
+
+func reject(w http.ResponseWriter, reason string) {
+	authRejects[reason].Add(1)
+	json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+}
+
+func metricsHandler(w http.ResponseWriter, r *http.Request) {
+	w.Header().Set("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+	fmt.Fprintln(w, "# HELP blitz_auth_hits_total Accepted authentication requests.")
+	fmt.Fprintln(w, "# TYPE blitz_auth_hits_total counter")
+	fmt.Fprintf(w, "blitz_auth_hits_total %d\n", authHits.Load())
+	fmt.Fprintln(w, "# HELP blitz_auth_misses_total Authentication requests for unknown users.")
+	fmt.Fprintln(w, "# TYPE blitz_auth_misses_total counter")
+	fmt.Fprintf(w, "blitz_auth_misses_total %d\n", authMisses.Load())
+	fmt.Fprintln(w, "# HELP blitz_auth_rejects_total Rejected authentication requests, by reason.")
+	fmt.Fprintln(w, "# TYPE blitz_auth_rejects_total counter")
+	for _, reason := range authRejectReasons {
+		fmt.Fprintf(w, "blitz_auth_rejects_total{reason=\"%s\"} %d\n", reason, authRejects[reason].Load())
+	}
+	fmt.Fprintln(w, "# HELP blitz_auth_lookup_seconds Time spent looking users up in MongoDB.")
+	fmt.Fprintln(w, "# TYPE blitz_auth_lookup_seconds summary")
+	fmt.Fprintf(w, "blitz_auth_lookup_seconds_sum %f\n", float64(authLookupNanos.Load())/1e9)
+	fmt.Fprintf(w, "blitz_auth_lookup_seconds_count %d\n", authLookups.Load())
+}
+
 func authHandler(w http.ResponseWriter, r *http.Request) {
 	if r.Method != http.MethodPost {
 		http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
@@ -56,13 +99,14 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 
 	var req httpAuthRequest
 	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+		authRejects["invalid_request"].Add(1)
 		http.Error(w, "Invalid request", http.StatusBadRequest)
 		return
 	}
 
 	username, password, ok := strings.Cut(req.Auth, ":")
 	if !ok {
-		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+		reject(w, "invalid_request")
 		return
 	}
 
@@ -70,24 +114,29 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
 	defer cancel()
 
+	lookupStart := time.Now()
 	err := userCollection.FindOne(ctx, bson.M{"_id": username}).Decode(&user)
+	authLookupNanos.Add(int64(time.Since(lookupStart)))
+	authLookups.Add(1)
 	if err != nil {
+		authMisses.Add(1)
 		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
 		return
 	}
 
 	if user.Blocked {
-		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+		reject(w, "blocked")
 		return
 	}
 
 	if subtle.ConstantTimeCompare([]byte(user.Password), []byte(password)) != 1 {
 		time.Sleep(5 * time.Second)
-		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+		reject(w, "password")
 		return
 	}
 
 	if user.UnlimitedUser {
+		authHits.Add(1)
 		w.Header().Set("Content-Type", "application/json")
 		json.NewEncoder(w).Encode(httpAuthResponse{OK: true, ID: username})
 		return
@@ -96,16 +145,17 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 	if user.ExpirationDays > 0 {
 		creationDate, err := time.Parse("2006-01-02", user.AccountCreationDate)
 		if err == nil && time.Now().After(creationDate.AddDate(0, 0, user.ExpirationDays)) {
-			json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+			reject(w, "expired")
 			return
 		}
 	}
 
 	if user.MaxDownloadBytes > 0 && (user.DownloadBytes+user.UploadBytes) >= user.MaxDownloadBytes {
-		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+		reject(w, "quota")
 		return
 	}
 
+	authHits.Add(1)
 	w.Header().Set("Content-Type", "application/json")
 	json.NewEncoder(w).Encode(httpAuthResponse{OK: true, ID: username})
 }
@@ -113,6 +163,11 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 func main() {
 	log.SetOutput(io.Discard)
 
+	// MONGO_URI comes from /etc/hysteria/.configs.env through the service's EnvironmentFile.
+	mongoURI := os.Getenv("MONGO_URI")
+	if mongoURI == "" {
+		mongoURI = defaultMongoURI
+	}
 	clientOptions := options.Client().ApplyURI(mongoURI)
 	client, err := mongo.Connect(context.TODO(), clientOptions)
 	if err != nil {
@@ -129,6 +184,7 @@ func main() {
 	userCollection = client.Database(dbName).Collection(collectionName)
 
 	http.HandleFunc("/auth", authHandler)
+	http.HandleFunc("/metrics", metricsHandler)
 	log.SetOutput(os.Stderr)
 	log.Printf("Auth server starting on %s", listenAddr)
 	if err := http.ListenAndServe(listenAddr, nil); err != nil {
@@ -0,0 +1,101 @@
+"""
+Async counterpart of db.database for the aiohttp and FastAPI services.
+
+Reads are issued natively through pymongo's AsyncMongoClient, so an event loop
+can have many queries in flight without blocking on any of them. Every other
+Database method is available too, with the same name and arguments: it runs the
+synchronous implementation on a worker thread. Writes therefore keep one
+implementation of revisions and tombstones, and sync scripts keep using `db`.
+
+    from db.async_database import async_db
+
+    user = await async_db.get_user("alice")
+    await async_db.update_user("alice", {"blocked": True})
+"""
+
+import asyncio
+import threading
+import pymongo
+import metrics
+from db.database import Database, MONGO_SETTINGS, db, mongo_client_options
+
+DB_NAME = "blitz_panel"
+COLLECTION_NAME = "users"
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_async_client():
+    """
+    Returns the AsyncMongoClient shared by this process. Like the services that use
+    it, it assumes one event loop per process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = pymongo.AsyncMongoClient(
+                MONGO_SETTINGS["MONGO_URI"],
+                event_listeners=[metrics.mongo_listener()],
+                **mongo_client_options(MONGO_SETTINGS),
+            )
+        return _client
+
+class AsyncDatabase:
+    def __init__(self, sync_db=db, db_name=DB_NAME, collection_name=COLLECTION_NAME):
+        self._sync_db = sync_db
+        self._db_name = db_name
+        self._collection_name = collection_name
+
+    @property
+    def collection(self):
+        return get_async_client()[self._db_name][self._collection_name]
+
+    @property
+    def counters(self):
+        return get_async_client()[self._db_name]["counters"]
+
+    async def is_available(self):
+        """Async version of `if not db:`; connects the sync handle off the loop."""
+        return await asyncio.to_thread(bool, self._sync_db)
+
+    async def get_user(self, username):
+        return await self.collection.find_one({"_id": username.lower()})
+
+    async def get_user_by_password(self, password, fields=None):
+        return await self.collection.find_one({"password": password}, Database._projection(fields))
+
+    async def get_users(self, usernames, fields=None):
+        query = {"_id": {"$in": [username.lower() for username in usernames]}}
+        return await self.collection.find(query, Database._projection(fields)).to_list()
+
+    async def get_all_users(self):
+        return await self.collection.find({}).to_list()
+
+    def iter_users(self, fields=None, filter=None, batch_size=1000):
+        """Returns an async cursor; use `async for user in async_db.iter_users(...)`."""
+        return self.collection.find(filter or {}, Database._projection(fields), batch_size=batch_size)
+
+    async def count_users(self, filter=None):
+        return await self.collection.count_documents(filter or {})
+
+    async def sum_users(self, fields, filter=None):
+        group = {"_id": None, **{field: {"$sum": f"${field}"} for field in fields}}
+        cursor = await self.collection.aggregate([{"$match": filter or {}}, {"$group": group}])
+        result = next(iter(await cursor.to_list()), None)
+        return {field: (result or {}).get(field, 0) for field in fields}
+
+    async def current_revision(self):
+        doc = await self.counters.find_one({"_id": "users_rev"})
+        return doc["seq"] if doc else 0
+
+    def __getattr__(self, name):
+        if not callable(getattr(Database, name, None)) or name.startswith("_"):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(getattr(self._sync_db, name), *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+async_db = AsyncDatabase()
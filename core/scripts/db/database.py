@@ -1,16 +1,216 @@
+import os
+import re
+import json
+import time
+import tempfile
+import threading
 import pymongo
+import metrics
+from contextlib import contextmanager
+from dotenv import dotenv_values
+from paths import CONFIG_ENV
+from datetime import datetime, timedelta, timezone
 from bson.objectid import ObjectId
 
+# Writes that only touch these fields don't bump a user's revision, so the
+# per-minute traffic tick doesn't churn the replication feed for idle users.
+VOLATILE_FIELDS = {'status', 'online_count'}
+TOMBSTONE_TTL_SECONDS = 7 * 24 * 3600
+# A revision is in flight from next_revision() until the write carrying it lands.
+# Readers of the feed only advance to stable_revision(), the highest revision below
+# every in-flight one, so a write that lands after a newer one was read is never
+# skipped. Writers that died without releasing their revision stop holding it back
+# after this many seconds.
+REVISION_LEASE_SECONDS = 600
+
+# Traffic history is kept at three resolutions. Each one is complete within its
+# own retention window; coarser buckets are rebuilt from finer ones by rollup.
+TRAFFIC_HISTORY_RETENTION = {
+    'minute': 2 * 24 * 3600,
+    'hour': 35 * 24 * 3600,
+    'day': 400 * 24 * 3600,
+}
+
+# MongoDB connection settings, read from .configs.env; environment variables with
+# the same name take precedence. MONGO_URI may point at a remote server or a replica
+# set (mongodb://a,b,c/?replicaSet=rs0) but must not name a database.
+MONGO_DEFAULTS = {
+    "MONGO_URI": "mongodb://localhost:27017/",
+    # pymongo waits 30s for a server by default; a CLI call should fail well before that.
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "5000",
+    "MONGO_CONNECT_TIMEOUT_MS": "5000",
+    # Write concern for panel and user writes, and for the per-minute traffic history,
+    # which can be relaxed on a replica set without risking user data.
+    "MONGO_WRITE_CONCERN": "1",
+    "MONGO_TRAFFIC_WRITE_CONCERN": "1",
+}
+
+def _write_concern_value(value):
+    return int(value) if value.isdigit() else value
+
+# Settings passed to MongoClient when set: setting -> (MongoClient option, parser).
+MONGO_CLIENT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGO_COMPRESSORS": ("compressors", str),
+    "MONGO_READ_PREFERENCE": ("readPreference", str),
+    "MONGO_REPLICA_SET": ("replicaSet", str),
+    "MONGO_WRITE_CONCERN": ("w", _write_concern_value),
+}
+
+# Bump when ensure_indexes() changes so every database gets the new indexes once.
+INDEX_VERSION = 4
+# After a failed connection, uses of the lazy handle fail fast for this long before retrying.
+RECONNECT_INTERVAL_SECONDS = 10
+
+def load_mongo_settings(path=CONFIG_ENV):
+    settings = dict(MONGO_DEFAULTS)
+    file_values = dotenv_values(path) if os.path.isfile(path) else {}
+    for source in (file_values, os.environ):
+        settings.update({key: value.strip() for key, value in source.items() if key.startswith("MONGO_") and value})
+    return settings
+
+def mongo_client_options(settings):
+    return {
+        option: parse(settings[key])
+        for key, (option, parse) in MONGO_CLIENT_OPTIONS.items() if key in settings
+    }
+
+MONGO_SETTINGS = load_mongo_settings()
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the MongoClient shared by everything in this process, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = pymongo.MongoClient(
+                MONGO_SETTINGS["MONGO_URI"],
+                event_listeners=[metrics.mongo_listener()],
+                **mongo_client_options(MONGO_SETTINGS),
+            )
+        return _client
+
+@contextmanager
+def mongo_tools_config():
+    """
+    Yields the path of a private YAML file holding MONGO_URI, for the --config option of
+    mongodump and mongorestore. The URI can carry credentials, and on the command line
+    every local user could read it with `ps`.
+    """
+    # NamedTemporaryFile is created with mode 0600; a JSON string is a valid YAML scalar.
+    with tempfile.NamedTemporaryFile('w', prefix='blitz-mongo-', suffix='.yaml') as config:
+        config.write(f"uri: {json.dumps(MONGO_SETTINGS['MONGO_URI'])}\n")
+        config.flush()
+        yield config.name
+
 class Database:
-    def __init__(self, db_name="blitz_panel", collection_name="users"):
+    def __init__(self, db_name="blitz_panel", collection_name="users", client=None):
         try:
-            self.client = pymongo.MongoClient("mongodb://localhost:27017/")
+            self.client = client or get_client()
             self.db = self.client[db_name]
             self.collection = self.db[collection_name]
-            self.client.server_info()
-        except pymongo.errors.ConnectionFailure as e:
+            self.counters = self.db["counters"]
+            self.tombstones = self.db[f"{collection_name}_tombstones"]
+            self.traffic_offsets = self.db["traffic_offsets"]
+            traffic_write_concern = pymongo.WriteConcern(w=_write_concern_value(MONGO_SETTINGS["MONGO_TRAFFIC_WRITE_CONCERN"]))
+            self.traffic_history = {
+                granularity: self.db.get_collection(f"traffic_{granularity}", write_concern=traffic_write_concern)
+                for granularity in TRAFFIC_HISTORY_RETENTION
+            }
+            self._check_indexes()
+        except pymongo.errors.PyMongoError as e:
             print(f"Could not connect to MongoDB: {e}")
-            raise
+            if isinstance(e, pymongo.errors.ConnectionFailure):
+                raise
+            raise pymongo.errors.ConnectionFailure(str(e)) from e
+
+    def _check_indexes(self):
+        # Doubles as the connection check: a single round-trip when the indexes are
+        # current, instead of server_info() and a create_index per index in every process.
+        marker = self.counters.find_one({"_id": "indexes"})
+        if not marker or marker.get("version") != INDEX_VERSION:
+            self.ensure_indexes()
+
+    def ensure_indexes(self):
+        self.collection.create_index("rev")
+        self.collection.create_index("password")
+        # total_bytes is kept in step with the two counters by update_user(); users
+        # written before it existed get it here, once.
+        self.collection.update_many(
+            {"total_bytes": {"$exists": False}, "$or": [{"upload_bytes": {"$exists": True}}, {"download_bytes": {"$exists": True}}]},
+            [{"$set": {"total_bytes": {"$add": [{"$ifNull": ["$upload_bytes", 0]}, {"$ifNull": ["$download_bytes", 0]}]}}}]
+        )
+        # get_top_users() sorts by a counter with _id as the tiebreaker; only a compound
+        # index matching that sort lets it stop after `limit` users.
+        existing = self.collection.index_information()
+        for field in ("upload_bytes", "download_bytes", "total_bytes"):
+            if f"{field}_1" in existing:
+                self.collection.drop_index(f"{field}_1")
+            self.collection.create_index([(field, -1), ("_id", 1)])
+        self.tombstones.create_index("rev")
+        self.tombstones.create_index("deleted_at", expireAfterSeconds=TOMBSTONE_TTL_SECONDS)
+        for granularity, collection in self.traffic_history.items():
+            collection.create_index("ts", expireAfterSeconds=TRAFFIC_HISTORY_RETENTION[granularity])
+            collection.create_index([("username", 1), ("ts", 1)], unique=granularity != 'minute')
+        self.counters.update_one({"_id": "indexes"}, {"$set": {"version": INDEX_VERSION}}, upsert=True)
+
+    def next_revision(self):
+        """
+        Allocates a revision and marks it in flight until release_revision(). Prefer
+        `with db.revision() as rev:` around the writes that carry it.
+        """
+        # One pipeline update, so no reader can see the new seq without its pending entry.
+        # Lease times use this host's clock, like stable_revision().
+        now = datetime.now(timezone.utc)
+        live = {"$gt": ["$$this.at", now - timedelta(seconds=REVISION_LEASE_SECONDS)]}
+        doc = self.counters.find_one_and_update(
+            {"_id": "users_rev"},
+            [
+                {"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, 1]}}},
+                {"$set": {"pending": {"$concatArrays": [
+                    {"$filter": {"input": {"$ifNull": ["$pending", []]}, "cond": live}},
+                    [{"rev": "$seq", "at": now}],
+                ]}}},
+            ],
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        return doc["seq"]
+
+    def release_revision(self, rev):
+        self.counters.update_one({"_id": "users_rev"}, {"$pull": {"pending": {"rev": rev}}})
+
+    @contextmanager
+    def revision(self):
+        """Allocates a revision for the writes in the block and releases it when they are done."""
+        rev = self.next_revision()
+        try:
+            yield rev
+        finally:
+            self.release_revision(rev)
+
+    def current_revision(self):
+        doc = self.counters.find_one({"_id": "users_rev"})
+        return doc["seq"] if doc else 0
+
+    def stable_revision(self):
+        """
+        Returns the highest revision at or below which every write has landed. Feed
+        and backup readers record this, not current_revision(), as their position.
+        """
+        doc = self.counters.find_one({"_id": "users_rev"})
+        if not doc:
+            return 0
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=REVISION_LEASE_SECONDS)
+        in_flight = [entry["rev"] for entry in doc.get("pending", [])
+                     if entry["at"].replace(tzinfo=timezone.utc) > cutoff]
+        return min(in_flight) - 1 if in_flight else doc["seq"]
 
     def add_user(self, user_data):
         username = user_data.pop('username', None)
@@ -21,24 +221,247 @@ class Database:
             return None
 
         user_data['_id'] = username.lower()
-        return self.collection.insert_one(user_data)
+        with self.revision() as rev:
+            user_data['rev'] = rev
+            return self.collection.insert_one(user_data)
+
+    def add_users(self, user_docs):
+        with self.revision() as rev:
+            for user_doc in user_docs:
+                user_doc['rev'] = rev
+            return self.collection.insert_many(user_docs, ordered=False)
 
     def get_user(self, username):
         return self.collection.find_one({"_id": username.lower()})
 
+    def get_user_by_password(self, password, fields=None):
+        return self.collection.find_one({"password": password}, self._projection(fields))
+
+    @staticmethod
+    def _projection(fields):
+        # An empty projection would fetch every field, so _id is always listed.
+        return None if fields is None else {"_id": 1, **{field: 1 for field in fields}}
+
     def get_all_users(self):
         return list(self.collection.find({}))
 
-    def update_user(self, username, updates):
-        return self.collection.update_one({"_id": username.lower()}, {"$set": updates})
+    def iter_users(self, fields=None, filter=None, batch_size=1000):
+        """
+        Returns a cursor over the users matching `filter`. Only `fields` (and `_id`) are
+        transferred; None fetches whole documents.
+        """
+        return self.collection.find(filter or {}, self._projection(fields), batch_size=batch_size)
+
+    def count_users(self, filter=None):
+        return self.collection.count_documents(filter or {})
+
+    def sum_users(self, fields, filter=None):
+        """Returns {field: total} over the users matching `filter`, summed by the server."""
+        group = {"_id": None, **{field: {"$sum": f"${field}"} for field in fields}}
+        result = next(self.collection.aggregate([{"$match": filter or {}}, {"$group": group}]), None)
+        return {field: (result or {}).get(field, 0) for field in fields}
+
+    def get_users(self, usernames, fields=None):
+        query = {"_id": {"$in": [username.lower() for username in usernames]}}
+        return list(self.collection.find(query, self._projection(fields)))
+
+    def search_users(self, prefix="", blocked=None, after=None, limit=50, projection=None):
+        # Anchored, case-sensitive prefix on the lowercase _id, so the _id index bounds the scan.
+        query = {"_id": {"$regex": f"^{re.escape(prefix.lower())}"}} if prefix else {}
+        if after:
+            query.setdefault("_id", {})["$gt"] = after
+        if blocked is not None:
+            query["blocked"] = blocked
+        return list(self.collection.find(query, projection).sort("_id", 1).limit(limit))
+
+    def get_top_users(self, limit=10, by="total"):
+        # Each sort matches a compound (counter, _id) index, so only `limit` users are read.
+        sort_field = {"upload": "upload_bytes", "download": "download_bytes"}.get(by, "total_bytes")
+        projection = {"_id": 0, "username": "$_id", "upload_bytes": {"$ifNull": ["$upload_bytes", 0]},
+                      "download_bytes": {"$ifNull": ["$download_bytes", 0]}}
+        pipeline = [
+            {"$sort": {sort_field: -1, "_id": 1}},
+            {"$limit": limit},
+            {"$project": projection},
+            {"$addFields": {"total_bytes": {"$add": ["$upload_bytes", "$download_bytes"]}}},
+        ]
+        return list(self.collection.aggregate(pipeline))
+
+    def get_users_changed_since(self, rev, projection=None):
+        return self.collection.find({"rev": {"$gt": rev}}, projection)
+
+    def get_deleted_since(self, rev):
+        return [doc["_id"] for doc in self.tombstones.find({"rev": {"$gt": rev}}, {"_id": 1})]
+
+    def update_user(self, username, updates, rev=None):
+        """Pass `rev` from an enclosing `with db.revision()` to share one revision across many updates."""
+        if 'upload_bytes' in updates and 'download_bytes' in updates:
+            updates = {**updates, 'total_bytes': updates['upload_bytes'] + updates['download_bytes']}
+        if VOLATILE_FIELDS.issuperset(updates):
+            return self.collection.update_one({"_id": username.lower()}, {"$set": updates})
+        if rev:
+            return self.collection.update_one({"_id": username.lower()}, {"$set": {**updates, 'rev': rev}})
+        with self.revision() as rev:
+            return self.collection.update_one({"_id": username.lower()}, {"$set": {**updates, 'rev': rev}})
+
+    def update_users(self, usernames, update):
+        with self.revision() as rev:
+            update = {**update, '$set': {**update.get('$set', {}), 'rev': rev}}
+            return self.collection.update_many({"_id": {"$in": usernames}}, update)
 
     def delete_user(self, username):
+        self._record_deletions([username.lower()])
         return self.collection.delete_one({"_id": username.lower()})
 
     def delete_users(self, usernames):
+        self._record_deletions(usernames)
         return self.collection.delete_many({"_id": {"$in": usernames}})
 
-try:
-    db = Database()
-except pymongo.errors.ConnectionFailure:
-    db = None
\ No newline at end of file
+    def get_traffic_offsets(self, usernames=None):
+        query = {"_id": {"$in": usernames}} if usernames is not None else {}
+        return {doc["_id"]: doc for doc in self.traffic_offsets.find(query)}
+
+    def set_traffic_offsets(self, offsets):
+        if not offsets:
+            return
+        self.traffic_offsets.bulk_write([
+            pymongo.UpdateOne({"_id": username}, {"$set": {"upload_bytes": upload, "download_bytes": download}}, upsert=True)
+            for username, (upload, download) in offsets.items()
+        ])
+
+    def clear_traffic_offsets(self):
+        return self.traffic_offsets.delete_many({})
+
+    def record_traffic(self, deltas, ts=None):
+        ts = (ts or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+        docs = [
+            {"username": username, "ts": ts, "upload_bytes": upload, "download_bytes": download}
+            for username, (upload, download) in deltas.items() if upload or download
+        ]
+        if docs:
+            self.traffic_history['minute'].insert_many(docs, ordered=False)
+
+    def rollup_traffic(self, since):
+        hour_start = since.replace(minute=0, second=0, microsecond=0)
+        self._rollup_traffic('minute', 'hour', hour_start)
+        self._rollup_traffic('hour', 'day', hour_start.replace(hour=0))
+
+    def _rollup_traffic(self, source, target, since):
+        # Buckets are recomputed from scratch and replaced, so rerunning over a partly
+        # rolled-up period is safe.
+        self.traffic_history[source].aggregate([
+            {"$match": {"ts": {"$gte": since}}},
+            {"$group": {
+                "_id": {"username": "$username", "ts": {"$dateTrunc": {"date": "$ts", "unit": target}}},
+                "upload_bytes": {"$sum": "$upload_bytes"},
+                "download_bytes": {"$sum": "$download_bytes"},
+            }},
+            {"$project": {"_id": 0, "username": "$_id.username", "ts": "$_id.ts", "upload_bytes": 1, "download_bytes": 1}},
+            {"$merge": {
+                "into": self.traffic_history[target].name,
+                "on": ["username", "ts"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ])
+
+    def pick_traffic_granularity(self, start, end=None):
+        end = end or datetime.now(timezone.utc)
+        age = (datetime.now(timezone.utc) - start).total_seconds()
+        if (end - start).total_seconds() <= 3 * 3600 and age <= TRAFFIC_HISTORY_RETENTION['minute']:
+            return 'minute'
+        if age <= TRAFFIC_HISTORY_RETENTION['hour']:
+            return 'hour'
+        return 'day'
+
+    def _traffic_range(self, start, end):
+        query = {"$gte": start}
+        if end:
+            query["$lt"] = end
+        return query
+
+    def get_traffic_history(self, username, start, end=None, granularity=None):
+        granularity = granularity or self.pick_traffic_granularity(start, end)
+        return list(self.traffic_history[granularity].aggregate([
+            {"$match": {"username": username.lower(), "ts": self._traffic_range(start, end)}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$ts", "unit": granularity}},
+                "upload_bytes": {"$sum": "$upload_bytes"},
+                "download_bytes": {"$sum": "$download_bytes"},
+            }},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "ts": "$_id", "upload_bytes": 1, "download_bytes": 1}},
+        ]))
+
+    def get_top_traffic(self, start, end=None, limit=10, by="total", granularity=None):
+        granularity = granularity or self.pick_traffic_granularity(start, end)
+        sort_field = {"upload": "upload_bytes", "download": "download_bytes"}.get(by, "total_bytes")
+        return list(self.traffic_history[granularity].aggregate([
+            {"$match": {"ts": self._traffic_range(start, end)}},
+            {"$group": {
+                "_id": "$username",
+                "upload_bytes": {"$sum": "$upload_bytes"},
+                "download_bytes": {"$sum": "$download_bytes"},
+            }},
+            {"$addFields": {"total_bytes": {"$add": ["$upload_bytes", "$download_bytes"]}}},
+            {"$sort": {sort_field: -1, "_id": 1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "username": "$_id", "upload_bytes": 1, "download_bytes": 1, "total_bytes": 1}},
+        ]))
+
+    def _record_deletions(self, usernames):
+        if not usernames:
+            return
+        now = datetime.now(timezone.utc)
+        with self.revision() as rev:
+            self.tombstones.bulk_write([
+                pymongo.UpdateOne({"_id": username}, {"$set": {"rev": rev, "deleted_at": now}}, upsert=True)
+                for username in usernames
+            ])
+
+class LazyDatabase:
+    """
+    Stands in for a Database and connects on first use, so importing this module
+    costs no round-trip to MongoDB. Truth-testing it connects too: `if not db:`
+    is how callers check that the database is reachable. Attribute access raises
+    ConnectionFailure while it is not.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._database = None
+        self._error = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        database = self._database
+        if database is not None:
+            return database
+        with self._lock:
+            if self._database is None:
+                if self._error is not None and time.monotonic() - self._failed_at < RECONNECT_INTERVAL_SECONDS:
+                    raise self._error
+                try:
+                    self._database = Database(**self._kwargs)
+                except pymongo.errors.ConnectionFailure as e:
+                    self._error, self._failed_at = e, time.monotonic()
+                    raise
+            return self._database
+
+    @property
+    def connected(self):
+        return self._database is not None
+
+    def __bool__(self):
+        try:
+            self.connect()
+            return True
+        except pymongo.errors.ConnectionFailure:
+            return False
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
+db = LazyDatabase()
@@ -13,7 +13,7 @@ def migrate():
         print("users.json not found, no migration needed.")
         return
 
-    if db is None:
+    if not db:
         print("Error: Database connection failed. Cannot perform migration.", file=sys.stderr)
         sys.exit(1)
 
@@ -41,16 +41,19 @@ def migrate():
                 "upload_bytes": data.get("upload_bytes", 0),
                 "download_bytes": data.get("download_bytes", 0),
             }
+            user_doc["total_bytes"] = user_doc["upload_bytes"] + user_doc["download_bytes"]
             
             if user_doc["password"] is None:
                 print(f"Warning: User '{username}' has no password, skipping.", file=sys.stderr)
                 continue
 
-            db.collection.update_one(
-                {'_id': user_doc['_id']},
-                {'$set': user_doc},
-                upsert=True
-            )
+            with db.revision() as rev:
+                user_doc["rev"] = rev
+                db.collection.update_one(
+                    {'_id': user_doc['_id']},
+                    {'$set': user_doc},
+                    upsert=True
+                )
             migrated_count += 1
             print(f"  - Migrated user: {username}")
         
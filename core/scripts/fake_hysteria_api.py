@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Hysteria2 traffic stats API, for tests and benchmarks.
+
+It serves the endpoints the panel uses with the same responses and errors as
+hysteria-server: GET /traffic (and ?clear=1), GET /online and POST /kick, all
+behind the Authorization secret. Behind them is a simulated population whose
+users connect and disconnect at random and generate traffic while online.
+Runs are reproducible with --seed.
+
+Listening on the real API port lets traffic.py, kick.py and list_users.py run
+unchanged against it. Stop hysteria-server first, or use a box without one:
+
+    python3 fake_hysteria_api.py --users 5000 --online-ratio 0.3
+    python3 fake_hysteria_api.py --from-db --churn 0.05 --event-log /tmp/hysteria.log
+
+--event-log writes "client connected/disconnected" lines in hysteria-server's
+log format. The IP limiter reads them instead of the journal when started
+with LOG_SOURCE_FILE pointing at the same file:
+
+    LOG_SOURCE_FILE=/tmp/hysteria.log bash hysteria2/limit.sh run
+
+Tests can also run it in-process on a free port:
+
+    server = FakeHysteriaServer([f"user{i}" for i in range(100)], secret="s")
+    url = server.start()
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, TextIO
+from urllib.parse import parse_qs
+
+DEFAULT_PORT = 25413
+DEFAULT_SECRET = "fake-secret"
+# Client addresses come from the documentation ranges (RFC 5737), which never carry
+# real traffic, so iptables rules the IP limiter adds for them can't cut off the host.
+TEST_NETS = ("192.0.2", "198.51.100", "203.0.113")
+
+
+class SimulatedUser:
+    __slots__ = ("username", "addrs", "tx", "rx", "kicked_until")
+
+    def __init__(self, username: str):
+        self.username = username
+        self.addrs: List[str] = []
+        self.tx = 0
+        self.rx = 0
+        self.kicked_until = 0.0
+
+
+class FakeHysteriaServer:
+    """
+    A simulated user population behind a Hysteria2-compatible stats API.
+
+    Each second, an offline user connects with probability churn * online_ratio and
+    an online one disconnects with probability churn * (1 - online_ratio), so about
+    `online_ratio` of users are online at any time. Every open connection downloads
+    around `rate` bytes per second and uploads a tenth of that. Kicked users stay
+    offline for `kick_cooldown` seconds, as a blocked user failing to re-authenticate would.
+    """
+
+    def __init__(self, usernames: List[str], secret: str = DEFAULT_SECRET, online_ratio: float = 0.2,
+                 churn: float = 0.02, rate: int = 50_000, max_connections: int = 3,
+                 kick_cooldown: float = 60.0, seed: Optional[int] = None, event_log: Optional[TextIO] = None):
+        self.users: Dict[str, SimulatedUser] = {name: SimulatedUser(name) for name in usernames}
+        self.secret = secret
+        self.online_ratio = online_ratio
+        self.churn = churn
+        self.rate = rate
+        self.max_connections = max_connections
+        self.kick_cooldown = kick_cooldown
+        self.event_log = event_log
+        self.requests: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+        for user in self.users.values():
+            if self._random.random() < online_ratio:
+                self._connect(user)
+
+    def _log(self, message: str, user: SimulatedUser, addr: str, **fields):
+        if self.event_log is None:
+            return
+        details = json.dumps({"addr": addr, "id": user.username, **fields})
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.event_log.write(f"{stamp}\tINFO\t{message}\t{details}\n")
+        self.event_log.flush()
+
+    def _connect(self, user: SimulatedUser):
+        for _ in range(self._random.randint(1, self.max_connections)):
+            addr = f"{self._random.choice(TEST_NETS)}.{self._random.randint(1, 254)}:{self._random.randint(1024, 65535)}"
+            user.addrs.append(addr)
+            self._log("client connected", user, addr, count=len(user.addrs))
+
+    def _disconnect(self, user: SimulatedUser, reason: str):
+        while user.addrs:
+            addr = user.addrs.pop()
+            self._log("client disconnected", user, addr, error=reason)
+
+    def tick(self, seconds: float):
+        """Advances the simulation by `seconds`: churn first, then traffic for open connections."""
+        now = time.monotonic()
+        connect_p = min(1.0, self.churn * self.online_ratio * seconds)
+        disconnect_p = min(1.0, self.churn * (1 - self.online_ratio) * seconds)
+        with self._lock:
+            for user in self.users.values():
+                if user.addrs:
+                    if self._random.random() < disconnect_p:
+                        self._disconnect(user, "connection closed")
+                elif user.kicked_until <= now and self._random.random() < connect_p:
+                    self._connect(user)
+                for _ in user.addrs:
+                    rx = int(self._random.uniform(0, 2 * self.rate) * seconds)
+                    user.rx += rx
+                    user.tx += rx // 10
+
+    def traffic(self, clear: bool = False) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            stats = {user.username: {"tx": user.tx, "rx": user.rx}
+                     for user in self.users.values() if user.tx or user.rx}
+            if clear:
+                for user in self.users.values():
+                    user.tx = user.rx = 0
+        return stats
+
+    def online(self) -> Dict[str, int]:
+        with self._lock:
+            return {user.username: len(user.addrs) for user in self.users.values() if user.addrs}
+
+    def kick(self, usernames: List[str]):
+        until = time.monotonic() + self.kick_cooldown
+        with self._lock:
+            for username in usernames:
+                user = self.users.get(username)
+                if user:
+                    self._disconnect(user, "kicked")
+                    user.kicked_until = until
+
+    def count_request(self, path: str):
+        with self._lock:
+            self.requests[path] += 1
+
+    def _handler(self):
+        fake = self
+
+        class APIHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, body: bytes = b"", content_type: str = "application/json"):
+                self.send_response(status)
+                if body:
+                    self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self) -> bool:
+                if self.headers.get("Authorization") == fake.secret:
+                    return True
+                self._reply(401, b"unauthorized", "text/plain")
+                return False
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                fake.count_request(path)
+                if path not in ("/traffic", "/online"):
+                    self._reply(404, b"not found", "text/plain")
+                    return
+                if not self._authorized():
+                    return
+                if path == "/traffic":
+                    # hysteria-server parses ?clear= with Go's strconv.ParseBool.
+                    clear = parse_qs(query).get("clear", [""])[0] in ("1", "t", "T", "true", "TRUE", "True")
+                    data = fake.traffic(clear=clear)
+                else:
+                    data = fake.online()
+                self._reply(200, json.dumps(data).encode())
+
+            def do_POST(self):
+                path = self.path.partition("?")[0]
+                fake.count_request(path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if path != "/kick":
+                    self._reply(404, b"not found", "text/plain")
+                    return
+                if not self._authorized():
+                    return
+                try:
+                    usernames = json.loads(body)
+                    if not isinstance(usernames, list):
+                        raise ValueError("expected a JSON array of user IDs")
+                except ValueError as e:
+                    self._reply(400, str(e).encode(), "text/plain")
+                    return
+                fake.kick([str(username) for username in usernames])
+                self._reply(200)
+
+            def log_message(self, format, *args):
+                pass
+
+        return APIHandler
+
+    def _simulate(self, interval: float):
+        last = time.monotonic()
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            self.tick(now - last)
+            last = now
+
+    def start(self, port: int = 0, host: str = "127.0.0.1", interval: float = 1.0) -> str:
+        """Serves the API and runs the simulation from daemon threads; returns the base URL."""
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-hysteria-api", daemon=True).start()
+        threading.Thread(target=self._simulate, args=(interval,), name="fake-hysteria-sim", daemon=True).start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def load_usernames(args) -> List[str]:
+    if args.from_db:
+        from db.database import db
+        if not db:
+            raise SystemExit("Error: Database connection failed.")
+        return [user["_id"] for user in db.iter_users(fields=[])]
+    if args.users_file:
+        with open(args.users_file) as f:
+            users = json.load(f)
+        # Accepts a plain list of names or the output of list_users.py.
+        return [user["username"] if isinstance(user, dict) else str(user) for user in users]
+    return [f"{args.prefix}{i:0{len(str(args.users))}d}" for i in range(1, args.users + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a simulated Hysteria2 traffic stats API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("--secret", help="API secret. Defaults to trafficStats.secret from config.json, or "
+                                         f"'{DEFAULT_SECRET}' if there is none.")
+    population = parser.add_mutually_exclusive_group()
+    population.add_argument("--users", type=int, default=1000, help="Number of generated users (default: 1000).")
+    population.add_argument("--from-db", action="store_true", help="Simulate the users in the panel's database.")
+    population.add_argument("--users-file", help="JSON list of usernames, or list_users.py output.")
+    parser.add_argument("--prefix", default="user", help="Name prefix of generated users (default: user).")
+    parser.add_argument("--online-ratio", type=float, default=0.2, help="Share of users online at a time (default: 0.2).")
+    parser.add_argument("--churn", type=float, default=0.02, help="Connect/disconnect events per user per second (default: 0.02).")
+    parser.add_argument("--rate", type=int, default=50_000, help="Mean download bytes per second per connection (default: 50000).")
+    parser.add_argument("--max-connections", type=int, default=3, help="Most connections per online user (default: 3).")
+    parser.add_argument("--kick-cooldown", type=float, default=60.0, help="Seconds a kicked user stays offline (default: 60).")
+    parser.add_argument("--interval", type=float, default=1.0, help="Simulation step in seconds (default: 1).")
+    parser.add_argument("--seed", type=int, help="Random seed, for reproducible runs.")
+    parser.add_argument("--event-log", help="File to append hysteria-server style connect/disconnect lines to.")
+    args = parser.parse_args()
+
+    secret = args.secret
+    if not secret:
+        try:
+            import hysteria_api
+            secret = hysteria_api.get_secret()
+        except (ImportError, OSError, KeyError, ValueError):
+            secret = DEFAULT_SECRET
+
+    event_log = open(args.event_log, "a") if args.event_log else None
+    fake = FakeHysteriaServer(load_usernames(args), secret=secret, online_ratio=args.online_ratio,
+                              churn=args.churn, rate=args.rate, max_connections=args.max_connections,
+                              kick_cooldown=args.kick_cooldown, seed=args.seed, event_log=event_log)
+    url = fake.start(args.port, args.host, args.interval)
+    print(f"Serving {len(fake.users)} simulated users at {url} ({len(fake.online())} online). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+        if event_log:
+            event_log.close()
+        print("Requests served: " + (", ".join(f"{path} {count}" for path, count in sorted(fake.requests.items())) or "none"))
+
+
+if __name__ == "__main__":
+    main()
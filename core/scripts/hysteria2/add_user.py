@@ -14,7 +14,7 @@ def add_user(username, traffic_gb, expiration_days, password=None, unlimited_use
         print(f"Usage: {sys.argv[0]} <username> <traffic_limit_GB> <expiration_days> [password] [unlimited_user (true/false)] [note] [creation_date]")
         return 1
 
-    if db is None:
+    if not db:
         print("Error: Database connection failed. Please ensure MongoDB is running and configured.")
         return 1
 
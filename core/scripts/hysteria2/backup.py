@@ -1,17 +1,42 @@
 #!/usr/bin/env python3
 
+import init_paths
+import io
+import os
+import gzip
+import json
+import hashlib
 import zipfile
+import tempfile
+import argparse
 import subprocess
-import shutil
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone, timedelta
+from bson import json_util
+from dotenv import dotenv_values
+from db.database import db, mongo_tools_config
+from paths import CONFIG_ENV
 
 # --- Configuration ---
 DB_NAME = "blitz_panel"
 BACKUP_ROOT_DIR = Path("/opt/hysbackup")
+INCREMENTAL_DIR = BACKUP_ROOT_DIR / "incremental"
+STATE_FILE = BACKUP_ROOT_DIR / ".backup_state.json"
 TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
 BACKUP_FILENAME = BACKUP_ROOT_DIR / f"hysteria_backup_{TIMESTAMP}.zip"
-TEMP_DUMP_DIR = BACKUP_ROOT_DIR / f"mongodump_{TIMESTAMP}"
+INCREMENTAL_FILENAME = INCREMENTAL_DIR / f"hysteria_incremental_{TIMESTAMP}.zip"
+DB_ARCHIVE_NAME = f"{DB_NAME}.archive.gz"
+USERS_CHANGES_NAME = "users.jsonl.gz"
+DELETED_USERS_NAME = "deleted_users.json"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+CHUNK_SIZE = 1024 * 1024
+
+# Deleted users are only tracked for a week (TOMBSTONE_TTL_SECONDS), so the
+# incremental chain must restart from a full backup well within that.
+FULL_BACKUP_MAX_AGE = timedelta(days=1)
+DEFAULT_KEEP_FULL = 5
+DEFAULT_KEEP_INCREMENTAL = 24
 
 FILES_TO_BACKUP = [
     Path("/etc/hysteria/ca.key"),
@@ -20,50 +45,278 @@ FILES_TO_BACKUP = [
     Path("/etc/hysteria/.configs.env"),
 ]
 
-def create_backup():
-    """Dumps the MongoDB database and zips it with config files."""
+class HashingWriter(io.RawIOBase):
+    """Write-through wrapper that tracks the sha256 and size of what passes through it."""
+
+    def __init__(self, target):
+        self.target = target
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.target.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+        return len(data)
+
+def copy_stream(source, target):
+    """Copies a stream in fixed-size chunks and returns its sha256 and size."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := source.read(CHUNK_SIZE):
+        target.write(chunk)
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def add_file(zipf, file_path):
+    with open(file_path, 'rb') as source, zipf.open(file_path.name, 'w') as target:
+        return copy_stream(source, target)
+
+def stored_entry(name):
+    info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return info
+
+def add_database_dump(zipf):
+    """
+    Streams `mongodump --archive --gzip` straight into the zip. The dump is already
+    compressed, so it is stored as-is and never touches the disk uncompressed.
+    """
+    # stderr goes to a file so mongodump's progress log can't fill a pipe and stall the dump.
+    with mongo_tools_config() as mongo_config, tempfile.TemporaryFile() as stderr:
+        mongodump_cmd = ["mongodump", f"--config={mongo_config}", f"--db={DB_NAME}", "--archive", "--gzip"]
+        with subprocess.Popen(mongodump_cmd, stdout=subprocess.PIPE, stderr=stderr) as process:
+            with zipf.open(stored_entry(DB_ARCHIVE_NAME), 'w', force_zip64=True) as target:
+                checksum = copy_stream(process.stdout, target)
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(process.returncode, mongodump_cmd, stderr=stderr.read())
+    return checksum
+
+def add_user_changes(zipf, since_rev):
+    """Writes users changed after `since_rev` as gzipped extended-JSON lines."""
+    count = 0
+    with zipf.open(stored_entry(USERS_CHANGES_NAME), 'w', force_zip64=True) as raw:
+        hashed = HashingWriter(raw)
+        with gzip.GzipFile(fileobj=hashed, mode='wb') as gz:
+            for user in db.get_users_changed_since(since_rev):
+                gz.write((json_util.dumps(user) + "\n").encode('utf-8'))
+                count += 1
+    return count, hashed.digest.hexdigest(), hashed.size
+
+def load_state():
     try:
-        BACKUP_ROOT_DIR.mkdir(parents=True, exist_ok=True)
-        TEMP_DUMP_DIR.mkdir(parents=True)
+        return json.loads(STATE_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_state(state):
+    tmp_path = STATE_FILE.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(state, indent=2))
+    tmp_path.replace(STATE_FILE)
+
+def retention_setting(key, default):
+    """
+    Reads a retention limit from the environment or .configs.env, so the scheduled
+    backups (cli.py backup-hysteria) follow BACKUP_KEEP_FULL and BACKUP_KEEP_INCREMENTAL.
+    """
+    file_values = dotenv_values(CONFIG_ENV) if os.path.isfile(CONFIG_ENV) else {}
+    value = (os.environ.get(key) or file_values.get(key) or "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Warning: ignoring invalid {key}={value!r}; using {default}.")
+        return default
+
+def incremental_chains():
+    """Maps each full backup name to its incrementals, ordered by since_rev."""
+    chains = {}
+    if INCREMENTAL_DIR.is_dir():
+        for path in INCREMENTAL_DIR.glob("hysteria_incremental_*.zip"):
+            manifest = read_manifest(path)
+            chains.setdefault(manifest.get("base"), []).append((manifest.get("since_rev"), manifest.get("rev"), path))
+    for chain in chains.values():
+        chain.sort(key=lambda link: (link[0] is None, link[0] or 0))
+    return chains
+
+def needs_full_backup(state, keep_incremental=DEFAULT_KEEP_INCREMENTAL):
+    if not state or not (BACKUP_ROOT_DIR / state["base"]).is_file():
+        return True
+    # A full chain starts over instead of growing past what retention would keep.
+    if len(incremental_chains().get(state["base"], [])) >= keep_incremental:
+        return True
+    return datetime.now(timezone.utc) - datetime.fromisoformat(state["full_created_at"]) > FULL_BACKUP_MAX_AGE
+
+def create_full_backup():
+    """Streams the MongoDB dump and config files into a zip with a checksummed manifest."""
+    # Read before dumping: changes made during the dump, and writes whose revision was
+    # allocated but not yet written, are above it and exported again by the next incremental.
+    rev = db.stable_revision() if db else None
+    now = datetime.now(timezone.utc)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "type": "full",
+        "created_at": now.isoformat(),
+        "db_name": DB_NAME,
+        "database": DB_ARCHIVE_NAME,
+        "rev": rev,
+        "files": {},
+        "configs": {},
+    }
+
+    print(f"Creating backup archive: {BACKUP_FILENAME}")
+    with zipfile.ZipFile(BACKUP_FILENAME, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_path in FILES_TO_BACKUP:
+            if file_path.exists() and file_path.is_file():
+                sha256, size = add_file(zipf, file_path)
+                manifest["files"][file_path.name] = {"sha256": sha256, "size": size}
+                manifest["configs"][file_path.name] = {"sha256": sha256, "stored_in": BACKUP_FILENAME.name}
+                print(f"  - Added {file_path.name}")
+            else:
+                print(f"  - Warning: Skipping missing file {file_path}")
 
         print(f"Dumping database '{DB_NAME}'...")
-        mongodump_cmd = [
-            "mongodump",
-            f"--db={DB_NAME}",
-            f"--out={TEMP_DUMP_DIR}"
-        ]
-        subprocess.run(mongodump_cmd, check=True, capture_output=True)
-        print("Database dump successful.")
-
-        print(f"Creating backup archive: {BACKUP_FILENAME}")
-        with zipfile.ZipFile(BACKUP_FILENAME, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in FILES_TO_BACKUP:
-                if file_path.exists() and file_path.is_file():
-                    zipf.write(file_path, arcname=file_path.name)
-                    print(f"  - Added {file_path.name}")
-                else:
-                    print(f"  - Warning: Skipping missing file {file_path}")
-
-            dump_content_path = TEMP_DUMP_DIR / DB_NAME
-            if dump_content_path.exists():
-                for file_path in dump_content_path.rglob('*'):
-                    arcname = file_path.relative_to(TEMP_DUMP_DIR)
-                    zipf.write(file_path, arcname=arcname)
-                print(f"  - Added database dump for '{DB_NAME}'")
+        sha256, size = add_database_dump(zipf)
+        manifest["files"][DB_ARCHIVE_NAME] = {"sha256": sha256, "size": size}
+        print(f"  - Added database dump for '{DB_NAME}' ({size} bytes)")
+
+        zipf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+    if rev is not None:
+        save_state({"base": BACKUP_FILENAME.name, "full_created_at": now.isoformat(), "rev": rev,
+                    "configs": manifest["configs"]})
+    return BACKUP_FILENAME
+
+def create_incremental_backup(state):
+    """
+    Exports only users whose revision moved since the previous backup in the chain,
+    the users deleted since then, and config files whose content changed.
+    """
+    since_rev = state["rev"]
+    # Read before exporting, for the same reason as in create_full_backup().
+    rev = db.stable_revision()
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "type": "incremental",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "db_name": DB_NAME,
+        "base": state["base"],
+        "since_rev": since_rev,
+        "rev": rev,
+        "files": {},
+        "configs": dict(state["configs"]),
+    }
+
+    INCREMENTAL_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"Creating incremental backup: {INCREMENTAL_FILENAME} (changes after revision {since_rev})")
+    with zipfile.ZipFile(INCREMENTAL_FILENAME, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_path in FILES_TO_BACKUP:
+            if not (file_path.exists() and file_path.is_file()):
+                continue
+            sha256 = file_sha256(file_path)
+            if manifest["configs"].get(file_path.name, {}).get("sha256") == sha256:
+                continue
+            add_file(zipf, file_path)
+            manifest["files"][file_path.name] = {"sha256": sha256, "size": file_path.stat().st_size}
+            manifest["configs"][file_path.name] = {"sha256": sha256, "stored_in": INCREMENTAL_FILENAME.name}
+            print(f"  - Added changed {file_path.name}")
+
+        count, sha256, size = add_user_changes(zipf, since_rev)
+        manifest["files"][USERS_CHANGES_NAME] = {"sha256": sha256, "size": size}
+
+        deleted = db.get_deleted_since(since_rev)
+        deleted_bytes = json.dumps(deleted).encode()
+        zipf.writestr(DELETED_USERS_NAME, deleted_bytes)
+        manifest["files"][DELETED_USERS_NAME] = {"sha256": hashlib.sha256(deleted_bytes).hexdigest(), "size": len(deleted_bytes)}
+        print(f"  - Added {count} changed and {len(deleted)} deleted users")
+
+        zipf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+    save_state({**state, "rev": rev, "configs": manifest["configs"]})
+    return INCREMENTAL_FILENAME
+
+def read_manifest(backup_path):
+    try:
+        with zipfile.ZipFile(backup_path) as zipf:
+            return json.loads(zipf.read(MANIFEST_NAME))
+    except (KeyError, zipfile.BadZipFile, json.JSONDecodeError):
+        return {}
+
+def apply_retention(keep_full, keep_incremental):
+    """
+    Keeps the newest `keep_full` full backups and, for each of them, the first
+    `keep_incremental` links of its incremental chain. Chains of pruned full backups
+    go as a whole and long chains lose their tail, never a link in the middle:
+    restore stops at the first gap and would skip everything after it.
+    """
+    fulls = sorted(BACKUP_ROOT_DIR.glob("hysteria_backup_*.zip"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in fulls[keep_full:]:
+        old.unlink(missing_ok=True)
+        print(f"  - Pruned full backup {old.name}")
+
+    kept_fulls = {p.name: read_manifest(p).get("rev") for p in fulls[:keep_full]}
+    for base, chain in incremental_chains().items():
+        rev, length = kept_fulls.get(base), 0
+        for since_rev, link_rev, path in chain:
+            # Links past a gap can never be applied, so they count as tail too.
+            if base in kept_fulls and since_rev == rev and length < keep_incremental:
+                rev, length = link_rev, length + 1
+                continue
+            rev = None
+            path.unlink(missing_ok=True)
+            print(f"  - Pruned incremental backup {path.name}")
+
+def create_backup(incremental=False, keep_full=DEFAULT_KEEP_FULL, keep_incremental=DEFAULT_KEEP_INCREMENTAL):
+    target = None
+    try:
+        BACKUP_ROOT_DIR.mkdir(parents=True, exist_ok=True)
+        state = load_state()
+        if incremental and db and not needs_full_backup(state, keep_incremental):
+            target = INCREMENTAL_FILENAME
+            create_incremental_backup(state)
+        else:
+            if incremental:
+                print("No recent full backup to build on; creating a full backup.")
+            target = BACKUP_FILENAME
+            create_full_backup()
 
         print("\nBackup successfully created.")
+        if keep_full > 0:
+            apply_retention(keep_full, keep_incremental)
 
     except FileNotFoundError:
+        if target: target.unlink(missing_ok=True)
         print("\nBackup failed! 'mongodump' command not found. Is MongoDB installed and in your PATH?")
     except subprocess.CalledProcessError as e:
+        if target: target.unlink(missing_ok=True)
         print("\nBackup failed! Error during mongodump.")
         print(f"  - Stderr: {e.stderr.decode().strip()}")
     except Exception as e:
+        if target: target.unlink(missing_ok=True)
         print(f"\nBackup failed! An unexpected error occurred: {e}")
-    finally:
-        if TEMP_DUMP_DIR.exists():
-            shutil.rmtree(TEMP_DUMP_DIR)
-            print("Temporary dump directory cleaned up.")
 
 if __name__ == "__main__":
-    create_backup()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Back up the panel database and Hysteria2 configuration.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only export changes since the last backup when a recent full backup exists.")
+    parser.add_argument("--keep-full", type=int, default=retention_setting("BACKUP_KEEP_FULL", DEFAULT_KEEP_FULL),
+                        help=f"Full backups to keep; 0 disables pruning (default: BACKUP_KEEP_FULL in .configs.env, or {DEFAULT_KEEP_FULL}).")
+    parser.add_argument("--keep-incremental", type=int,
+                        default=retention_setting("BACKUP_KEEP_INCREMENTAL", DEFAULT_KEEP_INCREMENTAL),
+                        help=f"Incremental backups to keep per full backup (default: BACKUP_KEEP_INCREMENTAL in "
+                             f".configs.env, or {DEFAULT_KEEP_INCREMENTAL}).")
+    args = parser.parse_args()
+    create_backup(args.incremental, args.keep_full, args.keep_incremental)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import init_paths
+import sys
+import json
+import argparse
+import re
+from hysteria2_api import Hysteria2Error
+from db.database import db
+from paths import *
+import hysteria_api
+
+OPERATIONS = ('block', 'unblock', 'extend', 'reset', 'set-quota')
+# Operations that take something away from the user; online sessions are kicked
+# so clients re-authenticate against the new state.
+KICK_OPERATIONS = {'block', 'reset', 'set-quota'}
+
+
+def build_update(operation, days=None, traffic_gb=None):
+    if operation == 'block':
+        return {'$set': {'blocked': True}}
+    if operation == 'unblock':
+        return {'$set': {'blocked': False}}
+    if operation == 'extend':
+        return {'$inc': {'expiration_days': days}}
+    if operation == 'reset':
+        return {
+            '$set': {'status': 'On-hold', 'blocked': False},
+            '$unset': {'account_creation_date': "", 'download_bytes': "", 'upload_bytes': "", 'total_bytes': ""}
+        }
+    if operation == 'set-quota':
+        return {'$set': {'max_download_bytes': int(float(traffic_gb) * 1073741824)}}
+    raise ValueError(f"Unknown operation '{operation}'.")
+
+
+def build_query(usernames=None, status=None, blocked=None, prefix=None):
+    if usernames:
+        return {'_id': {'$in': [username.lower() for username in usernames]}}
+    query = {}
+    if status:
+        query['status'] = status
+    if blocked is not None:
+        query['blocked'] = blocked
+    if prefix:
+        query['_id'] = {'$regex': f'^{re.escape(prefix.lower())}'}
+    return query
+
+
+def kick_users(usernames):
+    failures = hysteria_api.kick_clients(usernames)
+    if failures:
+        raise failures[0][1]
+
+
+def bulk_edit_users(operation, query, days=None, traffic_gb=None):
+    if not db:
+        return 1, {"error": "Database connection failed. Please ensure MongoDB is running."}
+
+    try:
+        update = build_update(operation, days, traffic_gb)
+        targets = list(db.collection.find(query, {'_id': 1, 'status': 1, 'online_count': 1}))
+        usernames = [doc['_id'] for doc in targets]
+        if operation == 'extend':
+            # Unlimited accounts (0 days) stay unlimited.
+            usernames = [doc['_id'] for doc in db.collection.find({'_id': {'$in': usernames}, 'expiration_days': {'$gt': 0}}, {'_id': 1})]
+
+        if not usernames:
+            return 0, {"matched": 0, "modified": 0, "kicked": 0}
+
+        result = db.update_users(usernames, update)
+    except Exception as e:
+        return 1, {"error": f"An error occurred while updating users: {e}"}
+
+    kicked = []
+    if operation in KICK_OPERATIONS:
+        kicked = [doc['_id'] for doc in targets
+                  if doc['_id'] in usernames and (doc.get('online_count', 0) > 0 or doc.get('status') == 'Online')]
+        if kicked:
+            try:
+                kick_users(kicked)
+            except (Hysteria2Error, ConnectionError, FileNotFoundError, KeyError, ValueError, json.JSONDecodeError) as e:
+                print(f"Warning: users were updated but kicking online users failed: {e}", file=sys.stderr)
+                kicked = []
+
+    return 0, {"matched": len(usernames), "modified": result.modified_count, "kicked": len(kicked)}
+
+
+def str_to_bool(val):
+    if val.lower() in ('true', 'y', '1'):
+        return True
+    elif val.lower() in ('false', 'n', '0'):
+        return False
+    raise argparse.ArgumentTypeError('Boolean value expected (true/false, y/n, 1/0).')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply one change to many users with a single database update.")
+    parser.add_argument("operation", choices=OPERATIONS, help="The change to apply.")
+    parser.add_argument("--users", nargs='+', help="Usernames to change. Overrides the filter options.")
+    parser.add_argument("--status", choices=['Online', 'Offline', 'On-hold'], help="Filter: only users with this status.")
+    parser.add_argument("--blocked", type=str_to_bool, help="Filter: only blocked (true) or unblocked (false) users.")
+    parser.add_argument("--prefix", help="Filter: only usernames starting with this prefix.")
+    parser.add_argument("--days", type=int, help="Days to add for 'extend'.")
+    parser.add_argument("--traffic-gb", dest="traffic_gb", type=float, help="New traffic limit in GB for 'set-quota'. Use 0 for unlimited.")
+
+    args = parser.parse_args()
+
+    if args.operation == 'extend' and not args.days:
+        parser.error("'extend' requires --days.")
+    if args.operation == 'set-quota' and args.traffic_gb is None:
+        parser.error("'set-quota' requires --traffic-gb.")
+    if not args.users and not (args.status or args.blocked is not None or args.prefix):
+        parser.error("Provide --users or at least one filter option.")
+
+    query = build_query(args.users, args.status, args.blocked, args.prefix)
+    exit_code, summary = bulk_edit_users(args.operation, query, args.days, args.traffic_gb)
+    print(json.dumps(summary))
+    sys.exit(exit_code)
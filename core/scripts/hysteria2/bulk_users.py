@@ -9,7 +9,7 @@ import string
 from db.database import db
 
 def add_bulk_users(traffic_gb, expiration_days, count, prefix, start_number, unlimited_user):
-    if db is None:
+    if not db:
         print("Error: Database connection failed. Please ensure MongoDB is running.")
         return 1
         
@@ -61,7 +61,7 @@ def add_bulk_users(traffic_gb, expiration_days, count, prefix, start_number, unl
         users_to_insert.append(user_doc)
 
     try:
-        db.collection.insert_many(users_to_insert, ordered=False)
+        db.add_users(users_to_insert)
         print(f"\nSuccessfully added {len(users_to_insert)} new users.")
         return 0
     except Exception as e:
@@ -9,7 +9,7 @@ from datetime import datetime
 from db.database import db
 
 def edit_user(username, new_username=None, new_password=None, traffic_gb=None, expiration_days=None, creation_date=None, blocked=None, unlimited_user=None, note=None):
-    if db is None:
+    if not db:
         print("Error: Database connection failed.", file=sys.stderr)
         return 1
 
@@ -64,8 +64,9 @@ def edit_user(username, new_username=None, new_password=None, traffic_gb=None, e
             
             updated_user_data.pop('_id')
             updated_user_data['_id'] = new_username_lower
-
-            db.collection.insert_one(updated_user_data)
+            with db.revision() as rev:
+                updated_user_data['rev'] = rev
+                db.collection.insert_one(updated_user_data)
             db.delete_user(username_lower)
             print(f"User '{username}' successfully renamed to '{new_username}'.")
 
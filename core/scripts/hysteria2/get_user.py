@@ -17,7 +17,7 @@ def get_user_info(username):
     Returns:
         int: 0 on success, 1 on failure.
     """
-    if db is None:
+    if not db:
         print("Error: Database connection failed. Please ensure MongoDB is running.")
         return 1
         
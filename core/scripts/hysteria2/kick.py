@@ -3,13 +3,12 @@
 import init_paths
 import os
 import sys
-import json
 import fcntl
 import datetime
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from db.database import db
-from hysteria2_api import Hysteria2Client
+import hysteria_api
 from paths import CONFIG_FILE
 
 logging.basicConfig(
@@ -22,7 +21,8 @@ logger = logging.getLogger()
 
 LOCKFILE = "/tmp/kick.lock"
 MAX_WORKERS = 8
-API_BASE_URL = 'http://127.0.0.1:25413'
+# The only fields process_user() reads; notes and passwords are never fetched.
+EXPIRY_FIELDS = ['account_creation_date', 'expiration_days', 'max_download_bytes', 'upload_bytes', 'download_bytes']
 
 def acquire_lock():
     try:
@@ -35,19 +35,18 @@ def acquire_lock():
 
 def get_secret():
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-        return config.get('trafficStats', {}).get('secret')
-    except (json.JSONDecodeError, FileNotFoundError):
+        return hysteria_api.get_secret(CONFIG_FILE)
+    except (FileNotFoundError, KeyError, ValueError):
         return None
 
-def kick_users_api(usernames, secret):
-    try:
-        client = Hysteria2Client(base_url=API_BASE_URL, secret=secret)
-        client.kick_clients(usernames)
-        logger.info(f"Successfully sent kick command for users: {', '.join(usernames)}")
-    except Exception as e:
-        logger.error(f"Error kicking users via API: {e}")
+def kick_users_api(usernames):
+    failures = hysteria_api.kick_clients(usernames)
+    for batch, e in failures:
+        logger.error(f"Error kicking users via API: {', '.join(batch)}: {e}")
+    failed = {username for batch, _ in failures for username in batch}
+    kicked = [username for username in usernames if username not in failed]
+    if kicked:
+        logger.info(f"Successfully sent kick command for users: {', '.join(kicked)}")
 
 def process_user(user_doc):
     username = user_doc.get('_id')
@@ -89,7 +88,7 @@ def process_user(user_doc):
 def main():
     lock_file = acquire_lock()
     try:
-        if db is None:
+        if not db:
             logger.error("Database connection failed. Exiting.")
             sys.exit(1)
 
@@ -98,12 +97,12 @@ def main():
             logger.error(f"Could not find secret in {CONFIG_FILE}. Exiting.")
             sys.exit(1)
             
-        all_users = db.get_all_users()
-        logger.info(f"Loaded {len(all_users)} users from the database for processing.")
+        active_users = db.iter_users(fields=EXPIRY_FIELDS, filter={"blocked": {"$ne": True}})
             
         users_to_block = []
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_user = {executor.submit(process_user, user_doc): user_doc for user_doc in all_users}
+            future_to_user = {executor.submit(process_user, user_doc): user_doc for user_doc in active_users}
+            logger.info(f"Loaded {len(future_to_user)} unblocked users from the database for processing.")
             for future in future_to_user:
                 result = future.result()
                 if result:
@@ -119,10 +118,7 @@ def main():
             db.update_user(username, {'blocked': True})
         logger.info("Successfully updated user statuses to 'blocked' in the database.")
 
-        batch_size = 50 
-        for i in range(0, len(users_to_block), batch_size):
-            batch = users_to_block[i:i + batch_size]
-            kick_users_api(batch, secret)
+        kick_users_api(users_to_block)
                         
     except Exception as e:
         logger.error(f"An unexpected error occurred in main execution: {e}", exc_info=True)
@@ -3,35 +3,16 @@
 import argparse
 import json
 import sys
-import os
-from hysteria2_api import Hysteria2Client, Hysteria2Error
+from hysteria2_api import Hysteria2Error
 
 from init_paths import *
 from paths import *
+import hysteria_api
 
 
 def get_api_secret(config_path: str) -> str:
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Configuration file not found: {config_path}")
-
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-
-        traffic_stats = config_data.get('trafficStats')
-        if not isinstance(traffic_stats, dict):
-             raise KeyError("Key 'trafficStats' not found or is not a dictionary in config")
-
-        secret = traffic_stats.get('secret')
-        if not secret:
-            raise ValueError("Value for 'trafficStats.secret' not found or is empty in config")
-
-        return secret
-
-    except json.JSONDecodeError as e:
-        raise json.JSONDecodeError(f"Error parsing JSON file: {config_path} - {e.msg}", e.doc, e.pos)
-    except KeyError as e:
-         raise KeyError(f"Missing expected key {e} in {config_path}")
+    """Returns trafficStats.secret, raising FileNotFoundError, KeyError or ValueError if it is missing."""
+    return hysteria_api.get_secret(config_path)
 
 
 def main():
@@ -48,16 +29,9 @@ def main():
     usernames_to_kick = args.usernames
 
     try:
-        api_secret = get_api_secret(CONFIG_FILE)
-        # print(api_secret)
-        # print(f"Kicking user: {username_to_kick}")
-
-        client = Hysteria2Client(
-            base_url=API_BASE_URL,
-            secret=api_secret
-        )
-
-        client.kick_clients(usernames_to_kick)
+        failures = hysteria_api.kick_clients(usernames_to_kick)
+        if failures:
+            raise failures[0][1]
         sys.exit(0)
 
     except (FileNotFoundError, KeyError, ValueError, json.JSONDecodeError) as e:
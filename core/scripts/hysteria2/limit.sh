@@ -6,6 +6,9 @@ SERVICE_NAME="hysteria-ip-limit.service"
 DB_NAME="blitz_panel"
 CONNECTIONS_COLLECTION="active_connections"
 
+# An exported MONGO_URI wins over .configs.env, as it does for the panel.
+ENV_MONGO_URI="${MONGO_URI:-}"
+
 if [ -f "$CONFIG_ENV" ]; then
   source "$CONFIG_ENV"
   BLOCK_DURATION="${BLOCK_DURATION:-60}" # Default to 60 seconds
@@ -17,19 +20,68 @@ else
   echo -e "BLOCK_DURATION=240\nMAX_IPS=5" > "$CONFIG_ENV"
 fi
 
+# Prints KEY's value from .configs.env as plain text, without surrounding quotes.
+# `source` can't be trusted with a URI: an unquoted "&" backgrounds the assignment
+# and a "$" in the password is expanded.
+read_config_value() {
+  local value
+  value=$(grep -m1 "^$1=" "$CONFIG_ENV" 2>/dev/null | cut -d= -f2- | tr -d '\r')
+  case "$value" in
+    \"*\") value="${value:1:${#value}-2}" ;;
+    \'*\') value="${value:1:${#value}-2}" ;;
+  esac
+  printf '%s' "$value"
+}
+
+MONGO_URI="${ENV_MONGO_URI:-$(read_config_value MONGO_URI)}"
+
 [ ! -f "$BLOCK_LIST" ] && touch "$BLOCK_LIST"
 
+# Counters for the scheduler's /metrics endpoint, which serves this textfile.
+METRICS_FILE="/tmp/blitz_metrics/limiter.prom"
+USER_BLOCKS_TOTAL=0
+IP_BLOCKS_TOTAL=0
+REJECTED_CONNECTIONS_TOTAL=0
+
 log_message() {
     local level="$1"
     local message="$2"
     echo "[$(date +"%Y-%m-%d %H:%M:%S")] [$level] $message"
 }
 
+write_metrics() {
+    mkdir -p "$(dirname "$METRICS_FILE")"
+    cat > "$METRICS_FILE.tmp" <<EOF
+# HELP blitz_limiter_user_blocks_total Users blocked for exceeding the IP limit.
+# TYPE blitz_limiter_user_blocks_total counter
+blitz_limiter_user_blocks_total $USER_BLOCKS_TOTAL
+# HELP blitz_limiter_ip_blocks_total IP addresses blocked by the IP limiter.
+# TYPE blitz_limiter_ip_blocks_total counter
+blitz_limiter_ip_blocks_total $IP_BLOCKS_TOTAL
+# HELP blitz_limiter_rejected_connections_total Connections seen from already blocked IPs.
+# TYPE blitz_limiter_rejected_connections_total counter
+blitz_limiter_rejected_connections_total $REJECTED_CONNECTIONS_TOTAL
+# HELP blitz_limiter_blocked_ips IP addresses currently blocked.
+# TYPE blitz_limiter_blocked_ips gauge
+blitz_limiter_blocked_ips $(grep -c . "$BLOCK_LIST")
+EOF
+    mv "$METRICS_FILE.tmp" "$METRICS_FILE"
+}
+
+# Runs a mongosh script against $DB_NAME on MONGO_URI from .configs.env, the same
+# server the panel uses. The URI can hold credentials, so it is passed in the
+# environment rather than on the command line, where `ps` would show it.
+run_mongosh() {
+    BLITZ_MONGO_URI="${MONGO_URI:-mongodb://localhost:27017/}" BLITZ_DB_NAME="$DB_NAME" mongosh --nodb --quiet --eval "
+        db = connect(process.env.BLITZ_MONGO_URI).getSiblingDB(process.env.BLITZ_DB_NAME);
+        $1"
+}
+
 add_ip_to_db() {
     local username="$1"
     local ip_address="$2"
     
-    mongosh "$DB_NAME" --quiet --eval "
+    run_mongosh "
         db.getCollection('$CONNECTIONS_COLLECTION').updateOne(
             { _id: '$username' },
             { \$addToSet: { ips: '$ip_address' } },
@@ -43,7 +95,7 @@ remove_ip_from_db() {
     local username="$1"
     local ip_address="$2"
     
-    mongosh "$DB_NAME" --quiet --eval "
+    run_mongosh "
         db.getCollection('$CONNECTIONS_COLLECTION').updateOne(
             { _id: '$username' },
             { \$pull: { ips: '$ip_address' } }
@@ -67,6 +119,7 @@ block_ip() {
 
     iptables -I INPUT -s "$ip_address" -j DROP
     echo "$ip_address,$username,$unblock_time" >> "$BLOCK_LIST"
+    IP_BLOCKS_TOTAL=$((IP_BLOCKS_TOTAL + 1))
     log_message "WARN" "Blocked IP $ip_address for user $username for $BLOCK_DURATION seconds"
 }
 
@@ -84,7 +137,7 @@ block_all_user_ips() {
     local username="$1"
     
     local ips_json
-    ips_json=$(mongosh "$DB_NAME" --quiet --eval "
+    ips_json=$(run_mongosh "
         JSON.stringify(db.getCollection('$CONNECTIONS_COLLECTION').findOne({_id: '$username'}, {_id: 0, ips: 1}))
     ")
 
@@ -102,6 +155,8 @@ block_all_user_ips() {
         fi
     done
 
+    USER_BLOCKS_TOTAL=$((USER_BLOCKS_TOTAL + 1))
+    write_metrics
     log_message "WARN" "User $username has been completely blocked for $BLOCK_DURATION seconds"
 }
 
@@ -123,7 +178,7 @@ check_ip_limit() {
     local username="$1"
     
     local ip_count
-    ip_count=$(mongosh "$DB_NAME" --quiet --eval "
+    ip_count=$(run_mongosh "
         db.getCollection('$CONNECTIONS_COLLECTION').findOne({_id: '$username'})?.ips?.length || 0;
     ")
 
@@ -147,7 +202,7 @@ clean_all() {
     > "$BLOCK_LIST"
     log_message "INFO" "All IPs unblocked and block list file cleared."
 
-    mongosh "$DB_NAME" --quiet --eval "
+    run_mongosh "
         db.getCollection('$CONNECTIONS_COLLECTION').drop();
     "
     log_message "INFO" "MongoDB collection '$CONNECTIONS_COLLECTION' has been dropped."
@@ -167,6 +222,8 @@ parse_log_line() {
         if echo "$log_line" | grep -q "client connected"; then
             if grep -q "^$ip_address," "$BLOCK_LIST"; then
                 log_message "WARN" "Rejected connection from blocked IP $ip_address for user $username"
+                REJECTED_CONNECTIONS_TOTAL=$((REJECTED_CONNECTIONS_TOTAL + 1))
+                write_metrics
                 if ! iptables -C INPUT -s "$ip_address" -j DROP 2>/dev/null; then
                     iptables -I INPUT -s "$ip_address" -j DROP
                 fi
@@ -174,7 +231,7 @@ parse_log_line() {
                 add_ip_to_db "$username" "$ip_address"
                 
                 local is_unlimited
-                is_unlimited=$(mongosh "$DB_NAME" --quiet --eval "
+                is_unlimited=$(run_mongosh "
                     db.users.findOne({_id: '$username'}, {_id: 0, unlimited_user: 1})?.unlimited_user || false;
                 ")
 
@@ -279,6 +336,7 @@ case "$1" in
     run)
         log_message "INFO" "Monitoring Hysteria connections. Max IPs: $MAX_IPS, Block Duration: $BLOCK_DURATION s"
         log_message "INFO" "--------------------------------------------------------"
+        write_metrics
 
         (
             while true; do
@@ -295,7 +353,16 @@ case "$1" in
         }
         trap cleanup SIGINT SIGTERM
 
-        journalctl -u hysteria-server.service -f | while read -r line; do
+        # LOG_SOURCE_FILE swaps the hysteria-server journal for a file of log lines in the
+        # same format, such as the --event-log of fake_hysteria_api.py in tests and benchmarks.
+        if [ -n "$LOG_SOURCE_FILE" ]; then
+            log_message "INFO" "Reading connection events from $LOG_SOURCE_FILE"
+            read_log() { tail -n 0 -F "$LOG_SOURCE_FILE"; }
+        else
+            read_log() { journalctl -u hysteria-server.service -f; }
+        fi
+
+        read_log | while read -r line; do
             if echo "$line" | grep -q "client connected\|client disconnected"; then
                 parse_log_line "$line"
             fi
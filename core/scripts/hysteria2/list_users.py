@@ -4,22 +4,20 @@ import init_paths
 import sys
 import json
 from pathlib import Path
-from hysteria2_api import Hysteria2Client
+import hysteria_api
 from db.database import db
-from paths import CONFIG_FILE, API_BASE_URL
+from paths import CONFIG_FILE
 
 def get_secret() -> str | None:
     if not CONFIG_FILE.exists():
         return None
     try:
-        with CONFIG_FILE.open('r') as f:
-            config_data = json.load(f)
-        return config_data.get("trafficStats", {}).get("secret")
-    except (json.JSONDecodeError, IOError):
+        return hysteria_api.get_secret(CONFIG_FILE)
+    except (KeyError, ValueError, IOError):
         return None
 
 def get_users_from_db() -> list:
-    if db is None:
+    if not db:
         print("Error: Database connection failed.", file=sys.stderr)
         return []
     try:
@@ -41,8 +39,7 @@ def main():
 
     if secret:
         try:
-            client = Hysteria2Client(base_url=API_BASE_URL, secret=secret)
-            online_clients = client.get_online_clients()
+            online_clients = hysteria_api.get_client().get_online_clients()
 
             users_dict = {user['username']: user for user in users_list}
             for username, status in online_clients.items():
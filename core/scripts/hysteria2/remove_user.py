@@ -6,7 +6,7 @@ import os
 from db.database import db
 
 def remove_users(usernames):
-    if db is None:
+    if not db:
         return 1, "Error: Database connection failed. Please ensure MongoDB is running."
 
     if not usernames:
@@ -14,7 +14,7 @@ def reset_user(username):
     Returns:
         int: 0 on success, 1 on failure.
     """
-    if db is None:
+    if not db:
         print("Error: Database connection failed. Please ensure MongoDB is running.")
         return 1
 
@@ -24,20 +24,23 @@ def reset_user(username):
             print(f"Error: User '{username}' not found in the database.")
             return 1
 
-        result = db.collection.update_one(
-            {'_id': username},
-            {
-                '$set': {
-                    'status': 'On-hold',
-                    'blocked': False
-                },
-                '$unset': {
-                    'account_creation_date': "",
-                    'download_bytes': "",
-                    'upload_bytes': ""
+        with db.revision() as rev:
+            result = db.collection.update_one(
+                {'_id': username},
+                {
+                    '$set': {
+                        'status': 'On-hold',
+                        'blocked': False,
+                        'rev': rev
+                    },
+                    '$unset': {
+                        'account_creation_date': "",
+                        'download_bytes': "",
+                        'upload_bytes': "",
+                        'total_bytes': ""
+                    }
                 }
-            }
-        )
+            )
 
         if result.modified_count > 0:
             print(f"User '{username}' has been reset successfully.")
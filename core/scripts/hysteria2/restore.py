@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
 
+import init_paths
 import os
 import sys
+import gzip
 import json
+import time
 import shutil
+import hashlib
 import zipfile
+import argparse
 import tempfile
 import subprocess
 from pathlib import Path
+from db.database import mongo_tools_config
 
 DB_NAME = "blitz_panel"
+DB_ARCHIVE_NAME = f"{DB_NAME}.archive.gz"
+INCREMENTAL_DIR = Path("/opt/hysbackup/incremental")
+USERS_CHANGES_NAME = "users.jsonl.gz"
+DELETED_USERS_NAME = "deleted_users.json"
+MANIFEST_NAME = "manifest.json"
+UPSERT_BATCH_SIZE = 1000
+CHUNK_SIZE = 1024 * 1024
+CONFIG_FILES = ["config.json", ".configs.env", "ca.key", "ca.crt"]
 HYSTERIA_CONFIG_DIR = Path("/etc/hysteria")
 CLI_PATH = Path("/etc/hysteria/core/cli.py")
+PROGRESS_FILE = Path("/tmp/hysteria_restore_progress.json")
+CPU_COUNT = os.cpu_count() or 1
+DEFAULT_PARALLEL_COLLECTIONS = min(4, CPU_COUNT)
+DEFAULT_INSERTION_WORKERS = max(2, CPU_COUNT)
 
 def run_command(command, check=False):
     try:
         return subprocess.run(
             command,
-            shell=True,
+            shell=isinstance(command, str),
             capture_output=True,
             text=True,
             check=check
@@ -27,12 +45,176 @@ def run_command(command, check=False):
         print(f"Stderr: {e.stderr}", file=sys.stderr)
         raise
 
+def report_progress(percent, message, state="running"):
+    """
+    Prints a `PROGRESS <percent> <message>` line for the caller and mirrors it to
+    PROGRESS_FILE so other processes (the webpanel) can poll a running restore.
+    """
+    print(f"PROGRESS {percent} {message}", flush=True)
+    progress = {"state": state, "percent": percent, "message": message, "updated_at": time.time()}
+    tmp_path = PROGRESS_FILE.with_suffix('.tmp')
+    try:
+        tmp_path.write_text(json.dumps(progress))
+        tmp_path.replace(PROGRESS_FILE)
+    except OSError:
+        pass
+
+def read_manifest(zip_path):
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            return json.loads(zf.read(MANIFEST_NAME))
+    except (KeyError, zipfile.BadZipFile, json.JSONDecodeError):
+        return {}
+
+def find_incrementals(backup_zip_file, full_manifest):
+    """Returns the unbroken chain of incrementals built on this full backup, oldest first."""
+    if full_manifest.get("rev") is None or not INCREMENTAL_DIR.is_dir():
+        return []
+    candidates = []
+    for path in INCREMENTAL_DIR.glob("hysteria_incremental_*.zip"):
+        manifest = read_manifest(path)
+        if manifest.get("base") == backup_zip_file.name:
+            candidates.append((manifest["since_rev"], path, manifest))
+    candidates.sort(key=lambda item: item[0])
+
+    chain, rev = [], full_manifest["rev"]
+    for since_rev, path, manifest in candidates:
+        if since_rev != rev:
+            print(f"Warning: incremental chain is broken at {path.name}; later incrementals are skipped.", file=sys.stderr)
+            break
+        chain.append((path, manifest))
+        rev = manifest["rev"]
+    return chain
+
+def apply_incrementals(chain):
+    import pymongo
+    from bson import json_util
+    from db.database import db
+
+    for path, manifest in chain:
+        print(f"Applying incremental backup {path.name}...")
+        with zipfile.ZipFile(path) as zf:
+            deleted = json.loads(zf.read(DELETED_USERS_NAME))
+            if deleted:
+                db.collection.delete_many({"_id": {"$in": deleted}})
+
+            batch = []
+            with zf.open(USERS_CHANGES_NAME) as raw, gzip.open(raw, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    user = json_util.loads(line)
+                    batch.append(pymongo.ReplaceOne({"_id": user["_id"]}, user, upsert=True))
+                    if len(batch) >= UPSERT_BATCH_SIZE:
+                        db.collection.bulk_write(batch, ordered=False)
+                        batch = []
+            if batch:
+                db.collection.bulk_write(batch, ordered=False)
+
+            for filename, config in manifest.get("configs", {}).items():
+                if config.get("stored_in") == path.name:
+                    with zf.open(filename) as src, open(HYSTERIA_CONFIG_DIR / filename, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    print(f" - Restored {filename} from {path.name}")
+
+        print(f" - {len(deleted)} users removed, changes up to revision {manifest['rev']} applied")
+
+    if chain:
+        db.counters.update_one({"_id": "users_rev"}, {"$max": {"seq": chain[-1][1]["rev"]}}, upsert=True)
+
+def verify_manifest(zf, manifest):
+    """Checks every file listed in the manifest against its recorded size and sha256."""
+    files = manifest.get("files", {})
+    total = sum(meta.get("size", 0) for meta in files.values()) or 1
+    done = 0
+    for name, meta in files.items():
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with zf.open(name) as entry:
+                while chunk := entry.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+        except KeyError:
+            raise ValueError(f"Backup is missing {name} listed in its manifest.")
+        if size != meta.get("size") or digest.hexdigest() != meta.get("sha256"):
+            raise ValueError(f"Checksum mismatch for {name}; the backup is corrupt.")
+        done += size
+        report_progress(int(10 * done / total), f"Verified {name}")
+
+def mongorestore_command(args, mongo_config, *source):
+    return [
+        "mongorestore", f"--config={mongo_config}", f"--nsInclude={DB_NAME}.*", "--drop", "--noIndexRestore",
+        f"--numParallelCollections={args.parallel_collections}",
+        f"--numInsertionWorkersPerCollection={args.insertion_workers}",
+        *source,
+    ]
+
+def stream_database(zf, args):
+    """Pipes the archive entry straight into mongorestore's stdin without extracting it."""
+    info = zf.getinfo(DB_ARCHIVE_NAME)
+    fed = 0
+    last_percent = 10
+    with mongo_tools_config() as mongo_config, tempfile.TemporaryFile() as stderr, \
+            subprocess.Popen(command := mongorestore_command(args, mongo_config, "--gzip", "--archive"),
+                             stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr) as process:
+        try:
+            with zf.open(info) as entry:
+                while chunk := entry.read(CHUNK_SIZE):
+                    process.stdin.write(chunk)
+                    fed += len(chunk)
+                    percent = 10 + int(70 * fed / max(info.file_size, 1))
+                    if percent > last_percent:
+                        last_percent = percent
+                        report_progress(percent, f"Restoring database ({fed // (1024 * 1024)} MB loaded)")
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        if process.wait() != 0:
+            stderr.seek(0)
+            error = stderr.read().decode(errors='replace').strip()
+            print(f"Stderr: {error}", file=sys.stderr)
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=error)
+
+def restore_dump_dir(zf, args, temp_dir):
+    """Restores backups made before the archive format, which store a mongodump directory."""
+    members = [name for name in zf.namelist() if name.startswith(f"{DB_NAME}/")]
+    zf.extractall(temp_dir, members)
+    report_progress(40, "Restoring database from dump directory")
+    with mongo_tools_config() as mongo_config:
+        run_command(mongorestore_command(args, mongo_config, f"--dir={temp_dir}"), check=True)
+
+def rebuild_indexes():
+    # Data is loaded with --noIndexRestore; building the indexes once afterwards
+    # is much faster than maintaining them on every inserted document.
+    from db.database import db
+    if not db:
+        raise RuntimeError("Could not connect to MongoDB to rebuild indexes.")
+    db.ensure_indexes()
+
+def restore_config_files(zf):
+    names = set(zf.namelist())
+    for filename in CONFIG_FILES:
+        if filename in names:
+            with zf.open(filename) as src, open(HYSTERIA_CONFIG_DIR / filename, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            print(f" - Restored {filename}")
+
 def main():
-    if len(sys.argv) < 2:
-        print("Error: Backup file path is required.", file=sys.stderr)
-        return 1
+    parser = argparse.ArgumentParser(description="Restore the panel database and Hysteria2 configuration from a backup.")
+    parser.add_argument("backup_file", help="Full backup (.zip) to restore.")
+    parser.add_argument("--with-incrementals", action="store_true",
+                        help="Also replay the incremental backups taken on top of this full backup.")
+    parser.add_argument("--parallel-collections", type=int, default=DEFAULT_PARALLEL_COLLECTIONS,
+                        help=f"Collections mongorestore loads at once (default: {DEFAULT_PARALLEL_COLLECTIONS}).")
+    parser.add_argument("--insertion-workers", type=int, default=DEFAULT_INSERTION_WORKERS,
+                        help=f"Insertion workers per collection (default: {DEFAULT_INSERTION_WORKERS}).")
+    args = parser.parse_args()
 
-    backup_zip_file = Path(sys.argv[1])
+    backup_zip_file = Path(args.backup_file)
+    report_progress(0, "Starting restore")
 
     if not backup_zip_file.is_file():
         print(f"Error: Backup file not found: {backup_zip_file}", file=sys.stderr)
@@ -43,51 +225,63 @@ def main():
         return 1
 
     try:
-        with tempfile.TemporaryDirectory() as temp_dir_str:
-            temp_dir = Path(temp_dir_str)
-            print(f"Extracting backup to temporary directory: {temp_dir}")
-
-            try:
-                with zipfile.ZipFile(backup_zip_file) as zf:
-                    zf.extractall(temp_dir)
-            except zipfile.BadZipFile:
-                print("Error: Invalid or corrupt ZIP file.", file=sys.stderr)
-                return 1
+        zf = zipfile.ZipFile(backup_zip_file)
+    except zipfile.BadZipFile:
+        print("Error: Invalid or corrupt ZIP file.", file=sys.stderr)
+        return 1
 
-            dump_dir = temp_dir / DB_NAME
-            if not dump_dir.is_dir():
+    try:
+        with zf, tempfile.TemporaryDirectory() as temp_dir_str:
+            names = set(zf.namelist())
+            has_archive = DB_ARCHIVE_NAME in names
+            if not has_archive and not any(name.startswith(f"{DB_NAME}/") for name in names):
                 print("Error: Backup is in an old format or is missing the database dump.", file=sys.stderr)
                 print("Please use a backup created with the new MongoDB-aware script.", file=sys.stderr)
                 return 1
-            
-            print("Restoring MongoDB database... (This will drop the current user data)")
-            run_command(f"mongorestore --db={DB_NAME} --drop --dir='{dump_dir}'", check=True)
+
+            manifest = json.loads(zf.read(MANIFEST_NAME)) if MANIFEST_NAME in names else {}
+            if manifest:
+                report_progress(0, "Verifying backup checksums")
+                verify_manifest(zf, manifest)
+            else:
+                print("Warning: Backup has no manifest; skipping checksum verification.")
+
+            report_progress(10, "Restoring MongoDB database (this drops the current user data)")
+            if has_archive:
+                stream_database(zf, args)
+            else:
+                restore_dump_dir(zf, args, Path(temp_dir_str))
+
+            report_progress(80, "Rebuilding database indexes")
+            rebuild_indexes()
             print("Database restored successfully.")
 
-            files_to_copy = ["config.json", ".configs.env", "ca.key", "ca.crt"]
-            print("Restoring configuration files...")
-            for filename in files_to_copy:
-                src = temp_dir / filename
-                if src.exists():
-                    shutil.copy2(src, HYSTERIA_CONFIG_DIR / filename)
-                    print(f" - Restored {filename}")
+            report_progress(88, "Restoring configuration files")
+            restore_config_files(zf)
+
+            if args.with_incrementals:
+                report_progress(90, "Applying incremental backups")
+                apply_incrementals(find_incrementals(backup_zip_file, manifest))
 
-            adjust_config_file()
+        adjust_config_file()
 
-            print("Setting permissions...")
-            run_command(f"chown hysteria:hysteria {HYSTERIA_CONFIG_DIR / 'ca.key'} {HYSTERIA_CONFIG_DIR / 'ca.crt'}")
-            run_command(f"chmod 640 {HYSTERIA_CONFIG_DIR / 'ca.key'} {HYSTERIA_CONFIG_DIR / 'ca.crt'}")
+        report_progress(93, "Setting permissions")
+        run_command(["chown", "hysteria:hysteria", HYSTERIA_CONFIG_DIR / 'ca.key', HYSTERIA_CONFIG_DIR / 'ca.crt'])
+        run_command(["chmod", "640", HYSTERIA_CONFIG_DIR / 'ca.key', HYSTERIA_CONFIG_DIR / 'ca.crt'])
 
-            print("Restarting Hysteria service...")
-            run_command(f"python3 {CLI_PATH} restart-hysteria2", check=True)
+        report_progress(96, "Restarting Hysteria service")
+        run_command(["python3", CLI_PATH, "restart-hysteria2"], check=True)
 
-            print("\nRestore completed successfully.")
-            return 0
+        report_progress(100, "Restore completed successfully", state="done")
+        print("\nRestore completed successfully.")
+        return 0
 
     except subprocess.CalledProcessError:
+        report_progress(0, "Restore failed due to a command execution error", state="failed")
         print("\nRestore failed due to a command execution error.", file=sys.stderr)
         return 1
     except Exception as e:
+        report_progress(0, f"Restore failed: {e}", state="failed")
         print(f"\nAn unexpected error occurred during restore: {e}", file=sys.stderr)
         return 1
 
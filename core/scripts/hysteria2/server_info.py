@@ -173,13 +173,11 @@ async def get_connection_counts() -> tuple[int, int]:
 
 
 def get_online_user_count_sync() -> int:
-    if db is None:
+    if not db:
         print("Error: Database connection failed.", file=sys.stderr)
         return 0
     try:
-        users = db.get_all_users()
-        total_online = sum(int(user.get("online_count", 0) or 0) for user in users)
-        return total_online
+        return int(db.sum_users(["online_count"])["online_count"])
     except Exception as e:
         print(f"Error retrieving online user count from database: {e}", file=sys.stderr)
         return 0
@@ -192,14 +190,12 @@ async def get_online_user_count() -> int:
 
 
 def get_user_traffic_sync() -> tuple[int, int]:
-    if db is None:
+    if not db:
         print("Error: Database connection failed.", file=sys.stderr)
         return 0, 0
     try:
-        users = db.get_all_users()
-        total_upload = sum(int(user.get("upload_bytes", 0) or 0) for user in users)
-        total_download = sum(int(user.get("download_bytes", 0) or 0) for user in users)
-        return total_upload, total_download
+        totals = db.sum_users(["upload_bytes", "download_bytes"])
+        return int(totals["upload_bytes"]), int(totals["download_bytes"])
     except Exception as e:
         print(f"Error retrieving user traffic from database: {e}", file=sys.stderr)
         return 0, 0
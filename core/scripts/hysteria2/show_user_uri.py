@@ -126,7 +126,7 @@ def display_uri_and_qr(uri: str, label: str, args: argparse.Namespace, terminal_
             print(center_text(line, terminal_width))
 
 def show_uri(args: argparse.Namespace) -> None:
-    if db is None:
+    if not db:
         print("\033[0;31mError:\033[0m Database connection failed.")
         return
 
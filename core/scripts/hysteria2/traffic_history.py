@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import init_paths
+import re
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from db.database import db
+
+WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_time(value):
+    """Accepts a relative window such as '30m', '24h' or '7d', or an ISO date/datetime (UTC unless stated)."""
+    match = re.fullmatch(r'(\d+)([mhdw])', value.strip().lower())
+    if match:
+        return datetime.now(timezone.utc) - timedelta(**{WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time '{value}'. Use e.g. 24h, 7d or 2024-05-01T00:00.")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def serialize(rows):
+    for row in rows:
+        if 'ts' in row:
+            row['ts'] = row['ts'].replace(tzinfo=timezone.utc).isoformat()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and maintain per-user traffic history.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rollup_parser = subparsers.add_parser("rollup", help="Downsample minute buckets into hour and day buckets.")
+    rollup_parser.add_argument("--since", type=parse_time, default="2h", help="Rebuild buckets from this time (default: 2h).")
+
+    user_parser = subparsers.add_parser("user", help="Usage of one user over a range.")
+    user_parser.add_argument("username")
+    user_parser.add_argument("--since", type=parse_time, default="24h", help="Range start (default: 24h).")
+    user_parser.add_argument("--until", type=parse_time, help="Range end (default: now).")
+    user_parser.add_argument("--granularity", choices=['minute', 'hour', 'day'], help="Bucket size (default: picked from the range).")
+
+    top_parser = subparsers.add_parser("top", help="Heaviest users over a range, or all time.")
+    top_parser.add_argument("--since", type=parse_time, help="Range start (default: all-time counters).")
+    top_parser.add_argument("--until", type=parse_time, help="Range end (default: now).")
+    top_parser.add_argument("--limit", type=int, default=10, help="Number of users (default: 10).")
+    top_parser.add_argument("--by", choices=['total', 'upload', 'download'], default='total', help="Sort key (default: total).")
+
+    args = parser.parse_args()
+
+    if not db:
+        print("Error: Database connection failed.", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.command == "rollup":
+            db.rollup_traffic(args.since)
+            return
+        if args.command == "user":
+            result = db.get_traffic_history(args.username, args.since, args.until, args.granularity)
+        elif args.since:
+            result = db.get_top_traffic(args.since, args.until, args.limit, args.by)
+        else:
+            result = db.get_top_users(args.limit, args.by)
+    except Exception as e:
+        print(f"Error querying traffic history: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(serialize(result), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -46,12 +46,10 @@ def generate_uri(username: str, auth_password: str, ip: str, port: str,
 def process_users(target_usernames: List[str]) -> List[Dict[str, Any]]:
     config = load_json_file(CONFIG_FILE)
     if not config:
-        print("Error: Could not load Hysteria2 configuration file.", file=sys.stderr)
-        sys.exit(1)
-        
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
-        sys.exit(1)
+        raise RuntimeError("Could not load Hysteria2 configuration file.")
+
+    if not db:
+        raise RuntimeError("Database connection failed.")
 
     nodes = load_json_file(NODES_JSON_PATH) or []
     
@@ -76,14 +74,15 @@ def process_users(target_usernames: List[str]) -> List[Dict[str, Any]]:
     ip6 = hy2_env.get('IP6')
     ns_domain, ns_port, ns_subpath = ns_env.get('HYSTERIA_DOMAIN'), ns_env.get('HYSTERIA_PORT'), ns_env.get('SUBPATH')
 
+    passwords = {doc["_id"]: doc.get("password") for doc in db.get_users(target_usernames, fields=["password"])}
+
     results = []
     for username in target_usernames:
-        user_data = db.get_user(username)
-        if not user_data or "password" not in user_data:
+        auth_password = passwords.get(username.lower())
+        if not auth_password:
             results.append({"username": username, "error": "User not found or password not set"})
             continue
 
-        auth_password = user_data["password"]
         user_output = {"username": username, "ipv4": None, "ipv6": None, "nodes": [], "normal_sub": None}
 
         if ip4 and ip4 != "None":
@@ -132,12 +131,11 @@ def main():
     target_usernames = args.usernames
     
     if args.all:
-        if db is None:
+        if not db:
             print("Error: Database connection failed.", file=sys.stderr)
             sys.exit(1)
         try:
-            all_users_docs = db.get_all_users()
-            target_usernames = [user['_id'] for user in all_users_docs]
+            target_usernames = [user['_id'] for user in db.iter_users(fields=[])]
         except Exception as e:
             print(f"Error retrieving all users from database: {e}", file=sys.stderr)
             sys.exit(1)
@@ -146,7 +144,11 @@ def main():
         parser.print_help()
         sys.exit(1)
 
-    output_list = process_users(target_usernames)
+    try:
+        output_list = process_users(target_usernames)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
     print(json.dumps(output_list, indent=2))
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+"""
+Shared clients for the Hysteria2 traffic stats API (traffic, online, kick).
+
+Every process gets one long-lived client with a pooled keep-alive session, so
+repeated calls reuse the same TCP connection, and the trafficStats secret is
+only re-read from config.json when that file changes.
+
+    import hysteria_api
+
+    online = hysteria_api.get_client().get_online_clients()
+    hysteria_api.kick_clients(usernames)
+
+The aiohttp and FastAPI services can use the asyncio variant instead:
+
+    client = hysteria_api.get_async_client()
+    await client.kick_clients(usernames)
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from hysteria2_api import Hysteria2Client, Hysteria2Error, Hysteria2AuthError, Hysteria2ConnectionError, TrafficStats, OnlineStatus
+
+import metrics
+from paths import CONFIG_FILE, API_BASE_URL
+
+CONNECT_TIMEOUT = 2
+READ_TIMEOUT = 10
+# Only failed connection attempts are retried: the request never reached the
+# server. A read error may follow a /traffic?clear=1 that already cleared the
+# counters, and retrying it would lose that traffic.
+CONNECT_RETRIES = 2
+POOL_SIZE = 8
+KICK_BATCH_SIZE = 50
+
+API_DURATION = metrics.histogram('blitz_hysteria_api_duration_seconds', 'Hysteria2 stats API request time.', ('endpoint',))
+
+_secret_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_clients: Dict[Tuple[str, str], "PooledHysteria2Client"] = {}
+_lock = threading.Lock()
+
+
+def get_secret(config_path=CONFIG_FILE) -> str:
+    """
+    Returns trafficStats.secret from config.json, re-reading the file only when
+    its mtime or size has changed.
+    """
+    config_path = str(config_path)
+    try:
+        stat = os.stat(config_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Configuration file not found: {config_path}")
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        cached = _secret_cache.get(config_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise json.JSONDecodeError(f"Error parsing JSON file: {config_path} - {e.msg}", e.doc, e.pos)
+
+    traffic_stats = config_data.get('trafficStats')
+    if not isinstance(traffic_stats, dict):
+        raise KeyError(f"Key 'trafficStats' not found or is not a dictionary in {config_path}")
+    secret = traffic_stats.get('secret')
+    if not secret:
+        raise ValueError("Value for 'trafficStats.secret' not found or is empty in config")
+
+    with _lock:
+        _secret_cache[config_path] = (stamp, secret)
+    return secret
+
+
+@contextmanager
+def _timed(endpoint: str):
+    path = endpoint.split('?', 1)[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        API_DURATION.observe(elapsed, endpoint=path)
+        metrics.record_call("hysteria", path, elapsed)
+
+
+class PooledHysteria2Client(Hysteria2Client):
+    """Hysteria2Client with a sized keep-alive pool, split timeouts and connect retries."""
+
+    def __init__(self, base_url: str, secret: str):
+        super().__init__(base_url, secret=secret)
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        retry = Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES, read=0, status=0, other=0,
+                      allowed_methods=None, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _make_request(self, method, endpoint, json_data=None):
+        with _timed(endpoint):
+            return super()._make_request(method, endpoint, json_data)
+
+
+def get_client(base_url: str = API_BASE_URL, config_path=CONFIG_FILE) -> PooledHysteria2Client:
+    """
+    Returns this process's client for `base_url`. A new one is built only when the
+    secret in config.json has changed.
+    """
+    secret = get_secret(config_path)
+    with _lock:
+        client = _clients.get((base_url, secret))
+        if client is None:
+            for key in [key for key in _clients if key[0] == base_url]:
+                _clients.pop(key)._session.close()
+            client = _clients[(base_url, secret)] = PooledHysteria2Client(base_url, secret)
+        return client
+
+
+def _batches(usernames: List[str], batch_size: int) -> List[List[str]]:
+    return [usernames[i:i + batch_size] for i in range(0, len(usernames), batch_size)]
+
+
+def kick_clients(usernames: List[str], client: Optional[Hysteria2Client] = None,
+                 batch_size: int = KICK_BATCH_SIZE) -> List[Tuple[List[str], Exception]]:
+    """
+    Kicks `usernames` in batches of `batch_size`, sending the batches concurrently.
+    Returns the (batch, error) pairs of batches that failed.
+    """
+    batches = _batches(usernames, batch_size)
+    if not batches:
+        return []
+    client = client or get_client()
+
+    def kick(batch):
+        try:
+            client.kick_clients(batch)
+            return None
+        except Exception as e:
+            return batch, e
+
+    if len(batches) == 1:
+        results = [kick(batches[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(batches))) as executor:
+            results = list(executor.map(kick, batches))
+    return [result for result in results if result]
+
+
+class AsyncHysteria2Client:
+    """
+    asyncio version of Hysteria2Client, returning the same models and raising the
+    same errors. The aiohttp session is created on first use inside the running loop.
+    """
+
+    def __init__(self, base_url: str = API_BASE_URL, config_path=CONFIG_FILE):
+        self.base_url = base_url.rstrip('/')
+        self.config_path = config_path
+        self._session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=CONNECT_TIMEOUT + READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+        return self._session
+
+    async def _request(self, method: str, endpoint: str, json_data=None):
+        import aiohttp
+
+        headers = {'Authorization': get_secret(self.config_path)}
+        for attempt in range(CONNECT_RETRIES + 1):
+            try:
+                with _timed(endpoint):
+                    async with self._get_session().request(method, self.base_url + endpoint,
+                                                           json=json_data, headers=headers) as response:
+                        text = await response.text()
+                        if response.status == 401:
+                            raise Hysteria2AuthError(f"Authentication failed: {text}")
+                        response.raise_for_status()
+                        return json.loads(text) if text else {}
+            except aiohttp.ClientConnectorError as e:
+                if attempt == CONNECT_RETRIES:
+                    raise Hysteria2ConnectionError(f"Connection error: {e}")
+                await asyncio.sleep(0.2 * 2 ** attempt)
+            except asyncio.TimeoutError as e:
+                raise Hysteria2ConnectionError(f"Request timed out: {e}")
+            except aiohttp.ClientError as e:
+                raise Hysteria2Error(f"Request error: {e}")
+            except json.JSONDecodeError as e:
+                raise Hysteria2Error(f"Invalid JSON response: {e}")
+
+    async def get_traffic_stats(self, clear: bool = False) -> Dict[str, TrafficStats]:
+        response = await self._request('GET', '/traffic?clear=1' if clear else '/traffic')
+        return {client_id: TrafficStats.from_dict(stats) for client_id, stats in response.items()}
+
+    async def get_online_clients(self) -> Dict[str, OnlineStatus]:
+        response = await self._request('GET', '/online')
+        return {client_id: OnlineStatus.from_int(connections) for client_id, connections in response.items()}
+
+    async def kick_clients(self, usernames: List[str], batch_size: int = KICK_BATCH_SIZE) -> List[Tuple[List[str], Exception]]:
+        """Async counterpart of the module-level kick_clients(): batches are sent concurrently."""
+        batches = _batches(usernames, batch_size)
+        results = await asyncio.gather(*(self._request('POST', '/kick', batch) for batch in batches),
+                                       return_exceptions=True)
+        return [(batch, result) for batch, result in zip(batches, results) if isinstance(result, Exception)]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+_async_client: Optional[AsyncHysteria2Client] = None
+
+
+def get_async_client() -> AsyncHysteria2Client:
+    """Returns the AsyncHysteria2Client shared by this process, which like its users runs one event loop."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncHysteria2Client()
+        return _async_client
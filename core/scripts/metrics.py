@@ -0,0 +1,360 @@
+"""
+Prometheus text-format instrumentation shared by the panel services.
+
+Each long-running process (webpanel, normalsub, scheduler, bot) keeps its own
+registry and serves it as /metrics. Short-lived processes such as the traffic
+tick and the IP limiter write their metrics to TEXTFILE_DIR instead, and the
+scheduler includes those files in its own /metrics output. Services with several
+worker processes (the webpanel) save each worker's registry under WORKERS_DIR and
+serve the sum of all of them, whichever worker answers the scrape.
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TEXTFILE_DIR = Path("/tmp/blitz_metrics")
+# Per-process snapshots of services that run several worker processes. A subdirectory,
+# so the scheduler, which serves TEXTFILE_DIR/*.prom, doesn't pick them up.
+WORKERS_DIR = TEXTFILE_DIR / "workers"
+WORKER_FLUSH_INTERVAL = 5.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        with self._lock:
+            samples = self._samples()
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(header + samples)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class Registry:
+    """Holds the metrics of one process. Asking for an existing name returns the same metric."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+    def snapshot(self) -> Dict:
+        """Returns every metric and its values as JSON-serializable data, for merge()."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            with metric._lock:
+                values = [[list(key), value] for key, value in metric._values.items()]
+            snapshot[metric.name] = {
+                "kind": metric.kind,
+                "documentation": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(metric.buckets[:-1]) if isinstance(metric, Histogram) else None,
+                "values": values,
+            }
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        """Adds the values of a snapshot() into this registry: counters, gauges and histogram buckets are summed."""
+        kinds = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+        for name, data in snapshot.items():
+            cls = kinds[data["kind"]]
+            kwargs = {"buckets": tuple(data["buckets"])} if cls is Histogram else {}
+            metric = self._get_or_create(cls, name, data["documentation"], tuple(data["labelnames"]), **kwargs)
+            with metric._lock:
+                for key, value in data["values"]:
+                    key = tuple(key)
+                    if cls is Histogram:
+                        counts, total = metric._values.get(key, ([0] * len(metric.buckets), 0.0))
+                        metric._values[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                    else:
+                        metric._values[key] = metric._values.get(key, 0) + value
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+_call_trace: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar('blitz_call_trace', default=None)
+
+
+@contextmanager
+def trace_calls():
+    """
+    Collects the (kind, name, seconds) of every MongoDB command and subprocess
+    run inside this context, so a slow request can be logged with its calls.
+    """
+    calls: List[Tuple[str, str, float]] = []
+    token = _call_trace.set(calls)
+    try:
+        yield calls
+    finally:
+        _call_trace.reset(token)
+
+
+def record_call(kind: str, name: str, seconds: float):
+    calls = _call_trace.get()
+    if calls is not None:
+        calls.append((kind, name, seconds))
+
+
+def describe_calls(calls: List[Tuple[str, str, float]], limit: int = 10) -> str:
+    """Summarizes a call trace as per-kind totals followed by the slowest calls."""
+    if not calls:
+        return "no DB or subprocess calls"
+    totals: Dict[str, Tuple[int, float]] = {}
+    for kind, _, seconds in calls:
+        count, total = totals.get(kind, (0, 0.0))
+        totals[kind] = (count + 1, total + seconds)
+    summary = ", ".join(f"{count} {kind} ({total:.3f}s)" for kind, (count, total) in sorted(totals.items()))
+    slowest = sorted(calls, key=lambda call: call[2], reverse=True)[:limit]
+    return summary + "; slowest: " + ", ".join(f"{kind} {name} {seconds:.3f}s" for kind, name, seconds in slowest)
+
+
+def render(include_textfiles: bool = False) -> str:
+    """Returns this process's metrics, optionally followed by the files in TEXTFILE_DIR."""
+    output = REGISTRY.render()
+    if include_textfiles and TEXTFILE_DIR.is_dir():
+        for path in sorted(TEXTFILE_DIR.glob("*.prom")):
+            try:
+                output += path.read_text()
+            except OSError:
+                continue
+    return output
+
+
+def write_textfile(name: str, registry: Registry = REGISTRY):
+    """Dumps a registry to TEXTFILE_DIR/<name>.prom for the scheduler to serve."""
+    TEXTFILE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TEXTFILE_DIR / f".{name}.prom.tmp"
+    tmp_path.write_text(registry.render())
+    tmp_path.replace(TEXTFILE_DIR / f"{name}.prom")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_worker_snapshot(group: str, registry: Registry = REGISTRY):
+    """Saves this process's registry as one worker of `group`, for render_workers()."""
+    directory = WORKERS_DIR / group
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f".{os.getpid()}.json.tmp"
+    tmp_path.write_text(json.dumps(registry.snapshot()))
+    tmp_path.replace(directory / f"{os.getpid()}.json")
+
+
+def render_workers(group: str) -> str:
+    """
+    Returns the metrics of every live worker of `group` summed into one registry, so a
+    scrape gives the same totals whichever worker answers it. Other workers' values are
+    at most WORKER_FLUSH_INTERVAL seconds old. Snapshots of exited workers are removed;
+    Prometheus sees the drop as a counter reset.
+    """
+    write_worker_snapshot(group)
+    merged = Registry()
+    for path in sorted((WORKERS_DIR / group).glob("*.json")):
+        if not _pid_alive(int(path.stem)):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            merged.merge(json.loads(path.read_text()))
+        except (OSError, ValueError, KeyError):
+            continue
+    return merged.render()
+
+
+def start_worker_flusher(group: str, interval: float = WORKER_FLUSH_INTERVAL) -> threading.Thread:
+    """Writes this worker's snapshot every `interval` seconds from a daemon thread."""
+
+    def flush():
+        while True:
+            try:
+                write_worker_snapshot(group)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=flush, name="metrics-flusher", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", include_textfiles: bool = False) -> Optional[ThreadingHTTPServer]:
+    """Serves /metrics from a daemon thread, for processes that have no web server of their own."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render(include_textfiles).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"Could not start metrics server on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def mongo_listener():
+    """Returns a pymongo command listener that records the duration of every MongoDB command."""
+    from pymongo import monitoring
+
+    durations = histogram("blitz_mongo_command_duration_seconds", "MongoDB command round-trip time.", ("command",))
+    failures = counter("blitz_mongo_command_failures_total", "MongoDB commands that returned an error.", ("command",))
+
+    class CommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            durations.observe(event.duration_micros / 1e6, command=event.command_name)
+            record_call("mongo", event.command_name, event.duration_micros / 1e6)
+
+        def failed(self, event):
+            durations.observe(event.duration_micros / 1e6, command=event.command_name)
+            failures.inc(command=event.command_name)
+            record_call("mongo", event.command_name, event.duration_micros / 1e6)
+
+    return CommandTimer()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+from replication import check_entry
+
+load_dotenv()
+
+
+@dataclass
+class ReplicaConfig:
+    panel_url: str
+    api_token: str
+    listen_address: str
+    listen_port: int
+    sync_interval: int
+    snapshot_interval: int
+    request_timeout: int
+
+
+def load_config() -> ReplicaConfig:
+    panel_url = os.getenv('PANEL_URL', '').rstrip('/')
+    api_token = os.getenv('PANEL_API_TOKEN', '')
+    if not panel_url or not api_token:
+        print("Error: PANEL_URL and PANEL_API_TOKEN must be set.", file=sys.stderr)
+        sys.exit(1)
+    return ReplicaConfig(
+        panel_url=panel_url,
+        api_token=api_token,
+        listen_address=os.getenv('LISTEN_ADDRESS', '127.0.0.1'),
+        listen_port=int(os.getenv('LISTEN_PORT', '28262')),
+        sync_interval=int(os.getenv('SYNC_INTERVAL', '15')),
+        snapshot_interval=int(os.getenv('SNAPSHOT_INTERVAL', '3600')),
+        request_timeout=int(os.getenv('REQUEST_TIMEOUT', '10')),
+    )
+
+
+class UserReplica:
+    """In-memory copy of the panel's user table, kept current from the replication feed."""
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.version: Optional[int] = None
+        self.last_sync: float = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    def apply_snapshot(self, payload: Dict[str, Any]) -> None:
+        self.users = {entry['id']: entry for entry in payload['users']}
+        self.version = payload['version']
+        self.last_sync = time.time()
+
+    def apply_delta(self, payload: Dict[str, Any]) -> None:
+        for username in payload['deleted']:
+            self.users.pop(username, None)
+        for entry in payload['upserts']:
+            self.users[entry['id']] = entry
+        self.version = max(self.version or 0, payload['version'])
+        self.last_sync = time.time()
+
+    def authenticate(self, username: str, password: str) -> bool:
+        return check_entry(self.users.get(username), password)
+
+
+class FeedClient:
+    def __init__(self, config: ReplicaConfig):
+        self.config = config
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        self.session = aiohttp.ClientSession(
+            headers={'Authorization': self.config.api_token, 'Accept-Encoding': 'gzip'},
+            timeout=aiohttp.ClientTimeout(total=self.config.request_timeout)
+        )
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = f"{self.config.panel_url}/api/v1/config/ip/nodes/users/{path}"
+        async with self.session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def snapshot(self) -> Dict[str, Any]:
+        return await self._get('snapshot')
+
+    async def delta(self, since: int) -> Dict[str, Any]:
+        return await self._get('delta', params={'since': since})
+
+
+async def sync_loop(app: web.Application) -> None:
+    replica: UserReplica = app['replica']
+    feed: FeedClient = app['feed']
+    config: ReplicaConfig = app['config']
+    last_snapshot = 0.0
+
+    while True:
+        try:
+            if not replica.ready or time.monotonic() - last_snapshot >= config.snapshot_interval:
+                replica.apply_snapshot(await feed.snapshot())
+                last_snapshot = time.monotonic()
+            else:
+                replica.apply_delta(await feed.delta(replica.version))
+        except asyncio.CancelledError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError, KeyError) as e:
+            print(f"Replication sync failed: {e}", file=sys.stderr)
+        await asyncio.sleep(config.sync_interval)
+
+
+async def authenticate(request: web.Request) -> web.Response:
+    replica: UserReplica = request.app['replica']
+    try:
+        data = await request.json()
+        username, password = data.get("auth", "").split(":", 1)
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        return web.json_response({"ok": False}, status=400)
+
+    # Fail closed until the first snapshot has been applied.
+    if replica.ready and replica.authenticate(username, password):
+        return web.json_response({"ok": True, "id": username})
+    return web.json_response({"ok": False})
+
+
+async def health(request: web.Request) -> web.Response:
+    replica: UserReplica = request.app['replica']
+    return web.json_response({
+        "ready": replica.ready,
+        "version": replica.version,
+        "users": len(replica.users),
+        "last_sync": replica.last_sync,
+    }, status=200 if replica.ready else 503)
+
+
+async def on_startup(app: web.Application) -> None:
+    await app['feed'].start()
+    app['sync_task'] = asyncio.create_task(sync_loop(app))
+
+
+async def on_cleanup(app: web.Application) -> None:
+    app['sync_task'].cancel()
+    try:
+        await app['sync_task']
+    except asyncio.CancelledError:
+        pass
+    await app['feed'].close()
+
+
+def create_app(config: ReplicaConfig) -> web.Application:
+    app = web.Application()
+    app['config'] = config
+    app['replica'] = UserReplica()
+    app['feed'] = FeedClient(config)
+    app.router.add_post("/auth", authenticate)
+    app.router.add_get("/health", health)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    config = load_config()
+    web.run_app(create_app(config), host=config.listen_address, port=config.listen_port)
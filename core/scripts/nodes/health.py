@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import fcntl
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+NODES_HEALTH_PATH = Path("/etc/hysteria/nodes_health.json")
+
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+STATUS_UNKNOWN = "unknown"
+
+PROBE_TIMEOUT = 3.0
+# Probe results older than this are ignored when ordering, so a stopped
+# prober degrades to plain nodes.json order instead of hiding nodes.
+STALE_AFTER_SECONDS = 300
+# A node that pushes traffic counts as up while its last push is fresher than
+# STALE_AFTER_SECONDS, and as down once it has been silent for this long.
+PUSH_SILENT_AFTER_SECONDS = 2 * STALE_AFTER_SECONDS
+
+_LOCK_PATH = Path(f"{NODES_HEALTH_PATH}.lock")
+
+
+class _UDPProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, done: asyncio.Future):
+        self.done = done
+
+    def datagram_received(self, data, addr):
+        if not self.done.done():
+            self.done.set_result(True)
+
+    def error_received(self, exc):
+        if not self.done.done():
+            self.done.set_exception(exc)
+
+
+async def probe_udp(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> Dict[str, Any]:
+    """
+    Sends a datagram to the node's UDP port. This never gives an up/down verdict:
+    Hysteria drops datagrams it can't parse, and a firewall drops them too, so
+    silence proves nothing, and an ICMP port-unreachable may come from anywhere
+    on the path. The result is always unknown, with the RTT if the node happens to
+    answer and the error if the send was refused or the name didn't resolve.
+    Nodes without a health_url are judged by their traffic pushes instead.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    transport = None
+    start = time.monotonic()
+    try:
+        transport, _ = await asyncio.wait_for(
+            loop.create_datagram_endpoint(lambda: _UDPProbeProtocol(done), remote_addr=(host, port)),
+            timeout
+        )
+        transport.sendto(b"\x00")
+        try:
+            await asyncio.wait_for(done, timeout)
+            return {"status": STATUS_UNKNOWN, "rtt_ms": round((time.monotonic() - start) * 1000, 1), "error": None}
+        except asyncio.TimeoutError:
+            return {"status": STATUS_UNKNOWN, "rtt_ms": None, "error": None}
+    except (OSError, asyncio.TimeoutError) as e:
+        return {"status": STATUS_UNKNOWN, "rtt_ms": None, "error": str(e) or type(e).__name__}
+    finally:
+        if transport:
+            transport.close()
+
+
+async def probe_http(url: str, timeout: float = PROBE_TIMEOUT) -> Dict[str, Any]:
+    import aiohttp
+
+    start = time.monotonic()
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.get(url) as response:
+                await response.read()
+                rtt_ms = round((time.monotonic() - start) * 1000, 1)
+                if response.status >= 500:
+                    return {"status": STATUS_DOWN, "rtt_ms": rtt_ms, "error": f"HTTP {response.status}"}
+                return {"status": STATUS_UP, "rtt_ms": rtt_ms, "error": None}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {"status": STATUS_DOWN, "rtt_ms": None, "error": str(e) or type(e).__name__}
+
+
+async def probe_node(node: Dict[str, Any], default_port: int, timeout: float = PROBE_TIMEOUT) -> Dict[str, Any]:
+    if node.get("health_url"):
+        result = await probe_http(node["health_url"], timeout)
+    else:
+        result = await probe_udp(node["ip"], int(node.get("port") or default_port), timeout)
+    result["checked_at"] = int(time.time())
+    return result
+
+
+async def probe_nodes(nodes: List[Dict[str, Any]], default_port: int, timeout: float = PROBE_TIMEOUT) -> Dict[str, Dict[str, Any]]:
+    results = await asyncio.gather(*(probe_node(node, default_port, timeout) for node in nodes))
+    return {node["name"]: result for node, result in zip(nodes, results)}
+
+
+def read_health() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(NODES_HEALTH_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return {}
+
+
+def update_health(updates: Dict[str, Dict[str, Any]], keep: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Merges per-node fields into the cache file. The prober and the panel's
+    traffic endpoint both write here, so the read-modify-write is serialized
+    with a lock and the file is swapped in atomically for lock-free readers.
+    """
+    NODES_HEALTH_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(_LOCK_PATH, "w") as lock_fd:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            health = read_health()
+            if keep is not None:
+                health = {name: entry for name, entry in health.items() if name in keep}
+            for name, fields in updates.items():
+                health.setdefault(name, {}).update(fields)
+            tmp_path = f"{NODES_HEALTH_PATH}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(health, f, indent=4)
+            os.replace(tmp_path, NODES_HEALTH_PATH)
+            return health
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+
+def record_traffic_push(node_name: str) -> None:
+    update_health({node_name: {"last_push_at": int(time.time())}})
+
+
+def effective_status(entry: Optional[Dict[str, Any]], now: Optional[float] = None) -> str:
+    """
+    A fresh HTTP probe verdict wins. Otherwise nodes that push traffic are judged
+    by their last push, since a UDP probe can't tell up from down.
+    """
+    if not entry:
+        return STATUS_UNKNOWN
+    now = now if now is not None else time.time()
+    if "checked_at" in entry and now - entry["checked_at"] <= STALE_AFTER_SECONDS:
+        status = entry.get("status", STATUS_UNKNOWN)
+        if status != STATUS_UNKNOWN:
+            return status
+    if "last_push_at" in entry:
+        silence = now - entry["last_push_at"]
+        if silence <= STALE_AFTER_SECONDS:
+            return STATUS_UP
+        if silence > PUSH_SILENT_AFTER_SECONDS:
+            return STATUS_DOWN
+    return STATUS_UNKNOWN
+
+
+def node_sort_key(entry: Optional[Dict[str, Any]], now: Optional[float] = None):
+    status = effective_status(entry, now)
+    rank = {STATUS_UP: 0, STATUS_UNKNOWN: 1, STATUS_DOWN: 2}[status]
+    rtt = entry.get("rtt_ms") if entry and status == STATUS_UP else None
+    return (rank, rtt is None, rtt or 0)
+
+
+def order_node_names(names: List[str], health: Dict[str, Dict[str, Any]], drop_down: bool = False) -> List[str]:
+    """Orders node names healthy-and-fastest first; down nodes go last or are dropped."""
+    now = time.time()
+    ordered = sorted(names, key=lambda name: node_sort_key(health.get(name), now))
+    if drop_down:
+        ordered = [name for name in ordered if effective_status(health.get(name), now) != STATUS_DOWN]
+    return ordered
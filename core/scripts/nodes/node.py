@@ -7,9 +7,11 @@ from pathlib import Path
 import re
 from ipaddress import ip_address
 import subprocess
+import asyncio
 from datetime import datetime, timedelta
 from init_paths import *
-from paths import NODES_JSON_PATH
+from paths import NODES_JSON_PATH, CONFIG_FILE
+from health import probe_nodes, read_health, update_health, effective_status
 
 
 def is_valid_ip_or_domain(value: str) -> bool:
@@ -72,7 +74,7 @@ def write_nodes(nodes):
     except (IOError, OSError) as e:
         sys.exit(f"Error writing to {NODES_JSON_PATH}: {e}")
 
-def add_node(name: str, ip: str, sni: str | None = None, pinSHA256: str | None = None, port: int | None = None, obfs: str | None = None, insecure: bool = False):
+def add_node(name: str, ip: str, sni: str | None = None, pinSHA256: str | None = None, port: int | None = None, obfs: str | None = None, insecure: bool = False, health_url: str | None = None):
     if not is_valid_ip_or_domain(ip):
         print(f"Error: '{ip}' is not a valid IP address or domain name.", file=sys.stderr)
         sys.exit(1)
@@ -89,6 +91,10 @@ def add_node(name: str, ip: str, sni: str | None = None, pinSHA256: str | None =
         print(f"Error: Port '{port}' must be between 1 and 65535.", file=sys.stderr)
         sys.exit(1)
 
+    if health_url and not health_url.startswith(("http://", "https://")):
+        print(f"Error: Health URL '{health_url}' must start with http:// or https://.", file=sys.stderr)
+        sys.exit(1)
+
     nodes = read_nodes()
     if any(node['name'] == name for node in nodes):
         print(f"Error: A node with the name '{name}' already exists.", file=sys.stderr)
@@ -108,6 +114,8 @@ def add_node(name: str, ip: str, sni: str | None = None, pinSHA256: str | None =
         new_node["obfs"] = obfs.strip()
     if insecure:
         new_node["insecure"] = insecure
+    if health_url:
+        new_node["health_url"] = health_url.strip()
 
     nodes.append(new_node)
     write_nodes(nodes)
@@ -131,8 +139,9 @@ def list_nodes():
         print("No nodes configured.")
         return
         
-    print(f"{'Name':<15} {'IP / Domain':<25} {'Port':<8} {'SNI':<20} {'Insecure':<10} {'OBFS':<20} {'Pin SHA256'}")
-    print(f"{'-'*15} {'-'*25} {'-'*8} {'-'*20} {'-'*10} {'-'*20} {'-'*30}")
+    health = read_health()
+    print(f"{'Name':<15} {'IP / Domain':<25} {'Port':<8} {'Status':<8} {'RTT (ms)':<10} {'SNI':<20} {'Insecure':<10} {'OBFS':<20} {'Pin SHA256'}")
+    print(f"{'-'*15} {'-'*25} {'-'*8} {'-'*8} {'-'*10} {'-'*20} {'-'*10} {'-'*20} {'-'*30}")
     for node in sorted(nodes, key=lambda x: x['name']):
         name = node['name']
         ip = node['ip']
@@ -141,7 +150,33 @@ def list_nodes():
         insecure = str(node.get('insecure', 'False'))
         obfs = node.get('obfs', 'N/A')
         pin = node.get('pinSHA256', 'N/A')
-        print(f"{name:<15} {ip:<25} {str(port):<8} {sni:<20} {insecure:<10} {obfs:<20} {pin}")
+        entry = health.get(name)
+        status = effective_status(entry)
+        rtt = entry.get('rtt_ms') if entry else None
+        rtt = 'N/A' if rtt is None else rtt
+        print(f"{name:<15} {ip:<25} {str(port):<8} {status:<8} {str(rtt):<10} {sni:<20} {insecure:<10} {obfs:<20} {pin}")
+
+def get_local_port() -> int:
+    try:
+        with CONFIG_FILE.open("r") as f:
+            return int(json.load(f)["listen"].split(":")[-1])
+    except (IOError, OSError, json.JSONDecodeError, KeyError, ValueError):
+        return 443
+
+def probe(timeout: float):
+    nodes = read_nodes()
+    results = asyncio.run(probe_nodes(nodes, get_local_port(), timeout)) if nodes else {}
+    update_health(results, keep=[node['name'] for node in nodes])
+
+    if not nodes:
+        print("No nodes configured.")
+        return
+
+    print(f"{'Name':<15} {'Status':<8} {'RTT (ms)':<10} {'Error'}")
+    print(f"{'-'*15} {'-'*8} {'-'*10} {'-'*30}")
+    for name, result in sorted(results.items()):
+        rtt = 'N/A' if result['rtt_ms'] is None else result['rtt_ms']
+        print(f"{name:<15} {result['status']:<8} {str(rtt):<10} {result['error'] or ''}")
 
 def generate_cert():
     try:
@@ -206,22 +241,28 @@ def main():
     add_parser.add_argument('--pinSHA256', type=str, help='Optional: The public key SHA256 pin.')
     add_parser.add_argument('--obfs', type=str, help='Optional: The obfuscation key.')
     add_parser.add_argument('--insecure', action='store_true', help='Optional: Skip certificate verification.')
+    add_parser.add_argument('--health-url', type=str, help='Optional: HTTP URL probed instead of the UDP port.')
 
     delete_parser = subparsers.add_parser('delete', help='Delete a node by name.')
     delete_parser.add_argument('--name', type=str, required=True, help='The name of the node to delete.')
 
     subparsers.add_parser('list', help='List all configured nodes.')
+
+    probe_parser = subparsers.add_parser('probe', help='Probe all nodes concurrently and refresh the health cache.')
+    probe_parser.add_argument('--timeout', type=float, default=3.0, help='Per-node probe timeout in seconds.')
     
     subparsers.add_parser('generate-cert', help="Generate blitz.crt and blitz.key.")
     
     args = parser.parse_args()
 
     if args.command == 'add':
-        add_node(args.name, args.ip, args.sni, args.pinSHA256, args.port, args.obfs, args.insecure)
+        add_node(args.name, args.ip, args.sni, args.pinSHA256, args.port, args.obfs, args.insecure, args.health_url)
     elif args.command == 'delete':
         delete_node(args.name)
     elif args.command == 'list':
         list_nodes()
+    elif args.command == 'probe':
+        probe(args.timeout)
     elif args.command == 'generate-cert':
         generate_cert()
 
@@ -0,0 +1,79 @@
+import gzip
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+
+FEED_PROJECTION = {
+    "password": 1,
+    "blocked": 1,
+    "unlimited_user": 1,
+    "expiration_days": 1,
+    "account_creation_date": 1,
+    "max_download_bytes": 1,
+    "upload_bytes": 1,
+    "download_bytes": 1,
+}
+
+
+def _expires_at(doc):
+    expiration_days = doc.get("expiration_days", 0) or 0
+    creation_date_str = doc.get("account_creation_date")
+    if expiration_days <= 0 or not creation_date_str:
+        return None
+    try:
+        creation_date = datetime.strptime(creation_date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+    return int((creation_date + timedelta(days=expiration_days)).timestamp())
+
+
+def to_feed_entry(doc):
+    return {
+        "id": doc["_id"],
+        "password": doc.get("password", ""),
+        "blocked": bool(doc.get("blocked", False)),
+        "unlimited_user": bool(doc.get("unlimited_user", False)),
+        "expires_at": _expires_at(doc),
+        "max_download_bytes": doc.get("max_download_bytes", 0) or 0,
+        "used_bytes": (doc.get("upload_bytes", 0) or 0) + (doc.get("download_bytes", 0) or 0),
+    }
+
+
+def build_snapshot(db_conn):
+    # Read the version first: anything written while we scan gets re-sent by
+    # the next delta, which is harmless because upserts are idempotent. The
+    # stable revision stays below writes still in flight, so those are re-sent too.
+    version = db_conn.stable_revision()
+    users = [to_feed_entry(doc) for doc in db_conn.collection.find({}, FEED_PROJECTION)]
+    return {"type": "snapshot", "version": version, "users": users}
+
+
+def build_delta(db_conn, since):
+    version = db_conn.stable_revision()
+    upserts = [to_feed_entry(doc) for doc in db_conn.get_users_changed_since(since, FEED_PROJECTION)]
+    deleted = db_conn.get_deleted_since(since)
+    return {"type": "delta", "since": since, "version": version, "upserts": upserts, "deleted": deleted}
+
+
+def encode_feed(payload):
+    return gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_feed(data):
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+def check_entry(entry, password, now=None):
+    """Applies the same rules as the central auth server to a feed entry."""
+    if entry is None or entry["blocked"]:
+        return False
+    if not hmac.compare_digest(entry["password"].encode(), password.encode()):
+        return False
+    if entry["unlimited_user"]:
+        return True
+    now = now if now is not None else datetime.now(timezone.utc).timestamp()
+    if entry["expires_at"] is not None and now >= entry["expires_at"]:
+        return False
+    if entry["max_download_bytes"] > 0 and entry["used_bytes"] >= entry["max_download_bytes"]:
+        return False
+    return True
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import json
 import subprocess
 import re
@@ -18,10 +19,20 @@ import qrcode
 from jinja2 import Environment, FileSystemLoader
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from db.database import db
+from db.async_database import async_db
+import metrics
+import profiler
+from nodes.health import read_health, order_node_names
 
 load_dotenv()
 
+REQUEST_DURATION = metrics.histogram(
+    'blitz_http_request_duration_seconds', 'Time to serve an HTTP request, by route template.', ('method', 'route', 'status'))
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+LOCAL_ONLY_PATHS = {'/metrics', '/debug/profile'}
+# Requests slower than this many seconds are logged with their DB and subprocess calls; 0 disables.
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', '1.0'))
+
 
 @dataclass
 class AppConfig:
@@ -39,6 +50,7 @@ class AppConfig:
     sni: str
     template_dir: str
     subpath: str
+    drop_down_nodes: bool = False
 
 
 class RateLimiter:
@@ -179,6 +191,50 @@ class Utils:
             return False
 
 
+class NodeHealthOrdering:
+    def __init__(self, config: AppConfig):
+        self.config = config
+
+    def _node_names(self) -> List[str]:
+        try:
+            with open(self.config.nodes_json_path, 'r') as f:
+                content = f.read()
+                return [node['name'] for node in json.loads(content)] if content else []
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            return []
+
+    def order(self, items: List[Any], name_of) -> List[Any]:
+        """
+        Keeps non-node items first in their original order, then node items
+        ordered by the prober's cached health, optionally dropping dead nodes.
+        """
+        health = read_health()
+        node_names = set(self._node_names())
+        if not health or not node_names:
+            return items
+
+        local_items = []
+        node_items: Dict[str, List[Any]] = {}
+        for item in items:
+            name = name_of(item)
+            if name in node_names:
+                node_items.setdefault(name, []).append(item)
+            else:
+                local_items.append(item)
+
+        ordered_names = order_node_names(list(node_items), health, drop_down=self.config.drop_down_nodes)
+        return local_items + [item for name in ordered_names for item in node_items[name]]
+
+    @staticmethod
+    def uri_node_name(uri: str) -> str:
+        return unquote(urlparse(uri).fragment)
+
+    @staticmethod
+    def label_node_name(label: str) -> Optional[str]:
+        match = re.match(r'^Node: (.*) \(IPv[46]\)$', label)
+        return match.group(1) if match else None
+
+
 class HysteriaCLI:
     def __init__(self, cli_path: str):
         self.cli_path = cli_path
@@ -199,16 +255,12 @@ class HysteriaCLI:
             print(f"Hysteria CLI error: {e}")
             raise
 
-    def get_username_by_password(self, password_token: str) -> Optional[str]:
-        if not db:
-            return None
-        user_doc = db.collection.find_one({"password": password_token}, {"_id": 1})
+    async def get_username_by_password(self, password_token: str) -> Optional[str]:
+        user_doc = await async_db.get_user_by_password(password_token, fields=[])
         return user_doc['_id'] if user_doc else None
 
-    def get_user_info(self, username: str) -> Optional[UserInfo]:
-        if not db:
-            return None
-        user_doc = db.get_user(username)
+    async def get_user_info(self, username: str) -> Optional[UserInfo]:
+        user_doc = await async_db.get_user(username)
         if not user_doc:
             return None
         
@@ -361,6 +413,7 @@ class SubscriptionManager:
     def __init__(self, hysteria_cli: HysteriaCLI, config: AppConfig):
         self.hysteria_cli = hysteria_cli
         self.config = config
+        self.node_ordering = NodeHealthOrdering(config)
 
     def _get_extra_configs(self) -> List[str]:
         if not os.path.exists(self.config.extra_config_path):
@@ -378,12 +431,8 @@ class SubscriptionManager:
             print(f"Warning: Could not read or parse extra configs from {self.config.extra_config_path}: {e}")
             return []
 
-    def get_normal_subscription(self, username: str, user_agent: str) -> str:
-        user_info = self.hysteria_cli.get_user_info(username)
-        if user_info is None:
-            return "User not found"
-            
-        all_uris = self.hysteria_cli.get_all_uris(username)
+    def get_normal_subscription(self, username: str, user_agent: str, user_info: UserInfo) -> str:
+        all_uris = self.node_ordering.order(self.hysteria_cli.get_all_uris(username), NodeHealthOrdering.uri_node_name)
 
         processed_uris = []
         for uri in all_uris:
@@ -431,6 +480,7 @@ class HysteriaServer:
         self.subscription_manager = SubscriptionManager(self.hysteria_cli, self.config)
         self.template_renderer = TemplateRenderer(self.config.template_dir, self.config)
         self.app = web.Application(middlewares=[
+            self._metrics_middleware,
             self._invalid_endpoint_middleware,
             self._rate_limit_middleware,
             self._noindex_middleware
@@ -444,6 +494,8 @@ class HysteriaServer:
         self.app.router.add_get(f'{base_path}/{{password_token}}', self.handle)
         self.app.router.add_get(f'{base_path}/robots.txt', self.robots_handler)
         self.app.router.add_route('*', f'{base_path}/{{tail:.*}}', self.handle_404_subpath)
+        self.app.router.add_get('/metrics', self.handle_metrics)
+        self.app.router.add_get('/debug/profile', self.handle_profile)
 
     def _load_config(self) -> AppConfig:
         domain = os.getenv('HYSTERIA_DOMAIN', 'localhost')
@@ -463,6 +515,7 @@ class HysteriaServer:
         extra_config_path = '/etc/hysteria/extra.json'
         rate_limit = 100
         rate_limit_window = 60
+        drop_down_nodes = os.getenv('DROP_DOWN_NODES', 'false').lower() == 'true'
         template_dir = os.path.join(os.path.dirname(__file__), 'template')
 
         sni = self._load_sni_from_env(sni_file)
@@ -476,7 +529,7 @@ class HysteriaServer:
                          extra_config_path=extra_config_path,
                          rate_limit=rate_limit, rate_limit_window=rate_limit_window,
                          sni=sni, template_dir=template_dir,
-                         subpath=subpath)
+                         subpath=subpath, drop_down_nodes=drop_down_nodes)
 
     def _load_sni_from_env(self, sni_file: str) -> str:
         try:
@@ -505,10 +558,36 @@ class HysteriaServer:
             return web.Response(status=429, text="Rate limit exceeded.")
         return await handler(request)
 
+    @middleware
+    async def _metrics_middleware(self, request: web.Request, handler):
+        start = time.perf_counter()
+        status = 500
+        with metrics.trace_calls() as calls:
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as e:
+                status = e.status
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                resource = request.match_info.route.resource
+                route = resource.canonical if resource else 'unmatched'
+                REQUEST_DURATION.observe(elapsed, method=request.method, route=route, status=status)
+                if SLOW_REQUEST_THRESHOLD and elapsed >= SLOW_REQUEST_THRESHOLD and route != '/debug/profile':
+                    print(f"Warning: Slow request {request.method} {route} ({status}) took {elapsed:.3f}s: {metrics.describe_calls(calls)}")
+
+    def _is_local_scrape(self, request: web.Request) -> bool:
+        # Caddy only forwards the subpath, and adds forwarding headers; a bare local
+        # request can only come from a scraper on this host.
+        forwarded = 'X-Forwarded-For' in request.headers or 'X-Real-IP' in request.headers
+        return request.path in LOCAL_ONLY_PATHS and request.remote in LOCAL_ADDRESSES and not forwarded
+
     @middleware
     async def _invalid_endpoint_middleware(self, request: web.Request, handler):
         expected_prefix = f'/{self.config.subpath}/'
-        if not request.path.startswith(expected_prefix):
+        if not request.path.startswith(expected_prefix) and not self._is_local_scrape(request):
             print(f"Warning: Request {request.path} reached aiohttp outside expected subpath {expected_prefix}. Closing connection.")
             if request.transport is not None:
                 request.transport.close()
@@ -529,11 +608,11 @@ class HysteriaServer:
             
             password_token = Utils.sanitize_input(password_token_raw, r'^[a-zA-Z0-9]+$')
 
-            username = self.hysteria_cli.get_username_by_password(password_token)
+            username = await self.hysteria_cli.get_username_by_password(password_token)
             if username is None:
                 return web.Response(status=404, text="User not found for the provided token.")
 
-            user_info = self.hysteria_cli.get_user_info(username)
+            user_info = await self.hysteria_cli.get_user_info(username)
             if user_info is None:
                 return web.Response(status=404, text=f"User '{username}' details not found.")
 
@@ -593,7 +672,9 @@ class HysteriaServer:
         return web.Response(text=self.template_renderer.render(context), content_type='text/html')
 
     async def _handle_singbox(self, username: str, fragment: str, user_info: UserInfo) -> web.Response:
-        all_uris = self.hysteria_cli.get_all_uris(username)
+        all_uris = self.subscription_manager.node_ordering.order(
+            self.hysteria_cli.get_all_uris(username), NodeHealthOrdering.uri_node_name
+        )
         if not all_uris:
             return web.Response(status=404, text=f"Error: No valid URIs found for user {username}.")
         combined_config = self.singbox_generator.combine_configs(all_uris, username, fragment)
@@ -601,13 +682,14 @@ class HysteriaServer:
 
     async def _handle_normalsub(self, request: web.Request, username: str, user_info: UserInfo) -> web.Response:
         user_agent = request.headers.get('User-Agent', '').lower()
-        subscription = self.subscription_manager.get_normal_subscription(username, user_agent)
-        if subscription == "User not found":
-            return web.Response(status=404, text=f"User '{username}' not found.")
+        subscription = self.subscription_manager.get_normal_subscription(username, user_agent, user_info)
         return web.Response(text=subscription, content_type='text/plain')
 
     async def _get_template_context(self, username: str, user_info: UserInfo) -> TemplateContext:
-        labeled_uris = self.hysteria_cli.get_all_labeled_uris(username)
+        labeled_uris = self.subscription_manager.node_ordering.order(
+            self.hysteria_cli.get_all_labeled_uris(username),
+            lambda item: NodeHealthOrdering.label_node_name(item['label'])
+        )
         port_str = f":{self.config.external_port}" if self.config.external_port not in [80, 443, 0] else ""
         base_url = f"https://{self.config.domain}{port_str}"
 
@@ -661,6 +743,24 @@ class HysteriaServer:
         print(f"404 Not Found (within subpath, unhandled by specific routes): {request.path}")
         return web.Response(status=404, text="Not Found within Subpath")
     
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def handle_profile(self, request: web.Request) -> web.Response:
+        try:
+            seconds = min(max(int(request.query.get('seconds', '10')), 1), profiler.MAX_SECONDS)
+        except ValueError:
+            return web.Response(status=400, text="Error: 'seconds' must be an integer.")
+        fmt = request.query.get('format', 'collapsed')
+        if fmt not in profiler.FORMATS:
+            return web.Response(status=400, text=f"Error: 'format' must be one of {', '.join(profiler.FORMATS)}.")
+
+        # The sampler runs on its own thread; the event loop keeps serving while it records.
+        sampler = profiler.Sampler().start()
+        await asyncio.sleep(seconds)
+        content = sampler.stop().render(fmt, 'normalsub')
+        return web.Response(text=content, content_type='application/json' if fmt == 'speedscope' else 'text/plain')
+
     async def handle_style(self, request: web.Request) -> web.Response:
         return web.FileResponse(os.path.join(self.config.template_dir, 'style.css'))
 
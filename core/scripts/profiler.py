@@ -0,0 +1,194 @@
+"""
+In-process sampling profiler for the panel services.
+
+A background thread snapshots the stack of every other thread at a fixed
+interval and counts identical stacks. Results come out as collapsed stacks
+(one "frame;frame;frame count" line per stack, as read by flamegraph.pl and
+speedscope) or as a speedscope JSON document.
+
+Short-lived processes such as the traffic tick can't be attached to while
+they run, so they check for a request file in PROFILE_DIR when they start
+and, if one is active, append their own samples next to it.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+PROFILE_DIR = Path("/tmp/blitz_profile")
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 300
+FORMATS = ("collapsed", "speedscope")
+
+# Leaf frames of threads that are parked waiting for work. They dominate the
+# samples of any pooled server and say nothing about where time goes.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("profiler.py", "profile_for"),
+}
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Sampled stacks with their hit counts, `interval` seconds apart."""
+
+    def __init__(self, stacks: Optional[Counter] = None, interval: float = DEFAULT_INTERVAL):
+        self.stacks: Counter = stacks if stacks is not None else Counter()
+        self.interval = interval
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    @classmethod
+    def from_collapsed(cls, text: str, interval: float = DEFAULT_INTERVAL) -> "Profile":
+        stacks: Counter = Counter()
+        for line in text.splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                stacks[tuple(stack.split(";"))] += int(count)
+        return cls(stacks, interval)
+
+    def speedscope(self, name: str) -> Dict:
+        frames: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            samples.append([frames.setdefault(label, len(frames)) for label in stack])
+            weights.append(round(count * self.interval, 6))
+        total = sum(weights)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": label} for label in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "blitz-profiler",
+        }
+
+    def render(self, fmt: str, name: str) -> str:
+        if fmt == "speedscope":
+            return json.dumps(self.speedscope(name))
+        return self.collapsed()
+
+
+class Sampler:
+    """Samples all other threads of this process until stopped."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.profile = Profile(interval=interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if not self.include_idle and leaf in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.profile.stacks[tuple(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "Sampler":
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.profile
+
+
+def profile_for(seconds: float, interval: float = DEFAULT_INTERVAL) -> Profile:
+    """Samples this process for `seconds` and returns the result. Blocks the calling thread."""
+    sampler = Sampler(interval).start()
+    time.sleep(min(seconds, MAX_SECONDS))
+    return sampler.stop()
+
+
+def _request_path(name: str) -> Path:
+    return PROFILE_DIR / f"{name}.request"
+
+
+def _output_path(name: str) -> Path:
+    return PROFILE_DIR / f"{name}.collapsed"
+
+
+def request_profile(name: str, seconds: float):
+    """Asks every run of process `name` that starts within `seconds` to profile itself."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    _output_path(name).unlink(missing_ok=True)
+    _request_path(name).write_text(json.dumps({"until": time.time() + min(seconds, MAX_SECONDS)}))
+
+
+def collect_requested(name: str) -> Profile:
+    """Returns everything recorded for a request_profile() call and clears the request."""
+    _request_path(name).unlink(missing_ok=True)
+    try:
+        return Profile.from_collapsed(_output_path(name).read_text())
+    except FileNotFoundError:
+        return Profile()
+
+
+def _is_requested(name: str) -> bool:
+    try:
+        return json.loads(_request_path(name).read_text())["until"] > time.time()
+    except (FileNotFoundError, ValueError, KeyError):
+        return False
+
+
+@contextmanager
+def profile_if_requested(name: str):
+    """Profiles the block if a request for `name` is active and appends the result to its output."""
+    if not _is_requested(name):
+        yield
+        return
+    sampler = Sampler().start()
+    try:
+        yield
+    finally:
+        profile = sampler.stop()
+        try:
+            with open(_output_path(name), "a") as output:
+                output.write(profile.collapsed())
+        except OSError:
+            pass
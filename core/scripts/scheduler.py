@@ -3,9 +3,11 @@ import time
 import schedule
 import logging
 import subprocess
+import os
 import fcntl
 from pathlib import Path
 from paths import *
+import metrics
 
 logging.basicConfig(
     level=logging.WARNING,
@@ -21,6 +23,13 @@ logger = logging.getLogger("HysteriaScheduler")
 BASE_DIR = Path("/etc/hysteria")
 VENV_ACTIVATE = BASE_DIR / "hysteria2_venv/bin/activate"
 LOCK_FILE = "/tmp/hysteria_scheduler.lock"
+METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "28265"))
+
+JOB_DURATION = metrics.histogram(
+    "blitz_scheduler_job_duration_seconds", "Duration of scheduled commands, by job.", ("job",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+JOB_FAILURES = metrics.counter("blitz_scheduler_job_failures_total", "Scheduled commands that failed, by job.", ("job",))
+JOB_SKIPPED = metrics.counter("blitz_scheduler_job_skipped_total", "Scheduled runs skipped because the lock was held, by job.", ("job",))
 
 def acquire_lock():
     try:
@@ -60,13 +69,21 @@ def run_command(command, log_success=False):
         logger.exception(f"Exception running command: {full_cmd}")
         return False
 
+def run_job(job, command, log_success=False):
+    with JOB_DURATION.time(job=job):
+        success = run_command(command, log_success=log_success)
+    if not success:
+        JOB_FAILURES.inc(job=job)
+    return success
+
 def check_traffic_status():
     lock_fd = acquire_lock()
     if not lock_fd:
+        JOB_SKIPPED.inc(job="traffic")
         return
         
     try:
-        success = run_command(f"python3 {CLI_PATH} traffic-status --no-gui", log_success=False)
+        success = run_job("traffic", f"python3 {CLI_PATH} traffic-status --no-gui", log_success=False)
         if not success:
             pass
     finally:
@@ -76,20 +93,32 @@ def backup_hysteria():
     lock_fd = acquire_lock()
     if not lock_fd:
         logger.warning("Skipping backup due to lock")
+        JOB_SKIPPED.inc(job="backup")
         return
         
     try:
-        run_command(f"python3 {CLI_PATH} backup-hysteria", log_success=True)
+        run_job("backup", f"python3 {CLI_PATH} backup-hysteria --incremental", log_success=True)
     finally:
         release_lock(lock_fd)
 
+def probe_nodes():
+    run_job("node_probe", f"python3 {CLI_PATH} node probe", log_success=False)
+
+def rollup_traffic_history():
+    run_job("traffic_rollup", f"python3 {CLI_PATH} traffic-rollup", log_success=False)
+
 def main():
     logger.info("Starting Hysteria Scheduler")
+    # Also serves the textfile metrics of the traffic tick and the IP limiter.
+    metrics.start_http_server(METRICS_PORT, include_textfiles=True)
     
     schedule.every(1).minutes.do(check_traffic_status)
+    schedule.every(1).minutes.do(probe_nodes)
+    schedule.every(5).minutes.do(rollup_traffic_history)
     schedule.every(6).hours.do(backup_hysteria)
     
     check_traffic_status()
+    probe_nodes()
     backup_hysteria()
     
     while True:
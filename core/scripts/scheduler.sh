@@ -49,6 +49,7 @@ After=network.target
 [Service]
 Type=simple
 User=root
+EnvironmentFile=-/etc/hysteria/.configs.env
 ExecStart=/etc/hysteria/core/scripts/auth/user_auth
 Restart=always
 RestartSec=5
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Measures how long short cli.py invocations take from process start to exit.
+
+The web panel, bot and scheduler run most operations as a fresh cli.py or
+script process, so this start-up cost is paid on every one of them. Run it
+before and after a change, on the server, with the panel's virtualenv active:
+
+    python3 startup_benchmark.py --runs 20
+    python3 startup_benchmark.py --importtime
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+CORE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_PATH = os.path.join(CORE_DIR, "cli.py")
+
+DEFAULT_COMMANDS = [
+    ["--help"],
+    ["show-version"],
+    ["get-webpanel-url"],
+]
+
+
+def time_command(args, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI_PATH, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report_imports(module, top):
+    """Prints the `top` imports of `module` with the largest cumulative import time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=CORE_DIR, capture_output=True, text=True, check=False,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    print(f"Slowest imports under 'import {module}' (cumulative / self, ms):")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cli.py start-up time.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per command (default: 10).")
+    parser.add_argument("--command", action="append", help="cli.py arguments to time, e.g. --command list-users or --command=--help. Repeatable.")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports of cli_api.")
+    parser.add_argument("--top", type=int, default=15, help="Imports to list with --importtime (default: 15).")
+    args = parser.parse_args()
+
+    commands = [command.split() for command in args.command] if args.command else DEFAULT_COMMANDS
+    print(f"{'command':<30} {'min':>8} {'median':>8} {'max':>8}  (seconds, {args.runs} runs)")
+    for command in commands:
+        durations = time_command(command, args.runs)
+        print(f"{' '.join(command):<30} {min(durations):8.3f} {statistics.median(durations):8.3f} {max(durations):8.3f}")
+
+    if args.importtime:
+        print()
+        report_imports("cli_api", args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ def monitoring_thread():
         time.sleep(60)
 
 if __name__ == '__main__':
+    metrics.start_http_server(METRICS_PORT)
     monitor_thread = threading.Thread(target=monitoring_thread, daemon=True)
     monitor_thread.start()
     version_thread = threading.Thread(target=version_monitoring, daemon=True)
@@ -9,4 +9,6 @@ from .serverinfo import *
 from .cpu import *
 from .check_version import *
 from .weburl import *
-from .settings import *
\ No newline at end of file
+from .settings import *
+from .topusers import *
+from .jobs import *
\ No newline at end of file
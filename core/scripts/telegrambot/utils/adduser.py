@@ -5,6 +5,7 @@ import re
 from telebot import types
 from utils.command import *
 from utils.common import create_main_markup
+from utils import service
 
 def escape_markdown(text):
     return str(text).replace('_', '\\_').replace('*', '\\*').replace('`', '\\`')
@@ -50,22 +51,14 @@ def process_add_user_step1(message):
         bot.register_next_step_handler(message, process_add_user_step1)
         return
 
-    command = f"python3 {CLI_PATH} list-users"
-    result = run_cli_command(command)
-
     try:
-        users_data = json.loads(result)
-        existing_users = {user['username'].lower() for user in users_data}
-        if username.lower() in existing_users:
+        if service.get_user(message.chat.id, username):
             bot.reply_to(message, f"Username '{escape_markdown(username)}' already exists. Please choose a different username:", reply_markup=create_cancel_markup())
             bot.register_next_step_handler(message, process_add_user_step1)
             return
-    except json.JSONDecodeError:
-        if "No such file or directory" in result or result.strip() == "" or "Could not find users" in result.lower():
-            pass
-        else:
-            bot.reply_to(message, "Error checking existing users. Please try again.", reply_markup=create_main_markup())
-            return
+    except Exception:
+        bot.reply_to(message, "Error checking existing users. Please try again.", reply_markup=create_main_markup())
+        return
     
     msg = bot.reply_to(message, "Enter traffic limit (GB):", reply_markup=create_cancel_markup(back_step=process_add_user_step1))
     bot.register_next_step_handler(msg, process_add_user_step2, username)
@@ -132,30 +125,13 @@ def process_add_user_step4(message, username, traffic_limit, expiration_days):
                 bot.register_next_step_handler(message, process_add_user_step4, username, traffic_limit, expiration_days)
                 return
 
-        # Build command with or without note
-        if note is not None:
-            add_user_command = f"python3 {CLI_PATH} add-user -u \"{username}\" -t {traffic_limit} -e {expiration_days} -n \"{note}\""
-        else:
-            add_user_command = f"python3 {CLI_PATH} add-user -u \"{username}\" -t {traffic_limit} -e {expiration_days}"
-        
-        add_user_feedback = run_cli_command(add_user_command).strip()
+        add_user_feedback = service.run_action(service.add_user, username, traffic_limit, expiration_days, note)
         
         bot.send_chat_action(message.chat.id, 'typing')
         
-        uri_info_command = f"python3 {CLI_PATH} show-user-uri -u \"{username}\" -ip 4 -n -s"
-        uri_info_output = run_cli_command(uri_info_command)
-
-        direct_uri = None
-        normal_sub_link = None
-
-        lines = uri_info_output.strip().split('\n')
-        for i, line in enumerate(lines):
-            if line.strip() == "IPv4:":
-                if i + 1 < len(lines) and lines[i+1].strip().startswith("hy2://"):
-                    direct_uri = lines[i+1].strip()
-            elif line.strip() == "Normal-SUB Sublink:":
-                if i + 1 < len(lines) and (lines[i+1].strip().startswith("http://") or lines[i+1].strip().startswith("https://")):
-                    normal_sub_link = lines[i+1].strip()
+        uris = service.get_user_uris(message.chat.id, username)
+        direct_uri = uris.get('ipv4')
+        normal_sub_link = uris.get('normal_sub')
 
         escaped_feedback = escape_markdown(add_user_feedback)
         caption_text = f"{escaped_feedback}\n"
@@ -8,42 +8,70 @@ import shlex
 import re
 import time
 import threading
+import tempfile
 from dotenv import load_dotenv
 from telebot import types
 from utils.command import *
+from utils.jobs import jobs
+from utils import service
 
 load_dotenv()
 
+# Manual and scheduled backups share one job name, so only one of them runs at a time.
+BACKUP_JOB = "Backup"
+
 @bot.message_handler(func=lambda message: is_admin(message.from_user.id) and message.text == '💾 Backup Server')
 def backup_server(message):
-    bot.reply_to(message, "Starting backup. This may take a few moments...")
-    bot.send_chat_action(message.chat.id, 'typing')
-    
+    job = jobs.submit(BACKUP_JOB, lambda job: run_manual_backup(job, message.chat.id), chat_id=message.chat.id)
+    if job is None:
+        bot.reply_to(message, "A backup is already running. Use /jobs to check its progress.")
+
+def run_manual_backup(job, chat_id):
+    job.progress("⏳ Backup: creating archive...")
     backup_command = f"python3 {CLI_PATH} backup-hysteria"
     result = run_cli_command(backup_command)
 
     if "Error" in result:
-        bot.reply_to(message, f"Backup failed: {result}")
-        return
+        raise RuntimeError(result)
 
-    # bot.reply_to(message, "Backup completed successfully!")
+    files = [f for f in os.listdir(BACKUP_DIRECTORY) if f.endswith('.zip')]
+    files.sort(key=lambda x: os.path.getctime(os.path.join(BACKUP_DIRECTORY, x)), reverse=True)
+    latest_backup_file = files[0] if files else None
+    if not latest_backup_file:
+        raise RuntimeError("No backup file found after the backup process.")
 
-    try:
-        files = [f for f in os.listdir(BACKUP_DIRECTORY) if f.endswith('.zip')]
-        files.sort(key=lambda x: os.path.getctime(os.path.join(BACKUP_DIRECTORY, x)), reverse=True)
-        latest_backup_file = files[0] if files else None
-    except Exception as e:
-        bot.reply_to(message, f"Failed to locate the backup file: {str(e)}")
+    job.progress(f"⏳ Backup: uploading {latest_backup_file}...")
+    backup_file_path = os.path.join(BACKUP_DIRECTORY, latest_backup_file)
+    with open(backup_file_path, 'rb') as f:
+        bot.send_document(chat_id, f, caption=f"Manual backup completed: {latest_backup_file}")
+    return f"sent {latest_backup_file}"
+
+@bot.message_handler(content_types=['document'], func=lambda message: is_admin(message.from_user.id) and (message.caption or '').strip().startswith('/restore'))
+def restore_server(message):
+    if not message.document.file_name.lower().endswith('.zip'):
+        bot.reply_to(message, "Send the backup .zip file with /restore as its caption.")
         return
-    
-    if latest_backup_file:
-        backup_file_path = os.path.join(BACKUP_DIRECTORY, latest_backup_file)
-        with open(backup_file_path, 'rb') as f:
-            bot.send_document(message.chat.id, f, caption=f"Manual backup completed: {latest_backup_file}")
-    else:
-        bot.reply_to(message, "No backup file found after the backup process.")
+    job = jobs.submit("Restore", lambda job: run_restore(job, message.document.file_id), chat_id=message.chat.id)
+    if job is None:
+        bot.reply_to(message, "A restore is already running. Use /jobs to check its progress.")
+
+def run_restore(job, file_id):
+    job.progress("⏳ Restore: downloading backup...")
+    data = bot.download_file(bot.get_file(file_id).file_path)
+    with tempfile.NamedTemporaryFile(suffix=".zip") as backup_file:
+        backup_file.write(data)
+        backup_file.flush()
+        last = {"percent": -1}
+
+        def report(percent, text):
+            # Telegram rate-limits message edits, so only report every few percent.
+            if percent >= last["percent"] + 5 or percent == 100:
+                last["percent"] = percent
+                job.progress(f"⏳ Restore: {percent}% - {text}")
+
+        return service.restore_backup(backup_file.name, progress=report)
 
-def perform_and_send_backup():
+def perform_and_send_backup(job=None):
     # print("Starting automatic backup...")
     
     backup_command = f"python3 {CLI_PATH} backup-hysteria"
@@ -93,7 +121,8 @@ def backup_scheduler():
     
     while True:
         time.sleep(interval_seconds)
-        perform_and_send_backup()
+        if jobs.submit(BACKUP_JOB, perform_and_send_backup) is None:
+            print("Skipping automatic backup: another backup is still running.")
 
 scheduler_thread = threading.Thread(target=backup_scheduler, daemon=True)
 scheduler_thread.start()
\ No newline at end of file
@@ -2,22 +2,39 @@ import telebot
 import subprocess
 import json
 import os
+import sys
+import time
 import shlex
+from pathlib import Path
 from dotenv import load_dotenv
 from telebot import types
 
+scripts_dir = str(Path(__file__).resolve().parents[2])
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+import metrics
+
 load_dotenv()
 
 API_TOKEN = os.getenv('API_TOKEN')
 ADMIN_USER_IDS = json.loads(os.getenv('ADMIN_USER_IDS'))
 CLI_PATH = '/etc/hysteria/core/cli.py'
 BACKUP_DIRECTORY = '/opt/hysbackup'
-bot = telebot.TeleBot(API_TOKEN)
+# Threads that run message handlers. Long jobs go to utils.jobs instead.
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '8'))
+bot = telebot.TeleBot(API_TOKEN, num_threads=BOT_WORKERS)
+METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', '28266'))
+
+CLI_COMMAND_DURATION = metrics.histogram(
+    'blitz_bot_cli_command_duration_seconds', 'Duration of cli.py commands run by the bot, by subcommand.', ('command',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
 
 def run_cli_command(command):
     try:
         args = shlex.split(command)
-        result = subprocess.check_output(args, stderr=subprocess.STDOUT)
+        subcommand = args[2] if len(args) > 2 else args[0]
+        with CLI_COMMAND_DURATION.time(command=subcommand):
+            result = subprocess.check_output(args, stderr=subprocess.STDOUT)
         return result.decode('utf-8').strip()
     except subprocess.CalledProcessError as e:
         return f'Error: {e.output.decode("utf-8")}'
@@ -4,7 +4,8 @@ def create_main_markup():
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
     markup.row('➕ Add User', '🔍 Show User')
     markup.row('🗑️ Delete User', '🖥️ Server Info')
-    markup.row('💾 Backup Server', '⚙️ Settings')
+    markup.row('💾 Backup Server', '📊 Top Users')
+    markup.row('⚙️ Settings')
     return markup
 
 def create_settings_markup():
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 from telebot import types
 from utils.command import *
 from utils.common import *
+from utils import service
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "cancel_delete")
@@ -20,6 +21,5 @@ def delete_user(message):
 
 def process_delete_user(message):
     username = message.text.strip().lower()
-    command = f"python3 {CLI_PATH} remove-user {username}"
-    result = run_cli_command(command)
+    result = service.run_action(service.remove_user, username)
     bot.reply_to(message, result)
\ No newline at end of file
@@ -4,6 +4,7 @@ import json
 from telebot import types
 from utils.command import *
 from utils.common import *
+from utils import service
 
 
 def escape_markdown(text):
@@ -26,48 +27,36 @@ def show_user(message):
 def process_show_user(message):
     username_input = message.text.strip().lower()
     bot.send_chat_action(message.chat.id, 'typing')
-    command = f"python3 {CLI_PATH} list-users"
-    result = run_cli_command(command)
 
     try:
-        users_list = json.loads(result)
-        existing_users = {user['username'].lower(): user['username'] for user in users_list}
-
-        if username_input not in existing_users:
-            bot.reply_to(message, f"Username '{escape_markdown(message.text.strip())}' does not exist. Please enter a valid username.")
-            return
+        user_details = service.get_user(message.chat.id, username_input)
+    except Exception as e:
+        bot.reply_to(message, f"Error retrieving user details: {e}")
+        return
 
-        actual_username = existing_users[username_input]
-    except (json.JSONDecodeError, KeyError):
-        bot.reply_to(message, "Error retrieving or parsing user list. Please try again later.")
+    if not user_details:
+        bot.reply_to(message, f"Username '{escape_markdown(message.text.strip())}' does not exist. Please enter a valid username.")
         return
 
-    command = f"python3 {CLI_PATH} get-user -u \"{actual_username}\""
-    user_result = run_cli_command(command)
+    actual_username = user_details['username']
 
-    try:
-        user_details = json.loads(user_result)
-        
-        upload_bytes = user_details.get('upload_bytes')
-        download_bytes = user_details.get('download_bytes')
-        status = user_details.get('status', 'Unknown')
+    upload_bytes = user_details.get('upload_bytes')
+    download_bytes = user_details.get('download_bytes')
+    status = user_details.get('status', 'Unknown')
 
-        if upload_bytes is None or download_bytes is None:
-            traffic_message = "*Traffic Data:*\nUser not active or no traffic data available."
-        else:
-            upload_gb = upload_bytes / (1024 ** 3)
-            download_gb = download_bytes / (1024 ** 3)
-            totalusage = upload_gb + download_gb
-            
-            traffic_message = (
-                f"🔼 Upload: {upload_gb:.2f} GB\n"
-                f"🔽 Download: {download_gb:.2f} GB\n"
-                f"📊 Total Usage: {totalusage:.2f} GB\n"
-                f"🌐 Status: {status}"
-            )
-    except json.JSONDecodeError:
-        bot.reply_to(message, "Failed to parse user details. The command output may be malformed.")
-        return
+    if upload_bytes is None or download_bytes is None:
+        traffic_message = "*Traffic Data:*\nUser not active or no traffic data available."
+    else:
+        upload_gb = upload_bytes / (1024 ** 3)
+        download_gb = download_bytes / (1024 ** 3)
+        totalusage = upload_gb + download_gb
+        
+        traffic_message = (
+            f"🔼 Upload: {upload_gb:.2f} GB\n"
+            f"🔽 Download: {download_gb:.2f} GB\n"
+            f"📊 Total Usage: {totalusage:.2f} GB\n"
+            f"🌐 Status: {status}"
+        )
 
     display_username = escape_markdown(actual_username)
 
@@ -84,20 +73,14 @@ def process_show_user(message):
         f"{traffic_message}"
     )
 
-    combined_command = f"python3 {CLI_PATH} show-user-uri -u \"{actual_username}\" -ip 4 -s -n"
-    combined_result = run_cli_command(combined_command)
-
-    uri_v4 = ""
-    normal_sub_link = ""
+    try:
+        uris = service.get_user_uris(message.chat.id, actual_username)
+    except Exception as e:
+        bot.reply_to(message, f"Error generating user links: {e}")
+        return
 
-    lines = combined_result.strip().split('\n')
-    for i, line in enumerate(lines):
-        if line.strip() == "IPv4:":
-            if i + 1 < len(lines) and lines[i+1].strip().startswith("hy2://"):
-                uri_v4 = lines[i+1].strip()
-        elif line.strip() == "Normal-SUB Sublink:":
-            if i + 1 < len(lines) and (lines[i+1].strip().startswith("http://") or lines[i+1].strip().startswith("https://")):
-                normal_sub_link = lines[i+1].strip()
+    uri_v4 = uris.get('ipv4') or ""
+    normal_sub_link = uris.get('normal_sub') or ""
 
     qr_link = normal_sub_link if normal_sub_link else uri_v4
     if not qr_link:
@@ -149,13 +132,11 @@ def handle_edit_callback(call):
         msg = bot.send_message(call.message.chat.id, f"Enter new expiration days for {display_username}:")
         bot.register_next_step_handler(msg, process_edit_expiration, username)
     elif action == 'edit_note':
-        command = f"python3 {CLI_PATH} get-user -u \"{username}\""
-        user_result = run_cli_command(command)
         current_note = ""
         try:
-            user_details = json.loads(user_result)
-            current_note = user_details.get('note', '')
-        except json.JSONDecodeError:
+            user_details = service.get_user(call.message.chat.id, username)
+            current_note = (user_details or {}).get('note', '')
+        except Exception:
             pass
 
         markup = types.InlineKeyboardMarkup()
@@ -172,16 +153,13 @@ def handle_edit_callback(call):
         msg = bot.edit_message_text(f"Enter new note for {display_username}:", call.message.chat.id, call.message.message_id)
         bot.register_next_step_handler(msg, process_edit_note, username)
     elif action == 'clear_note':
-        command = f"python3 {CLI_PATH} edit-user -u \"{username}\" --note \"\""
-        result = run_cli_command(command)
+        result = service.run_action(service.edit_user, username, note="")
         bot.edit_message_text(result, chat_id=call.message.chat.id, message_id=call.message.message_id)
     elif action == 'renew_password':
-        command = f"python3 {CLI_PATH} edit-user -u \"{username}\" -rp"
-        result = run_cli_command(command)
+        result = service.run_action(service.edit_user, username, renew_password=True)
         bot.send_message(call.message.chat.id, result)
     elif action == 'renew_creation':
-        command = f"python3 {CLI_PATH} edit-user -u \"{username}\" -rc"
-        result = run_cli_command(command)
+        result = service.run_action(service.edit_user, username, renew_creation_date=True)
         bot.send_message(call.message.chat.id, result)
     elif action == 'block_user':
         markup = types.InlineKeyboardMarkup()
@@ -189,17 +167,19 @@ def handle_edit_callback(call):
                    types.InlineKeyboardButton("False", callback_data=f"confirm_block:{username}:false"))
         bot.send_message(call.message.chat.id, f"Set block status for {display_username}:", reply_markup=markup)
     elif action == 'reset_user':
-        command = f"python3 {CLI_PATH} reset-user -u \"{username}\""
-        result = run_cli_command(command)
+        result = service.run_action(service.reset_user, username)
         bot.send_message(call.message.chat.id, result)
     elif action == 'ipv6_uri':
-        command = f"python3 {CLI_PATH} show-user-uri -u \"{username}\" -ip 6"
-        result = run_cli_command(command)
-        if "Error" in result or "Invalid" in result:
-            bot.send_message(call.message.chat.id, result)
+        try:
+            uris = service.get_user_uris(call.message.chat.id, username)
+        except Exception as e:
+            bot.send_message(call.message.chat.id, f"Error: {e}")
             return
-        
-        uri_v6 = result.split('\n')[-1].strip()
+        uri_v6 = uris.get('ipv6')
+        if not uri_v6:
+            bot.send_message(call.message.chat.id, uris.get('error') or f"No IPv6 URI available for {username}.")
+            return
+
         qr_v6 = qrcode.make(uri_v6)
         bio_v6 = io.BytesIO()
         qr_v6.save(bio_v6, 'PNG')
@@ -215,22 +195,18 @@ def handle_edit_callback(call):
 @bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_block:'))
 def handle_block_confirmation(call):
     _, username, block_status = call.data.split(':', 2)
-    flag = '-b' if block_status == 'true' else '--unblocked'
-    command = f"python3 {CLI_PATH} edit-user -u \"{username}\" {flag}"
-    result = run_cli_command(command)
+    result = service.run_action(service.edit_user, username, blocked=block_status == 'true')
     bot.edit_message_text(result, call.message.chat.id, call.message.message_id)
 
 def process_edit_username(message, username):
     new_username = message.text.strip()
-    command = f"python3 {CLI_PATH} edit-user -u \"{username}\" -nu \"{new_username}\""
-    result = run_cli_command(command)
+    result = service.run_action(service.edit_user, username, new_username=new_username)
     bot.reply_to(message, result)
 
 def process_edit_traffic(message, username):
     try:
         new_traffic_limit = int(message.text.strip())
-        command = f"python3 {CLI_PATH} edit-user -u \"{username}\" -nt {new_traffic_limit}"
-        result = run_cli_command(command)
+        result = service.run_action(service.edit_user, username, new_traffic_limit=new_traffic_limit)
         bot.reply_to(message, result)
     except ValueError:
         bot.reply_to(message, "Invalid traffic limit. Please enter a number.")
@@ -238,8 +214,7 @@ def process_edit_traffic(message, username):
 def process_edit_expiration(message, username):
     try:
         new_expiration_days = int(message.text.strip())
-        command = f"python3 {CLI_PATH} edit-user -u \"{username}\" -ne {new_expiration_days}"
-        result = run_cli_command(command)
+        result = service.run_action(service.edit_user, username, new_expiration_days=new_expiration_days)
         bot.reply_to(message, result)
     except ValueError:
         bot.reply_to(message, "Invalid expiration days. Please enter a number.")
@@ -252,7 +227,5 @@ def process_edit_note(message, username):
         bot.register_next_step_handler(message, process_edit_note, username)
         return
         
-    command = f"python3 {CLI_PATH} edit-user -u \"{username}\" --note \"{note_input}\""
-    
-    result = run_cli_command(command)
+    result = service.run_action(service.edit_user, username, note=note_input)
     bot.reply_to(message, result)
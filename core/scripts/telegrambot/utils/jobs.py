@@ -0,0 +1,102 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.command import *
+
+JOB_WORKERS = int(os.getenv('BOT_JOB_WORKERS', '2'))
+
+JOB_DURATION = metrics.histogram(
+    'blitz_bot_job_duration_seconds', 'Duration of background bot jobs, by name and outcome.', ('job', 'status'),
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+
+
+class Job:
+    """A long-running task whose progress is shown by editing one chat message."""
+
+    def __init__(self, job_id, name, chat_id=None):
+        self.id = job_id
+        self.name = name
+        self.chat_id = chat_id
+        self.message_id = None
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+
+    def progress(self, text):
+        if self.chat_id is None:
+            print(f"[job {self.id}] {self.name}: {text}")
+            return
+        try:
+            if self.message_id is None:
+                self.message_id = bot.send_message(self.chat_id, text).message_id
+            else:
+                bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except Exception as e:
+            print(f"Failed to report progress for job {self.id}: {e}")
+
+
+class JobManager:
+    """
+    Runs long tasks (backups, uploads) on a small dedicated pool so they never
+    occupy the handler threads. Only one job per name runs or waits at a time.
+    """
+
+    def __init__(self, max_workers):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bot-job')
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def submit(self, name, func, chat_id=None):
+        """Queues func(job). Returns the job, or None if a job with this name is already active."""
+        with self.lock:
+            if any(job.name == name for job in self.jobs.values()):
+                return None
+            job = Job(next(self.ids), name, chat_id)
+            self.jobs[job.id] = job
+        job.progress(f"⏳ {name}: queued (job #{job.id})")
+        self.pool.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        job.status = 'running'
+        job.started_at = time.time()
+        job.progress(f"⏳ {job.name}: running...")
+        try:
+            result = func(job)
+            job.status = 'done'
+            job.progress(f"✅ {job.name}: {result or 'done'}")
+        except Exception as e:
+            job.status = 'failed'
+            job.progress(f"❌ {job.name} failed: {e}")
+        finally:
+            JOB_DURATION.observe(time.time() - job.started_at, job=job.name, status=job.status)
+            with self.lock:
+                self.jobs.pop(job.id, None)
+
+    def active(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.id)
+
+
+jobs = JobManager(JOB_WORKERS)
+
+
+@bot.message_handler(commands=['jobs'])
+def list_jobs(message):
+    if not is_admin(message.from_user.id):
+        bot.reply_to(message, "Unauthorized access. You do not have permission to use this command.")
+        return
+
+    active = jobs.active()
+    if not active:
+        bot.reply_to(message, "No background jobs are running.")
+        return
+
+    now = time.time()
+    lines = ["⚙️ Background jobs ⚙️\n"]
+    for job in active:
+        since = job.started_at or job.created_at
+        lines.append(f"#{job.id} {job.name}: {job.status} for {int(now - since)}s")
+    bot.reply_to(message, "\n".join(lines))
@@ -0,0 +1,164 @@
+import sys
+import time
+import threading
+from pathlib import Path
+
+core_dir = Path(__file__).resolve().parents[3]
+for path in (core_dir, core_dir / 'scripts', core_dir / 'scripts' / 'hysteria2'):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+import cli_api
+import wrapper_uri
+from db.database import db
+
+CACHE_TTL_SECONDS = 30
+SEARCH_CACHE_TTL_SECONDS = 10
+SEARCH_PAGE_SIZE = 50
+SEARCH_PROJECTION = {'_id': 1, 'max_download_bytes': 1, 'expiration_days': 1, 'account_creation_date': 1, 'blocked': 1, 'note': 1}
+
+
+class ChatCache:
+    """
+    Short-lived per-chat cache for user lookups, so stepping through one user's
+    menus doesn't hit the database on every button press. Entries for a user
+    are dropped in every chat as soon as that user is changed.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, chat_id, kind, username, loader):
+        key = (chat_id, kind, username)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        value = loader(username)
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+            if len(self.entries) > 1000:
+                self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+        return value
+
+    def invalidate(self, username):
+        with self.lock:
+            self.entries = {k: v for k, v in self.entries.items() if k[2] != username}
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+
+cache = ChatCache(CACHE_TTL_SECONDS)
+search_cache = ChatCache(SEARCH_CACHE_TTL_SECONDS)
+
+
+def _load_user(username):
+    if not db:
+        raise cli_api.HysteriaError("Database connection failed.")
+    user = db.get_user(username)
+    if user:
+        user['username'] = user.pop('_id')
+    return user
+
+
+def _load_user_uris(username):
+    # Config files may change while the bot runs; re-read them on each miss.
+    wrapper_uri.load_json_file.cache_clear()
+    wrapper_uri.load_env_file.cache_clear()
+    try:
+        return wrapper_uri.process_users([username])[0]
+    except RuntimeError as e:
+        raise cli_api.HysteriaError(str(e))
+
+
+def get_user(chat_id, username):
+    """Returns the user's document with `username` set, or None if there is no such user."""
+    return cache.get(chat_id, 'user', username.lower(), _load_user)
+
+
+def _search_users(key):
+    text, offset = key
+    if not db:
+        raise cli_api.HysteriaError("Database connection failed.")
+    if text == "block":
+        users = db.search_users(blocked=True, after=offset, limit=SEARCH_PAGE_SIZE, projection=SEARCH_PROJECTION)
+    else:
+        users = db.search_users(prefix=text, after=offset, limit=SEARCH_PAGE_SIZE, projection=SEARCH_PROJECTION)
+    for user in users:
+        user['username'] = user.pop('_id')
+    next_offset = users[-1]['username'] if len(users) == SEARCH_PAGE_SIZE else ""
+    return users, next_offset
+
+
+def search_users(chat_id, text, offset=""):
+    """
+    Returns one page of users whose name starts with `text` (or blocked users for
+    "block") and the offset of the next page, which is empty on the last page.
+    """
+    return search_cache.get(chat_id, 'search', (text.lower(), offset or None), _search_users)
+
+
+def get_user_uris(chat_id, username):
+    """Returns the user's `ipv4`, `ipv6`, `nodes` and `normal_sub` links, or an `error` entry."""
+    return cache.get(chat_id, 'uri', username.lower(), _load_user_uris)
+
+
+def add_user(username, traffic_limit, expiration_days, note=None):
+    cli_api.add_user(username, traffic_limit, expiration_days, None, None, False, note)
+    cache.invalidate(username.lower())
+    return f"User '{username}' added successfully."
+
+
+def edit_user(username, new_username=None, new_traffic_limit=None, new_expiration_days=None,
+              renew_password=False, renew_creation_date=False, blocked=None, note=None):
+    cli_api.kick_users_by_name([username])
+    cli_api.flush_users_traffic([username])
+    cli_api.edit_user(username, new_username, None, new_traffic_limit, new_expiration_days,
+                      renew_password, renew_creation_date, blocked, None, note)
+    cache.invalidate(username.lower())
+    if new_username:
+        cache.invalidate(new_username.lower())
+    return f"User '{username}' updated successfully."
+
+
+def reset_user(username):
+    cli_api.reset_user(username)
+    cache.invalidate(username.lower())
+    return f"User '{username}' reset successfully."
+
+
+def remove_user(username):
+    cli_api.kick_users_by_name([username])
+    cli_api.flush_users_traffic([username])
+    cli_api.remove_users([username])
+    cache.invalidate(username.lower())
+    return f"User '{username}' removed successfully."
+
+
+def get_top_users(window=None, limit=10):
+    return cli_api.get_top_traffic_users(since=window, limit=limit)
+
+
+def restore_backup(backup_path, progress=None):
+    """Restores a full backup; progress(percent, message) is called as it advances."""
+    cli_api.restore_hysteria2(str(backup_path), progress=progress)
+    cache.clear()
+    search_cache.clear()
+    return "Backup restored successfully."
+
+
+def server_info():
+    return cli_api.server_info()
+
+
+def run_action(action, *args, **kwargs):
+    """Runs a service call and returns its message, or the error text the way run_cli_command does."""
+    try:
+        return action(*args, **kwargs)
+    except Exception as e:
+        return f"Error: {e}"
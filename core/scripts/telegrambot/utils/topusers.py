@@ -0,0 +1,54 @@
+from telebot import types
+from utils.command import *
+from utils import service
+
+TOP_USERS_LIMIT = 10
+
+def format_bytes(bytes_val):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if bytes_val < 1024:
+            return f"{bytes_val:.2f} {unit}"
+        bytes_val /= 1024
+    return f"{bytes_val:.2f} TB"
+
+def send_top_users(message, window=None, limit=TOP_USERS_LIMIT):
+    bot.send_chat_action(message.chat.id, 'typing')
+    try:
+        users = service.get_top_users(window, limit)
+    except Exception as e:
+        bot.reply_to(message, f"Failed to get top users: {e}")
+        return
+
+    title = f"last {window}" if window else "all time"
+    if not users:
+        bot.reply_to(message, f"No traffic recorded ({title}).")
+        return
+
+    lines = [f"📊 Top {len(users)} users ({title}) 📊\n"]
+    for rank, user in enumerate(users, start=1):
+        lines.append(
+            f"{rank}. {user['username']}: {format_bytes(user['total_bytes'])} "
+            f"(⬆️ {format_bytes(user['upload_bytes'])} ⬇️ {format_bytes(user['download_bytes'])})"
+        )
+    bot.reply_to(message, "\n".join(lines))
+
+@bot.message_handler(commands=['top'])
+def top_users_command(message):
+    if not is_admin(message.from_user.id):
+        bot.reply_to(message, "Unauthorized access. You do not have permission to use this command.")
+        return
+
+    # Usage: /top [window] [limit], e.g. /top 24h 20
+    args = message.text.split()[1:]
+    window = args[0] if args else None
+    limit = TOP_USERS_LIMIT
+    if len(args) > 1:
+        if not args[1].isdigit() or int(args[1]) <= 0:
+            bot.reply_to(message, "Usage: /top [window] [limit], e.g. /top 24h 20")
+            return
+        limit = int(args[1])
+    send_top_users(message, window, limit)
+
+@bot.message_handler(func=lambda message: is_admin(message.from_user.id) and message.text == '📊 Top Users')
+def top_users_button(message):
+    send_top_users(message, window='24h')
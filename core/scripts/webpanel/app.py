@@ -4,18 +4,24 @@ import sys
 import asyncio
 from fastapi import FastAPI
 from starlette.staticfiles import StaticFiles
+from hypercorn.middleware import ProxyFixMiddleware
+
+# The middleware and session storage import metrics and db from core/scripts.
+HYSTERIA_CORE_DIR = '/etc/hysteria/core/'
+sys.path.append(HYSTERIA_CORE_DIR)
+sys.path.append(HYSTERIA_CORE_DIR + 'scripts')
 
 from config import CONFIGS
 from middleware import AuthMiddleware
 from middleware import AfterRequestMiddleware
+from middleware import MetricsMiddleware
 from dependency import get_session_manager
 from openapi import setup_openapi_schema
 from exception_handler import setup_exception_handler
-
-HYSTERIA_CORE_DIR = '/etc/hysteria/core/'
-sys.path.append(HYSTERIA_CORE_DIR)
+from executor import setup_executor
 
 import routers
+import metrics
 
 
 def create_app() -> FastAPI:
@@ -37,9 +43,11 @@ def create_app() -> FastAPI:
     app.mount('/assets', StaticFiles(directory='assets'), name='assets')
 
     setup_exception_handler(app)
+    setup_executor(app)
 
     app.add_middleware(AuthMiddleware, session_manager=get_session_manager(), api_token=CONFIGS.API_TOKEN)
     app.add_middleware(AfterRequestMiddleware)
+    app.add_middleware(MetricsMiddleware)
 
     app.include_router(routers.basic.router, prefix='', tags=['Web - Basic'])
     app.include_router(routers.login.router, prefix='', tags=['Web - Authentication'])
@@ -49,16 +57,27 @@ def create_app() -> FastAPI:
 
     setup_openapi_schema(app)
 
+    @app.on_event('startup')
+    async def start_session_sweeper():  # type: ignore
+        app.state.session_sweeper = asyncio.create_task(get_session_manager().run_sweeper(CONFIGS.SESSION_SWEEP_INTERVAL))
+
+    @app.on_event('startup')
+    async def start_metrics_flusher():  # type: ignore
+        metrics.start_worker_flusher('webpanel')
+
+    @app.on_event('shutdown')
+    async def stop_session_sweeper():  # type: ignore
+        app.state.session_sweeper.cancel()
+
     return app
 
 
 app: FastAPI = create_app()
+proxied_app = ProxyFixMiddleware(app, 'legacy')
 
 
 if __name__ == '__main__':
     from hypercorn.config import Config
-    from hypercorn.asyncio import serve
-    from hypercorn.middleware import ProxyFixMiddleware
 
     config = Config()
     config.debug = CONFIGS.DEBUG
@@ -66,5 +85,14 @@ if __name__ == '__main__':
     config.accesslog = '-'
     config.errorlog = '-'
 
-    app = ProxyFixMiddleware(app, 'legacy')
-    asyncio.run(serve(app, config))
\ No newline at end of file
+    if CONFIGS.WORKERS > 1:
+        from hypercorn.run import run
+
+        # Each worker process imports this module and serves `proxied_app` on the shared socket.
+        config.workers = CONFIGS.WORKERS
+        config.application_path = 'app:proxied_app'
+        run(config)
+    else:
+        from hypercorn.asyncio import serve
+
+        asyncio.run(serve(proxied_app, config))
\ No newline at end of file
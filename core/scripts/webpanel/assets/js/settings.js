@@ -25,6 +25,7 @@ $(document).ready(function () {
         editIp: contentSection.dataset.editIpUrl,
         backup: contentSection.dataset.backupUrl,
         restore: contentSection.dataset.restoreUrl,
+        restoreProgress: contentSection.dataset.restoreProgressUrl,
         startIpLimit: contentSection.dataset.startIpLimitUrl,
         stopIpLimit: contentSection.dataset.stopIpLimitUrl,
         cleanIpLimit: contentSection.dataset.cleanIpLimitUrl,
@@ -813,6 +814,20 @@ $(document).ready(function () {
             statusDiv.innerText = 'Uploading...';
             statusDiv.className = 'mt-2';
 
+            var progressTimer = null;
+            function pollRestoreProgress() {
+                $.ajax({
+                    url: API_URLS.restoreProgress,
+                    type: "GET",
+                    success: function(progress) {
+                        if (progress.state !== 'running') return;
+                        progressBar.style.width = progress.percent + '%';
+                        progressBar.setAttribute('aria-valuenow', progress.percent);
+                        statusDiv.innerText = `Restoring... ${progress.percent}% - ${progress.message}`;
+                    }
+                });
+            }
+
             $.ajax({
                 url: API_URLS.restore,
                 type: "POST",
@@ -827,6 +842,9 @@ $(document).ready(function () {
                             progressBar.style.width = percentComplete + '%';
                             progressBar.setAttribute('aria-valuenow', percentComplete);
                             statusDiv.innerText = `Uploading... ${percentComplete}%`;
+                            if (evt.loaded === evt.total && !progressTimer) {
+                                progressTimer = setInterval(pollRestoreProgress, 1000);
+                            }
                         }
                     }, false);
                     return xhr;
@@ -850,6 +868,7 @@ $(document).ready(function () {
                     console.error("Restore Error:", status, error, xhr.responseText);
                 },
                 complete: function() {
+                   clearInterval(progressTimer);
                    fileInput.value = '';
                 }
             });
@@ -11,6 +11,13 @@ class Configs(BaseSettings):
     EXPIRATION_MINUTES: int
     ROOT_PATH: str
     DECOY_PATH: str | None = None
+    SESSION_BACKEND: str = 'memory'
+    SESSION_MAX: int = 10000
+    SESSION_SWEEP_INTERVAL: int = 60
+    WORKERS: int = 1
+    THREAD_POOL_SIZE: int = 16
+    # Requests slower than this many seconds are logged with their DB and subprocess calls; 0 disables.
+    SLOW_REQUEST_THRESHOLD: float = 1.0
 
     class Config:
         env_file = '.env'
@@ -1,6 +1,6 @@
 from fastapi.templating import Jinja2Templates
 
-from session import SessionStorage, SessionManager
+from session import SessionStorage, MongoSessionStorage, SessionManager
 from config import CONFIGS
 
 __TEMPLATES = Jinja2Templates(directory='templates')
@@ -25,7 +25,15 @@ def get_templates() -> Jinja2Templates:
     return __TEMPLATES
 
 
-__SESSION_STORAGE = SessionStorage()
+def __create_session_storage() -> SessionStorage | MongoSessionStorage:
+    # Worker processes don't share memory, so in-memory sessions would only be
+    # valid on the worker that created them.
+    if CONFIGS.SESSION_BACKEND == 'mongo' or CONFIGS.WORKERS > 1:
+        return MongoSessionStorage(max_sessions=CONFIGS.SESSION_MAX)
+    return SessionStorage(max_sessions=CONFIGS.SESSION_MAX)
+
+
+__SESSION_STORAGE = __create_session_storage()
 __SESSION_MANAGER = SessionManager(__SESSION_STORAGE, CONFIGS.EXPIRATION_MINUTES)
 
 
@@ -0,0 +1 @@
+from .executor import setup_executor, find_blocking_handlers, get_executor, operation, ExecutorRoute, OPERATION_LIMITS
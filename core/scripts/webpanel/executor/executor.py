@@ -0,0 +1,208 @@
+import re
+import time
+import asyncio
+import inspect
+import logging
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from anyio import to_thread
+
+from config import CONFIGS
+
+logger = logging.getLogger('webpanel.executor')
+
+# Calls that block the event loop when made directly from an `async def` handler.
+BLOCKING_CALL_PATTERN = re.compile(r'\b(cli_api\.\w+|db\.\w+|subprocess\.\w+|open|shutil\.\w+|time\.sleep)\(')
+
+# Operations that must not overlap. Anything not listed only shares the pool bound.
+OPERATION_LIMITS: dict[str, int] = {
+    'backup': 1,
+    'hysteria-service': 1,
+    'warp': 1,
+    'system': 1,
+    'profile': 1,
+}
+
+
+class OperationMetrics:
+    '''Running counters for one operation. Times are in seconds.'''
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.queued = 0
+        self.running = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'queued': self.queued,
+            'running': self.running,
+            'wait_avg': self.wait_total / self.calls if self.calls else 0.0,
+            'wait_max': self.wait_max,
+            'exec_avg': self.exec_total / self.calls if self.calls else 0.0,
+            'exec_max': self.exec_max,
+        }
+
+
+class BlockingExecutor:
+    '''
+    Runs blocking calls on a sized thread pool so the event loop stays free.
+
+    Calls are tagged with an operation name; operations listed in OPERATION_LIMITS
+    are capped with a semaphore that is awaited on the loop, so a queued backup
+    doesn't hold a pool thread while it waits.
+    '''
+
+    def __init__(self, max_workers: int, limits: dict[str, int]):
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='webpanel')
+        self.__limits = limits
+        self.__semaphores: dict[str, asyncio.Semaphore] = {}
+        self.__metrics: dict[str, OperationMetrics] = {}
+        self.__lock = threading.Lock()
+
+    def __semaphore(self, operation: str) -> asyncio.Semaphore | None:
+        limit = self.__limits.get(operation)
+        if not limit:
+            return None
+        if operation not in self.__semaphores:
+            self.__semaphores[operation] = asyncio.Semaphore(limit)
+        return self.__semaphores[operation]
+
+    def __metrics_for(self, operation: str) -> OperationMetrics:
+        with self.__lock:
+            if operation not in self.__metrics:
+                self.__metrics[operation] = OperationMetrics()
+            return self.__metrics[operation]
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        metrics = self.__metrics_for(operation)
+        submitted = time.perf_counter()
+        started = submitted
+        with self.__lock:
+            metrics.queued += 1
+
+        def call() -> Any:
+            nonlocal started
+            started = time.perf_counter()
+            with self.__lock:
+                metrics.queued -= 1
+                metrics.running += 1
+            return func(*args, **kwargs)
+
+        # Carry the request's context vars (e.g. the slow-request call trace) into the pool thread.
+        context = contextvars.copy_context()
+        semaphore = self.__semaphore(operation)
+        failed = False
+        try:
+            if semaphore:
+                async with semaphore:
+                    return await asyncio.get_running_loop().run_in_executor(self.__pool, context.run, call)
+            return await asyncio.get_running_loop().run_in_executor(self.__pool, context.run, call)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            with self.__lock:
+                if started == submitted:
+                    # Cancelled or rejected before the call began.
+                    metrics.queued -= 1
+                else:
+                    metrics.running -= 1
+                wait, elapsed = started - submitted, finished - started
+                metrics.calls += 1
+                metrics.errors += failed
+                metrics.wait_total += wait
+                metrics.wait_max = max(metrics.wait_max, wait)
+                metrics.exec_total += elapsed
+                metrics.exec_max = max(metrics.exec_max, elapsed)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self.__lock:
+            return {operation: metrics.as_dict() for operation, metrics in sorted(self.__metrics.items())}
+
+    def shutdown(self):
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+
+__EXECUTOR = BlockingExecutor(CONFIGS.THREAD_POOL_SIZE, OPERATION_LIMITS)
+
+
+def get_executor() -> BlockingExecutor:
+    return __EXECUTOR
+
+
+def operation(name: str):
+    '''Tags a sync route handler with the operation it belongs to for concurrency limits and metrics.'''
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        func.__operation__ = name  # type: ignore
+        return func
+    return decorator
+
+
+class ExecutorRoute(APIRoute):
+    '''
+    Route class that dispatches sync handlers through the shared executor instead
+    of Starlette's anonymous thread pool, so they get per-operation limits and metrics.
+    '''
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = self.__dispatching(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def __dispatching(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        name = getattr(endpoint, '__operation__', endpoint.__name__)
+
+        @functools.wraps(endpoint)
+        async def dispatch(*args: Any, **kwargs: Any) -> Any:
+            return await get_executor().run(name, endpoint, *args, **kwargs)
+
+        return dispatch
+
+
+def find_blocking_handlers(app: FastAPI) -> list[str]:
+    '''
+    Returns the routes whose `async def` endpoint calls known blocking functions.
+
+    Such handlers run on the event loop and stall every other request; plain `def`
+    handlers are dispatched to the thread pool instead.
+    '''
+    offenders = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or not inspect.iscoroutinefunction(inspect.unwrap(route.endpoint)):
+            continue
+        try:
+            source = inspect.getsource(route.endpoint)
+        except (OSError, TypeError):
+            continue
+        if BLOCKING_CALL_PATTERN.search(source):
+            offenders.append(f"{','.join(sorted(route.methods))} {route.path} ({route.endpoint.__module__}.{route.endpoint.__name__})")
+    return offenders
+
+
+def setup_executor(app: FastAPI):
+    '''Sizes the thread pools used for sync handlers and warns about handlers that still block the event loop.'''
+
+    @app.on_event('startup')
+    async def configure_thread_pool():  # type: ignore
+        to_thread.current_default_thread_limiter().total_tokens = CONFIGS.THREAD_POOL_SIZE
+
+        for handler in find_blocking_handlers(app):
+            logger.warning(f'Blocking call inside async handler, move it off the event loop: {handler}')
+
+    @app.on_event('shutdown')
+    async def shutdown_executor():  # type: ignore
+        get_executor().shutdown()
@@ -1,2 +1,3 @@
 from .auth import AuthMiddleware
 from .request import AfterRequestMiddleware
+from .request_metrics import MetricsMiddleware
@@ -4,6 +4,7 @@ from fastapi.responses import RedirectResponse
 from datetime import datetime, timezone
 from typing import Awaitable, Callable
 from starlette.types import ASGIApp
+from starlette.concurrency import run_in_threadpool
 from urllib.parse import quote
 
 from exception_handler import exception_handler
@@ -28,7 +29,8 @@ class AuthMiddleware(BaseHTTPMiddleware):
         if request.url.path in public_routes:
             return await call_next(request)
 
-        is_api_request = '/api/v1/' in request.url.path
+        # /metrics is scraped by Prometheus, which authenticates with the API token like API clients.
+        is_api_request = '/api/v1/' in request.url.path or request.url.path == f'/{CONFIGS.ROOT_PATH}/metrics'
 
         if is_api_request:
             if self.__api_token:
@@ -48,7 +50,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
 
             return self.__redirect_to_login(request)
 
-        session_data = self.__session_manager.get_session(session_id)
+        session_data = await run_in_threadpool(self.__session_manager.get_session, session_id)
 
         if not session_data:
             if is_api_request:
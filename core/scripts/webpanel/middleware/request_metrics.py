@@ -0,0 +1,35 @@
+import time
+import logging
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Awaitable, Callable
+
+import metrics
+from config import CONFIGS
+
+logger = logging.getLogger('webpanel.slow_requests')
+
+REQUEST_DURATION = metrics.histogram(
+    'blitz_http_request_duration_seconds', 'Time to serve an HTTP request, by route template.', ('method', 'route', 'status'))
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    '''
+    Records request latency per route template, so /users/{username} is one series rather than one per user,
+    and logs requests slower than SLOW_REQUEST_THRESHOLD together with the DB and subprocess calls they made.
+    '''
+
+    async def dispatch(self, request: Request, call_next: Callable[[Request], Awaitable[Response]]):
+        start = time.perf_counter()
+        status = 500
+        with metrics.trace_calls() as calls:
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                return response
+            finally:
+                elapsed = time.perf_counter() - start
+                route = getattr(request.scope.get('route'), 'path', 'unmatched')
+                REQUEST_DURATION.observe(elapsed, method=request.method, route=route, status=status)
+                if CONFIGS.SLOW_REQUEST_THRESHOLD and elapsed >= CONFIGS.SLOW_REQUEST_THRESHOLD:
+                    logger.warning(f'Slow request {request.method} {route} ({status}) took {elapsed:.3f}s: {metrics.describe_calls(calls)}')
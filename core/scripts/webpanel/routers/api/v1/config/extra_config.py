@@ -7,11 +7,12 @@ from ..schema.config.extra_config import (
     ExtraConfigListResponse,
 )
 import cli_api
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 @router.get('/list', response_model=ExtraConfigListResponse, summary='Get All Extra Configs')
-async def get_all_extra_configs():
+def get_all_extra_configs():
     """
     Retrieves the list of all configured extra proxy configurations.
 
@@ -30,7 +31,7 @@ async def get_all_extra_configs():
 
 
 @router.post('/add', response_model=DetailResponse, summary='Add Extra Config')
-async def add_extra_config(body: AddExtraConfigBody):
+def add_extra_config(body: AddExtraConfigBody):
     """
     Adds a new extra proxy configuration.
 
@@ -45,7 +46,7 @@ async def add_extra_config(body: AddExtraConfigBody):
 
 
 @router.post('/delete', response_model=DetailResponse, summary='Delete Extra Config')
-async def delete_extra_config(body: DeleteExtraConfigBody):
+def delete_extra_config(body: DeleteExtraConfigBody):
     """
     Deletes an extra proxy configuration by its name.
 
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File
-from ..schema.config.hysteria import ConfigFile, GetPortResponse, GetSniResponse, GetObfsResponse, GetMasqueradeStatusResponse
+from ..schema.config.hysteria import ConfigFile, GetPortResponse, GetSniResponse, GetObfsResponse, GetMasqueradeStatusResponse, RestoreProgressResponse
 from ..schema.response import DetailResponse, IPLimitConfig, SetupDecoyRequest, DecoyStatusResponse, IPLimitConfigResponse
 from fastapi.responses import FileResponse
 import shutil
@@ -9,11 +9,13 @@ import tempfile
 import os
 from pathlib import Path
 import cli_api
+from executor import ExecutorRoute, operation
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 @router.patch('/update', response_model=DetailResponse, summary='Update Hysteria2')
-async def update():
+@operation('hysteria-service')
+def update():
     """
     Updates Hysteria2.
 
@@ -30,7 +32,8 @@ async def update():
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.post('/restart', response_model=DetailResponse, summary='Restart Hysteria2 Service')
-async def restart_service():
+@operation('hysteria-service')
+def restart_service():
     """
     Restarts the Hysteria2 service.
 
@@ -47,7 +50,7 @@ async def restart_service():
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.get('/get-port', response_model=GetPortResponse, summary='Get Hysteria2 port')
-async def get_port_api():
+def get_port_api():
     """
     Retrieves the port for Hysteria2.
 
@@ -67,7 +70,8 @@ async def get_port_api():
 
 
 @router.get('/set-port/{port}', response_model=DetailResponse, summary='Set Hysteria2 port')
-async def set_port_api(port: int):
+@operation('hysteria-service')
+def set_port_api(port: int):
     """
     Sets the port for Hysteria2.
 
@@ -88,7 +92,7 @@ async def set_port_api(port: int):
 
 
 @router.get('/get-sni', response_model=GetSniResponse, summary='Get Hysteria2 SNI')
-async def get_sni_api():
+def get_sni_api():
     '''
     Retrieves the SNI for Hysteria2.
 
@@ -108,7 +112,8 @@ async def get_sni_api():
 
 
 @router.get('/set-sni/{sni}', response_model=DetailResponse, summary='Set Hysteria2 SNI')
-async def set_sni_api(sni: str):
+@operation('hysteria-service')
+def set_sni_api(sni: str):
     """
     Sets the SNI for Hysteria2.
 
@@ -129,7 +134,8 @@ async def set_sni_api(sni: str):
 
 
 @router.get('/backup', response_class=FileResponse, summary='Backup Hysteria2 configuration')
-async def backup_api():
+@operation('backup')
+def backup_api():
     try:
         cli_api.backup_hysteria2()
         backup_dir = "/opt/hysbackup/"
@@ -154,33 +160,41 @@ async def backup_api():
 
 
 @router.post('/restore', response_model=DetailResponse, summary='Restore Hysteria2 Configuration')
-async def restore_api(file: UploadFile = File(...)):
+@operation('backup')
+def restore_api(file: UploadFile = File(...)):
+    """
+    Restores the panel from an uploaded backup. Poll /restore/progress while this runs.
+    """
     temp_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_path = temp_file.name
-
-        if not zipfile.is_zipfile(temp_path):
+        # The upload is already spooled to a seekable file; check it before copying it anywhere.
+        if not zipfile.is_zipfile(file.file):
             raise HTTPException(status_code=400, detail="Invalid file type. Must be a ZIP file.")
 
-        with zipfile.ZipFile(temp_path, 'r') as zip_ref:
+        file.file.seek(0)
+        with zipfile.ZipFile(file.file, 'r') as zip_ref:
             namelist = zip_ref.namelist()
-            
-            required_flat_files = {"ca.key", "ca.crt", "config.json", ".configs.env"}
-            missing_files = required_flat_files - set(namelist)
-            if missing_files:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Backup is missing required configuration files: {', '.join(missing_files)}"
-                )
-
-            db_dump_prefix = "blitz_panel/"
-            if not any(name.startswith(db_dump_prefix) for name in namelist):
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Backup file is not a modern backup and is missing the database dump directory: '{db_dump_prefix}'"
-                )
+
+        required_flat_files = {"ca.key", "ca.crt", "config.json", ".configs.env"}
+        missing_files = required_flat_files - set(namelist)
+        if missing_files:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Backup is missing required configuration files: {', '.join(missing_files)}"
+            )
+
+        db_dump_prefix = "blitz_panel/"
+        db_archive_name = "blitz_panel.archive.gz"
+        if db_archive_name not in namelist and not any(name.startswith(db_dump_prefix) for name in namelist):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Backup file is not a modern backup and is missing the database dump: '{db_archive_name}'"
+            )
+
+        file.file.seek(0)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_file:
+            shutil.copyfileobj(file.file, temp_file, 1024 * 1024)
+            temp_path = temp_file.name
 
         cli_api.restore_hysteria2(temp_path)
         return DetailResponse(detail='Hysteria2 restored successfully.')
@@ -193,8 +207,23 @@ async def restore_api(file: UploadFile = File(...)):
         if temp_path and os.path.exists(temp_path):
             os.unlink(temp_path)
 
+
+@router.get('/restore/progress', response_model=RestoreProgressResponse, summary='Get Restore Progress')
+def restore_progress_api():
+    """
+    Returns the progress of the running (or last) restore.
+
+    Raises:
+        HTTPException: 404 if no restore has been run yet.
+    """
+    progress = cli_api.get_restore_progress()
+    if progress is None:
+        raise HTTPException(status_code=404, detail='No restore has been run.')
+    return RestoreProgressResponse(**progress)
+
 @router.get('/enable-obfs', response_model=DetailResponse, summary='Enable Hysteria2 obfs')
-async def enable_obfs():
+@operation('hysteria-service')
+def enable_obfs():
     """
     Enables Hysteria2 obfs.
 
@@ -212,7 +241,8 @@ async def enable_obfs():
 
 
 @router.get('/disable-obfs', response_model=DetailResponse, summary='Disable Hysteria2 obfs')
-async def disable_obfs():
+@operation('hysteria-service')
+def disable_obfs():
     """
     Disables Hysteria2 obfs.
 
@@ -230,7 +260,7 @@ async def disable_obfs():
 
 
 @router.get('/check-obfs', response_model=GetObfsResponse, summary='Check Hysteria2 OBFS Status')
-async def check_obfs():
+def check_obfs():
     """
     Checks the current status of Hysteria2 OBFS.
 
@@ -247,7 +277,8 @@ async def check_obfs():
         raise HTTPException(status_code=400, detail=f'Error checking OBFS status: {str(e)}')
 
 @router.get('/enable-masquerade', response_model=DetailResponse, summary='Enable Hysteria2 masquerade')
-async def enable_masquerade():
+@operation('hysteria-service')
+def enable_masquerade():
     """
     Enables Hysteria2 masquerade for the given domain.
 
@@ -268,7 +299,8 @@ async def enable_masquerade():
 
 
 @router.get('/disable-masquerade', response_model=DetailResponse, summary='Disable Hysteria2 masquerade')
-async def disable_masquerade():
+@operation('hysteria-service')
+def disable_masquerade():
     """
     Disables Hysteria2 masquerade.
 
@@ -285,7 +317,7 @@ async def disable_masquerade():
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.get('/check-masquerade', response_model=GetMasqueradeStatusResponse, summary='Check Hysteria2 Masquerade Status')
-async def check_masquerade():
+def check_masquerade():
     try:
         status_message = cli_api.get_hysteria2_masquerade_status()
         return GetMasqueradeStatusResponse(status=status_message)
@@ -293,7 +325,7 @@ async def check_masquerade():
         raise HTTPException(status_code=400, detail=f'Error checking Masquerade status: {str(e)}')
 
 @router.get('/file', response_model=ConfigFile, summary='Get Hysteria2 configuration file')
-async def get_file():
+def get_file():
     """
     Gets the Hysteria2 configuration file.
 
@@ -313,7 +345,8 @@ async def get_file():
 
 
 @router.post('/file', response_model=DetailResponse, summary='Update Hysteria2 configuration file')
-async def set_file(body: ConfigFile):
+@operation('hysteria-service')
+def set_file(body: ConfigFile):
     """
     Updates the Hysteria2 configuration file.
 
@@ -334,7 +367,7 @@ async def set_file(body: ConfigFile):
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.post('/ip-limit/start', response_model=DetailResponse, summary='Start IP Limiter Service')
-async def start_ip_limit_api():
+def start_ip_limit_api():
     """Starts the IP Limiter service."""
     try:
         cli_api.start_ip_limiter()
@@ -343,7 +376,7 @@ async def start_ip_limit_api():
         raise HTTPException(status_code=400, detail=f'Error starting IP Limiter: {str(e)}')
 
 @router.post('/ip-limit/stop', response_model=DetailResponse, summary='Stop IP Limiter Service')
-async def stop_ip_limit_api():
+def stop_ip_limit_api():
     """Stops the IP Limiter service."""
     try:
         cli_api.stop_ip_limiter()
@@ -352,7 +385,7 @@ async def stop_ip_limit_api():
         raise HTTPException(status_code=400, detail=f'Error stopping IP Limiter: {str(e)}')
 
 @router.post('/ip-limit/clean', response_model=DetailResponse, summary='Clean IP Limiter Database')
-async def clean_ip_limit_api():
+def clean_ip_limit_api():
     """Cleans the IP Limiter database and unblocks all IPs."""
     try:
         cli_api.clean_ip_limiter()
@@ -361,7 +394,7 @@ async def clean_ip_limit_api():
         raise HTTPException(status_code=400, detail=f'Error cleaning IP Limiter: {str(e)}')
 
 @router.post('/ip-limit/config', response_model=DetailResponse, summary='Configure IP Limiter')
-async def config_ip_limit_api(config: IPLimitConfig):
+def config_ip_limit_api(config: IPLimitConfig):
     """Configures the IP Limiter service parameters."""
     try:
         cli_api.config_ip_limiter(config.block_duration, config.max_ips)
@@ -375,7 +408,7 @@ async def config_ip_limit_api(config: IPLimitConfig):
         raise HTTPException(status_code=400, detail=f'Error configuring IP Limiter: {str(e)}')
 
 @router.get('/ip-limit/config', response_model=IPLimitConfigResponse, summary='Get IP Limiter Configuration')
-async def get_ip_limit_config_api():
+def get_ip_limit_config_api():
     """Retrieves the current IP Limiter configuration."""
     try:
         config = cli_api.get_ip_limiter_config()
@@ -398,7 +431,7 @@ def run_stop_decoy_background():
         pass 
 
 @router.post('/webpanel/decoy/setup', response_model=DetailResponse, summary='Setup/Update WebPanel Decoy Site (Background Task)')
-async def setup_decoy_api(request_body: SetupDecoyRequest, background_tasks: BackgroundTasks):
+def setup_decoy_api(request_body: SetupDecoyRequest, background_tasks: BackgroundTasks):
     """
     Initiates the setup or update of the decoy site configuration for the web panel.
     Requires the web panel service to be running.
@@ -413,7 +446,7 @@ async def setup_decoy_api(request_body: SetupDecoyRequest, background_tasks: Bac
 
 
 @router.post('/webpanel/decoy/stop', response_model=DetailResponse, summary='Stop WebPanel Decoy Site (Background Task)')
-async def stop_decoy_api(background_tasks: BackgroundTasks):
+def stop_decoy_api(background_tasks: BackgroundTasks):
     """
     Initiates the removal of the decoy site configuration for the web panel.
     The actual operation (including Caddy restart) runs in the background.
@@ -423,7 +456,7 @@ async def stop_decoy_api(background_tasks: BackgroundTasks):
     return DetailResponse(detail='Web Panel decoy site stop initiated. Caddy will restart in the background.')
 
 @router.get('/webpanel/decoy/status', response_model=DecoyStatusResponse, summary='Get WebPanel Decoy Site Status')
-async def get_decoy_status_api():
+def get_decoy_status_api():
     """
     Checks if the decoy site is currently configured and active.
     """
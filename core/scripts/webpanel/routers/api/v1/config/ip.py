@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from ..schema.response import DetailResponse
 import json
 import os
 from scripts.db.database import db
+from scripts.nodes.replication import build_snapshot, build_delta, encode_feed
+from scripts.nodes.health import read_health, effective_status, order_node_names, record_traffic_push
 
 from ..schema.config.ip import (
     EditInputBody, 
@@ -13,12 +16,13 @@ from ..schema.config.ip import (
     NodesTrafficPayload
 )
 import cli_api
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.get('/get', response_model=StatusResponse, summary='Get Local Server IP Status')
-async def get_ip_api():
+def get_ip_api():
     """
     Retrieves the current status of the main server's IP addresses.
 
@@ -34,7 +38,7 @@ async def get_ip_api():
 
 
 @router.get('/add', response_model=DetailResponse, summary='Detect and Add Local Server IP')
-async def add_ip_api():
+def add_ip_api():
     """
     Adds the auto-detected IP addresses to the .configs.env file.
 
@@ -49,7 +53,7 @@ async def add_ip_api():
 
 
 @router.post('/edit', response_model=DetailResponse, summary='Edit Local Server IP')
-async def edit_ip_api(body: EditInputBody):
+def edit_ip_api(body: EditInputBody):
     """
     Edits the main server's IP addresses in the .configs.env file.
 
@@ -66,12 +70,13 @@ async def edit_ip_api(body: EditInputBody):
 
 
 @router.get('/nodes', response_model=NodeListResponse, summary='Get All External Nodes')
-async def get_all_nodes():
+def get_all_nodes():
     """
-    Retrieves the list of all configured external nodes.
+    Retrieves the list of all configured external nodes with their cached health,
+    healthy and fastest nodes first.
 
     Returns:
-        A list of node objects, each containing a name and an IP.
+        A list of node objects, each containing a name, an IP and the last probe result.
     """
     if not os.path.exists(cli_api.NODES_JSON_PATH):
         return []
@@ -80,13 +85,21 @@ async def get_all_nodes():
             content = f.read()
             if not content:
                 return []
-            return json.loads(content)
+            nodes = {node['name']: node for node in json.loads(content)}
     except (json.JSONDecodeError, IOError) as e:
         raise HTTPException(status_code=500, detail=f"Failed to read or parse nodes file: {e}")
 
+    health = read_health()
+    result = []
+    for name in order_node_names(list(nodes), health):
+        entry = dict(health.get(name, {}))
+        entry['status'] = effective_status(entry)
+        result.append({**nodes[name], 'health': entry})
+    return result
+
 
 @router.post('/nodes/add', response_model=DetailResponse, summary='Add External Node')
-async def add_node(body: AddNodeBody):
+def add_node(body: AddNodeBody):
     """
     Adds a new external node to the configuration.
 
@@ -101,7 +114,8 @@ async def add_node(body: AddNodeBody):
             sni=body.sni, 
             pinSHA256=body.pinSHA256, 
             obfs=body.obfs,
-            insecure=body.insecure
+            insecure=body.insecure,
+            health_url=body.health_url
         )
         return DetailResponse(detail=f"Node '{body.name}' added successfully.")
     except Exception as e:
@@ -109,7 +123,7 @@ async def add_node(body: AddNodeBody):
 
 
 @router.post('/nodes/delete', response_model=DetailResponse, summary='Delete External Node')
-async def delete_node(body: DeleteNodeBody):
+def delete_node(body: DeleteNodeBody):
     """
     Deletes an external node from the configuration by its name.
 
@@ -124,38 +138,95 @@ async def delete_node(body: DeleteNodeBody):
 
 
 @router.post('/nodestraffic', response_model=DetailResponse, summary='Receive and Aggregate Traffic from Node')
-async def receive_node_traffic(body: NodesTrafficPayload):
+def receive_node_traffic(body: NodesTrafficPayload):
     """
     Receives traffic delta from a node and adds it to the user's total in the database.
     Authentication is handled by the AuthMiddleware.
     """
-    if db is None:
+    if not db:
         raise HTTPException(status_code=500, detail="Database connection is not available.")
     
     updated_count = 0
-    for user_traffic in body.users:
-        try:
-            db_user = db.get_user(user_traffic.username)
-            if not db_user:
-                continue
-
-            new_upload = db_user.get('upload_bytes', 0) + user_traffic.upload_bytes
-            new_download = db_user.get('download_bytes', 0) + user_traffic.download_bytes
-
-            update_data = {
-                'upload_bytes': new_upload,
-                'download_bytes': new_download,
-                'status': user_traffic.status,
-                'online_count': user_traffic.online_count,
-            }
+    deltas = {}
+    with db.revision() as rev:
+        for user_traffic in body.users:
+            try:
+                db_user = db.get_user(user_traffic.username)
+                if not db_user:
+                    continue
+
+                new_upload = db_user.get('upload_bytes', 0) + user_traffic.upload_bytes
+                new_download = db_user.get('download_bytes', 0) + user_traffic.download_bytes
+
+                update_data = {
+                    'upload_bytes': new_upload,
+                    'download_bytes': new_download,
+                    'status': user_traffic.status,
+                    'online_count': user_traffic.online_count,
+                }
             
-            if not db_user.get('account_creation_date') and user_traffic.account_creation_date:
-                update_data['account_creation_date'] = user_traffic.account_creation_date
+                if not db_user.get('account_creation_date') and user_traffic.account_creation_date:
+                    update_data['account_creation_date'] = user_traffic.account_creation_date
 
-            db.update_user(user_traffic.username, update_data)
-            updated_count += 1
+                db.update_user(user_traffic.username, update_data, rev=rev)
+                upload, download = deltas.get(db_user['_id'], (0, 0))
+                deltas[db_user['_id']] = (upload + user_traffic.upload_bytes, download + user_traffic.download_bytes)
+                updated_count += 1
             
-        except Exception as e:
-            print(f"Error updating traffic for user {user_traffic.username}: {e}")
+            except Exception as e:
+                print(f"Error updating traffic for user {user_traffic.username}: {e}")
+
+    # Node-served traffic goes into the history just like the local traffic pass.
+    try:
+        db.record_traffic(deltas)
+    except Exception as e:
+        print(f"Error recording traffic history from node {body.node_name}: {e}")
+
+    if body.node_name:
+        try:
+            record_traffic_push(body.node_name)
+        except OSError as e:
+            print(f"Error recording traffic push for node {body.node_name}: {e}")
+
+    return DetailResponse(detail=f"Successfully processed and aggregated traffic for {updated_count} users.")
 
-    return DetailResponse(detail=f"Successfully processed and aggregated traffic for {updated_count} users.")
\ No newline at end of file
+
+def _feed_response(request: Request, payload: dict) -> Response:
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        return Response(
+            content=encode_feed(payload),
+            media_type='application/json',
+            headers={'Content-Encoding': 'gzip', 'X-Feed-Version': str(payload['version'])}
+        )
+    return JSONResponse(content=payload, headers={'X-Feed-Version': str(payload['version'])})
+
+
+@router.get('/nodes/users/snapshot', summary='Get User Replication Snapshot')
+def get_users_snapshot(request: Request):
+    """
+    Returns the full user table in the compact form consumed by node-side auth replicas.
+    The payload is gzip-compressed when the client accepts it.
+    Authentication is handled by the AuthMiddleware.
+    """
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    try:
+        return _feed_response(request, build_snapshot(db))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+
+@router.get('/nodes/users/delta', summary='Get User Replication Delta')
+def get_users_delta(request: Request, since: int = Query(..., ge=0)):
+    """
+    Returns users changed and deleted after the given feed version.
+
+    Args:
+        since: The version of the last snapshot or delta applied by the node.
+    """
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    try:
+        return _feed_response(request, build_delta(db, since))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
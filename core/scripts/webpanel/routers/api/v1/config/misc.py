@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from ..schema.response import DetailResponse
 import cli_api
+from executor import ExecutorRoute, operation
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.post('/install-tcp-brutal', response_model=DetailResponse, summary='Install TCP Brutal')
-async def install_tcp_brutal():
+@operation('system')
+def install_tcp_brutal():
     """
     Endpoint to install TCP Brutal service.
     It's post method because keeping backward compatibility if we need to add parameters in the future.
@@ -25,7 +27,8 @@ async def install_tcp_brutal():
 
 
 @router.get('/update-geo/{country}', response_model=DetailResponse, summary='Update Geo files')
-async def update_geo(country: str):
+@operation('system')
+def update_geo(country: str):
     """
     Endpoint to update geographic data files based on the specified country.
 
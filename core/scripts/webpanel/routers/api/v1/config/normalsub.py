@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException
 from ..schema.response import DetailResponse
 from ..schema.config.normalsub import StartInputBody, EditSubPathInputBody, GetSubPathResponse
 import cli_api
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.post('/start', response_model=DetailResponse, summary='Start NormalSub')
-async def normal_sub_start_api(body: StartInputBody):
+def normal_sub_start_api(body: StartInputBody):
     """
     Starts the NormalSub service using the provided domain and port.
 
@@ -32,7 +33,7 @@ async def normal_sub_start_api(body: StartInputBody):
 
 
 @router.delete('/stop', response_model=DetailResponse, summary='Stop NormalSub')
-async def normal_sub_stop_api():
+def normal_sub_stop_api():
     """
     Stops the NormalSub service.
 
@@ -53,7 +54,7 @@ async def normal_sub_stop_api():
 
 
 @router.put('/edit_subpath', response_model=DetailResponse, summary='Edit NormalSub Subpath')
-async def normal_sub_edit_subpath_api(body: EditSubPathInputBody):
+def normal_sub_edit_subpath_api(body: EditSubPathInputBody):
     """
     Edits the subpath for the NormalSub service.
 
@@ -77,7 +78,7 @@ async def normal_sub_edit_subpath_api(body: EditSubPathInputBody):
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.get('/subpath', response_model=GetSubPathResponse, summary='Get Current NormalSub Subpath')
-async def normal_sub_get_subpath_api():
+def normal_sub_get_subpath_api():
     """
     Retrieves the current subpath for the NormalSub service.
     """
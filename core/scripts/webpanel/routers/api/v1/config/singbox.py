@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException
 from ..schema.response import DetailResponse
 from ..schema.config.singbox import StartInputBody
 import cli_api
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.post('/start', response_model=DetailResponse, summary='Start Singbox')
-async def singbox_start_api(body: StartInputBody):
+def singbox_start_api(body: StartInputBody):
     """
     Start the Singbox service.
 
@@ -27,7 +28,7 @@ async def singbox_start_api(body: StartInputBody):
 
 
 @router.delete('/stop', response_model=DetailResponse, summary='Stop Singbox')
-async def singbox_stop_api():
+def singbox_stop_api():
     """
     Stop the Singbox service.
 
@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException
 from ..schema.response import DetailResponse
 from ..schema.config.telegram import StartInputBody, SetIntervalInputBody, BackupIntervalResponse
 import cli_api
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.post('/start', response_model=DetailResponse, summary='Start Telegram Bot')
-async def telegram_start_api(body: StartInputBody):
+def telegram_start_api(body: StartInputBody):
     """
     Starts the Telegram bot.
 
@@ -25,7 +26,7 @@ async def telegram_start_api(body: StartInputBody):
 
 
 @router.delete('/stop', response_model=DetailResponse, summary='Stop Telegram Bot')
-async def telegram_stop_api():
+def telegram_stop_api():
     """
     Stops the Telegram bot.
 
@@ -41,7 +42,7 @@ async def telegram_stop_api():
 
 
 @router.get('/backup-interval', response_model=BackupIntervalResponse, summary='Get Telegram Bot Backup Interval')
-async def telegram_get_interval_api():
+def telegram_get_interval_api():
     """
     Gets the current automatic backup interval for the Telegram bot.
 
@@ -56,7 +57,7 @@ async def telegram_get_interval_api():
 
 
 @router.post('/backup-interval', response_model=DetailResponse, summary='Set Telegram Bot Backup Interval')
-async def telegram_set_interval_api(body: SetIntervalInputBody):
+def telegram_set_interval_api(body: SetIntervalInputBody):
     """
     Sets the automatic backup interval for the Telegram bot.
 
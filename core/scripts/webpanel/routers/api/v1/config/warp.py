@@ -4,12 +4,14 @@ from ..schema.response import DetailResponse
 from ..schema.config.warp import ConfigureInputBody, StatusResponse
 
 import cli_api
+from executor import ExecutorRoute, operation
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.post('/install', response_model=DetailResponse, summary='Install WARP', name="install_warp")
-async def install():
+@operation('warp')
+def install():
     """
     Installs WARP.
     It's post method because keeping backward compatibility if we need to add parameters in the future.
@@ -28,7 +30,8 @@ async def install():
 
 
 @router.delete('/uninstall', response_model=DetailResponse, summary='Uninstall WARP', name="uninstall_warp")
-async def uninstall():
+@operation('warp')
+def uninstall():
     """
     Uninstalls WARP.
 
@@ -46,7 +49,8 @@ async def uninstall():
 
 
 @router.post('/configure', response_model=DetailResponse, summary='Configure WARP', name="configure_warp")
-async def configure(body: ConfigureInputBody):
+@operation('warp')
+def configure(body: ConfigureInputBody):
     """
     Configures WARP with the given options.
 
@@ -77,7 +81,7 @@ async def configure(body: ConfigureInputBody):
 
 
 @router.get('/status', response_model=StatusResponse, summary='Get WARP Status', name="status_warp")
-async def status():
+def status():
     try:
         status_json_str = cli_api.warp_status()
         if not status_json_str:
@@ -23,4 +23,10 @@ class GetObfsResponse(BaseModel):
     obfs: str
     
 class GetMasqueradeStatusResponse(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+class RestoreProgressResponse(BaseModel):
+    state: str
+    percent: int
+    message: str
+    updated_at: float
@@ -41,6 +41,7 @@ class Node(BaseModel):
     pinSHA256: Optional[str] = None
     obfs: Optional[str] = None
     insecure: Optional[bool] = False
+    health_url: Optional[str] = None
 
     @field_validator('ip', mode='before')
     def check_node_ip(cls, v: str | None):
@@ -84,13 +85,32 @@ class Node(BaseModel):
             raise ValueError("Invalid SHA256 pin format.")
         return v_stripped
 
+    @field_validator('health_url', mode='before')
+    def check_health_url(cls, v: str | None):
+        if v is None or not v.strip():
+            return None
+        v = v.strip()
+        if not v.startswith(('http://', 'https://')):
+            raise ValueError("Health URL must start with http:// or https://.")
+        return v
+
 class AddNodeBody(Node):
     pass
 
 class DeleteNodeBody(BaseModel):
     name: str
 
-NodeListResponse = list[Node]
+class NodeHealth(BaseModel):
+    status: str = 'unknown'
+    rtt_ms: Optional[float] = None
+    checked_at: Optional[int] = None
+    last_push_at: Optional[int] = None
+    error: Optional[str] = None
+
+class NodeWithHealth(Node):
+    health: NodeHealth = NodeHealth()
+
+NodeListResponse = list[NodeWithHealth]
 
 class NodeUserTraffic(BaseModel):
     username: str
@@ -111,4 +131,5 @@ class NodeUserTraffic(BaseModel):
             raise ValueError("account_creation_date must be in YYYY-MM-DD format.")
 
 class NodesTrafficPayload(BaseModel):
+    node_name: Optional[str] = None
     users: List[NodeUserTraffic]
\ No newline at end of file
@@ -50,4 +50,30 @@ class VersionCheckResponse(BaseModel):
     is_latest: bool
     current_version: str
     latest_version: str
-    changelog: str
\ No newline at end of file
+    changelog: str
+
+
+class ExecutorOperationMetrics(BaseModel):
+    calls: int
+    errors: int
+    queued: int
+    running: int
+    wait_avg: float
+    wait_max: float
+    exec_avg: float
+    exec_max: float
+
+
+ExecutorMetricsResponse = dict[str, ExecutorOperationMetrics]
+
+
+class CommandTimingEntry(BaseModel):
+    script: str
+    command: str
+    started_at: float
+    duration: float
+    exit_status: Optional[int] = None
+    output_bytes: int
+
+
+RecentCommandsResponse = list[CommandTimingEntry]
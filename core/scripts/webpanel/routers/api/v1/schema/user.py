@@ -1,6 +1,6 @@
 import re
-from typing import Optional, List
-from pydantic import BaseModel, RootModel, Field, field_validator
+from typing import Optional, List, Literal
+from pydantic import BaseModel, RootModel, Field, field_validator, model_validator
 
 
 class UserInfoResponse(BaseModel):
@@ -72,6 +72,47 @@ class EditUserInputBody(BaseModel):
             raise ValueError('Username can only contain letters, numbers, and underscores.')
         return v
 
+class BulkEditUsersInputBody(BaseModel):
+    operation: Literal['block', 'unblock', 'extend', 'reset', 'set-quota']
+    usernames: Optional[List[str]] = Field(None, description="Users to change. Takes precedence over the filters.")
+    status: Optional[Literal['Online', 'Offline', 'On-hold']] = Field(None, description="Filter: only users with this status.")
+    blocked: Optional[bool] = Field(None, description="Filter: only blocked or unblocked users.")
+    prefix: Optional[str] = Field(None, description="Filter: only usernames starting with this prefix.")
+    days: Optional[int] = Field(None, description="Days to add for 'extend'.")
+    traffic_limit: Optional[float] = Field(None, description="New traffic limit in GB for 'set-quota'. 0 means unlimited.")
+
+    @field_validator('prefix')
+    def validate_prefix(cls, v):
+        if v and not re.match(r"^[a-zA-Z0-9_]*$", v):
+            raise ValueError('Prefix can only contain letters, numbers, and underscores.')
+        return v
+
+    @model_validator(mode='after')
+    def validate_operation(self):
+        if not self.usernames and not (self.status or self.blocked is not None or self.prefix):
+            raise ValueError('Provide usernames or at least one filter.')
+        if self.operation == 'extend' and (self.days is None or self.days <= 0):
+            raise ValueError("'extend' requires a positive number of days.")
+        if self.operation == 'set-quota' and (self.traffic_limit is None or self.traffic_limit < 0):
+            raise ValueError("'set-quota' requires a non-negative traffic limit.")
+        return self
+
+class BulkEditUsersResponse(BaseModel):
+    matched: int
+    modified: int
+    kicked: int
+
+class TrafficBucket(BaseModel):
+    ts: str
+    upload_bytes: int
+    download_bytes: int
+
+class TopUserResponse(BaseModel):
+    username: str
+    upload_bytes: int
+    download_bytes: int
+    total_bytes: int
+
 class NodeUri(BaseModel):
     name: str
     uri: str
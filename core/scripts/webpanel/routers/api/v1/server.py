@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException
+import time
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Response
 import cli_api
-from .schema.server import ServerStatusResponse, ServerServicesStatusResponse, VersionCheckResponse, VersionInfoResponse
+import profiler
+from .schema.server import ServerStatusResponse, ServerServicesStatusResponse, VersionCheckResponse, VersionInfoResponse, ExecutorMetricsResponse, RecentCommandsResponse
+from executor import ExecutorRoute, get_executor, operation
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.get('/status', response_model=ServerStatusResponse)
-async def server_status_api():
+def server_status_api():
     """
     Retrieve the server status.
 
@@ -136,7 +140,7 @@ def __parse_server_status(server_info: str) -> ServerStatusResponse:
 
 
 @router.get('/services/status', response_model=ServerServicesStatusResponse)
-async def server_services_status_api():
+def server_services_status_api():
     """
     Retrieve the status of various services.
 
@@ -181,7 +185,7 @@ def __parse_services_status(services_status: dict[str, bool]) -> ServerServicesS
     return ServerServicesStatusResponse(**parsed_services_status)
 
 @router.get('/version', response_model=VersionInfoResponse)
-async def get_version_info():
+def get_version_info():
     """Retrieves the current version of the panel and Hysteria core."""
     try:
         version_output = cli_api.show_version()
@@ -207,7 +211,7 @@ async def get_version_info():
 
 
 @router.get('/version/check', response_model=VersionCheckResponse)
-async def check_version_info():
+def check_version_info():
     """Checks for updates and retrieves version information."""
     try:
         check_output = cli_api.check_version()
@@ -233,4 +237,55 @@ async def check_version_info():
         raise HTTPException(status_code=404, detail="Version information not found")
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get('/executor/metrics', response_model=ExecutorMetricsResponse, summary='Get Blocking Call Executor Metrics')
+async def executor_metrics_api():
+    """
+    Returns per-operation counters for blocking handler calls: call and error counts,
+    calls currently queued or running, and average and max queue-wait and execution times in seconds.
+    """
+    return get_executor().snapshot()
+
+
+@router.get('/commands/recent', response_model=RecentCommandsResponse, summary='Get Recent Command Timings')
+async def recent_commands_api(limit: int = Query(20, ge=1, le=cli_api.RECENT_COMMANDS_SIZE), slowest: bool = True):
+    """
+    Returns the commands this web panel worker ran most recently through cli_api, with
+    wall time in seconds, exit status (null if the command could not be started) and
+    output size, slowest first unless `slowest` is false. Only the last
+    RECENT_COMMANDS_SIZE commands are kept, and each worker keeps its own.
+    """
+    return cli_api.recent_commands(limit, slowest)
+
+
+@router.get('/profile', response_class=Response, summary='Profile a Panel Service')
+@operation('profile')
+def profile_api(
+    target: Literal['webpanel', 'normalsub', 'traffic'] = 'webpanel',
+    seconds: int = Query(10, ge=1, le=profiler.MAX_SECONDS),
+    fmt: Literal['collapsed', 'speedscope'] = Query('collapsed', alias='format'),
+):
+    """
+    Samples a service's Python stacks for `seconds` and returns them as a download.
+
+    `collapsed` is one "frame;frame count" line per stack (flamegraph.pl, speedscope);
+    `speedscope` is a JSON file for https://www.speedscope.app. The traffic tick runs
+    once a minute, so profile `traffic` for at least 60 seconds. With several web panel
+    workers, `webpanel` profiles the worker that serves this request.
+
+    Raises:
+        HTTPException: 400 if the service could not be profiled.
+    """
+    try:
+        if target == 'webpanel':
+            content = profiler.profile_for(seconds).render(fmt, 'webpanel')
+        else:
+            content = cli_api.profile_service(target, seconds, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+    extension, media_type = ('speedscope.json', 'application/json') if fmt == 'speedscope' else ('collapsed.txt', 'text/plain')
+    filename = f'{target}-{time.strftime("%Y%m%d_%H%M%S")}.{extension}'
+    return Response(content=content, media_type=media_type, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
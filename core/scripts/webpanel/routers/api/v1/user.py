@@ -1,6 +1,6 @@
 import json
-from typing import List
-from fastapi import APIRouter, HTTPException
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
 from .schema.user import (
     UserListResponse, 
     UserInfoResponse, 
@@ -8,16 +8,22 @@ from .schema.user import (
     EditUserInputBody, 
     UserUriResponse, 
     AddBulkUsersInputBody, 
-    UsernamesRequest
+    UsernamesRequest,
+    BulkEditUsersInputBody,
+    BulkEditUsersResponse,
+    TrafficBucket,
+    TopUserResponse
 )
 from .schema.response import DetailResponse
 import cli_api
+from db.async_database import async_db
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.get('/', response_model=UserListResponse)
-async def list_users_api():
+def list_users_api():
     """
     Get a list of all users.
 
@@ -35,7 +41,7 @@ async def list_users_api():
 
 
 @router.post('/', response_model=DetailResponse, status_code=201)
-async def add_user_api(body: AddUserInputBody):
+def add_user_api(body: AddUserInputBody):
     try:
         cli_api.get_user(body.username)
         raise HTTPException(status_code=409,
@@ -66,7 +72,7 @@ async def add_user_api(body: AddUserInputBody):
 
 
 @router.post('/bulk/', response_model=DetailResponse, status_code=201)
-async def add_bulk_users_api(body: AddBulkUsersInputBody):
+def add_bulk_users_api(body: AddBulkUsersInputBody):
     """
     Add multiple users in bulk.
     """
@@ -88,7 +94,7 @@ async def add_bulk_users_api(body: AddBulkUsersInputBody):
                             detail=f"An unexpected error occurred while adding bulk users: {str(e)}")
 
 @router.post('/uri/bulk', response_model=List[UserUriResponse])
-async def show_multiple_user_uris_api(request: UsernamesRequest):
+def show_multiple_user_uris_api(request: UsernamesRequest):
     """
     Get URI information for multiple users in a single request for efficiency.
     """
@@ -112,18 +118,62 @@ async def show_multiple_user_uris_api(request: UsernamesRequest):
 
 
 @router.post('/bulk-delete', response_model=DetailResponse)
-async def bulk_remove_users_api(body: UsernamesRequest):
+def bulk_remove_users_api(body: UsernamesRequest):
     if not body.usernames:
         raise HTTPException(status_code=400, detail="No usernames provided.")
     try:
         cli_api.kick_users_by_name(body.usernames)
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_users_traffic(body.usernames)
         cli_api.remove_users(body.usernames)
         return DetailResponse(detail=f'Users have been removed.')
     except Exception as e:
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 
+@router.post('/bulk-edit', response_model=BulkEditUsersResponse)
+def bulk_edit_users_api(body: BulkEditUsersInputBody):
+    """
+    Apply one operation to many users at once.
+
+    Targets are the given usernames, or every user matching the status/blocked/prefix filters.
+    The change is written with a single database update, and affected online users are kicked
+    in one batch.
+
+    Returns:
+        Counts of matched, modified and kicked users.
+    """
+    try:
+        return cli_api.bulk_edit_users(body.operation, body.usernames, body.status, body.blocked,
+                                       body.prefix, body.days, body.traffic_limit)
+    except cli_api.InvalidInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+
+@router.get('/top', response_model=List[TopUserResponse])
+def top_users_api(by: Literal['total', 'upload', 'download'] = 'total', limit: int = Query(10, ge=1, le=500),
+                  window: Optional[str] = None):
+    """
+    Get the heaviest users, sorted on the server.
+
+    Args:
+        by: Sort key.
+        limit: Number of users to return.
+        window: Optional range such as 1h, 24h or 7d. Usage in the window is summed from
+            the traffic history; without it the all-time counters are used.
+
+    Returns:
+        Users with their upload, download and total bytes, heaviest first.
+    """
+    try:
+        return cli_api.get_top_traffic_users(since=window, limit=limit, by=by)
+    except cli_api.InvalidInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+
 @router.get('/{username}', response_model=UserInfoResponse)
 async def get_user_api(username: str):
     """
@@ -139,22 +189,18 @@ async def get_user_api(username: str):
         HTTPException: if the user is not found, or if an error occurs.
     """
     try:
-        user_data = cli_api.get_user(username)
-        if not user_data:
-            raise HTTPException(status_code=404, detail=f'User {username} not found.')
-        
-        if '_id' in user_data:
-            user_data['username'] = user_data.pop('_id')
-            
-        return user_data
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse user data from CLI: {e}")
+        user_data = await async_db.get_user(username)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'An unexpected error occurred: {str(e)}')
+    if not user_data:
+        raise HTTPException(status_code=404, detail=f'User {username} not found.')
+
+    user_data['username'] = user_data.pop('_id')
+    return user_data
 
 
 @router.patch('/{username}', response_model=DetailResponse)
-async def edit_user_api(username: str, body: EditUserInputBody):
+def edit_user_api(username: str, body: EditUserInputBody):
     """
     Edit a user's details.
 
@@ -170,7 +216,7 @@ async def edit_user_api(username: str, body: EditUserInputBody):
     """
     try:
         cli_api.kick_users_by_name([username])
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_users_traffic([username])
         cli_api.edit_user(username, body.new_username, body.new_password, body.new_traffic_limit, body.new_expiration_days,
                           body.renew_password, body.renew_creation_date, body.blocked, body.unlimited_ip, body.note)
         return DetailResponse(detail=f'User {username} has been edited.')
@@ -179,7 +225,7 @@ async def edit_user_api(username: str, body: EditUserInputBody):
 
 
 @router.delete('/{username}', response_model=DetailResponse)
-async def remove_user_api(username: str):
+def remove_user_api(username: str):
     """
     Remove a user.
 
@@ -198,7 +244,7 @@ async def remove_user_api(username: str):
             raise HTTPException(status_code=404, detail=f'User {username} not found.')
         
         cli_api.kick_users_by_name([username])
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_users_traffic([username])
         cli_api.remove_users([username])
         return DetailResponse(detail=f'User {username} has been removed.')
     except HTTPException:
@@ -208,7 +254,7 @@ async def remove_user_api(username: str):
 
 
 @router.get('/{username}/reset', response_model=DetailResponse)
-async def reset_user_api(username: str):
+def reset_user_api(username: str):
     """
     Resets a user.
 
@@ -234,7 +280,7 @@ async def reset_user_api(username: str):
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 @router.get('/{username}/uri', response_model=UserUriResponse)
-async def show_user_uri_api(username: str):
+def show_user_uri_api(username: str):
     """
     Get the URI information for a user in JSON format.
 
@@ -264,4 +310,25 @@ async def show_user_uri_api(username: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f'Unexpected error: {str(e)}')
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f'Unexpected error: {str(e)}')
+
+
+@router.get('/{username}/traffic', response_model=List[TrafficBucket])
+def get_user_traffic_history_api(username: str, since: str = '24h', until: Optional[str] = None,
+                                 granularity: Optional[Literal['minute', 'hour', 'day']] = None):
+    """
+    Get a user's upload and download per time bucket.
+
+    Args:
+        username: The username of the user.
+        since: Range start, either a window such as 30m, 24h or 7d, or an ISO date.
+        until: Range end in the same format. Defaults to now.
+        granularity: Bucket size. Picked from the range when omitted.
+
+    Returns:
+        A list of buckets, oldest first.
+    """
+    try:
+        return cli_api.get_user_traffic_history(username, since, until, granularity)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
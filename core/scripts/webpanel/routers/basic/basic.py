@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import PlainTextResponse
 from dependency import get_templates
+import metrics
 
 router = APIRouter()
 
@@ -14,3 +15,9 @@ async def index(request: Request, templates: Jinja2Templates = Depends(get_templ
 @router.get('/robots.txt')
 async def robots_txt(request: Request):
     return PlainTextResponse('User-agent: *\nDisallow: /')
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics_endpoint():
+    # Summed over all worker processes, so counters don't jump between workers' values.
+    return PlainTextResponse(metrics.render_workers('webpanel'), media_type=metrics.CONTENT_TYPE)
@@ -6,8 +6,9 @@ from hashlib import sha256
 from dependency import get_templates, get_session_manager
 from session import SessionManager
 from config import CONFIGS  # type: ignore
+from executor import ExecutorRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
 @router.get('/login')
@@ -16,7 +17,7 @@ async def login(request: Request, templates: Jinja2Templates = Depends(get_templ
 
 
 @router.post('/login')
-async def login_post(
+def login_post(
     request: Request,
     templates: Jinja2Templates = Depends(get_templates), session_manager: SessionManager = Depends(get_session_manager),
     username: str = Form(), password: str = Form()
@@ -39,7 +40,7 @@ async def login_post(
 
 
 @router.get('/logout')
-async def logout(request: Request, session_manager: SessionManager = Depends(get_session_manager)):
+def logout(request: Request, session_manager: SessionManager = Depends(get_session_manager)):
     session_id = request.cookies.get('session_id')
     if session_id:
         session_manager.revoke_session(session_id)
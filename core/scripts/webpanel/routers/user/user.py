@@ -7,12 +7,13 @@ import math
 from dependency import get_templates
 from .viewmodel import User
 import cli_api
+from executor import ExecutorRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=ExecutorRoute)
 
 
-async def get_users_page(
+def get_users_page(
     request: Request,
     templates: Jinja2Templates,
     page: int,
@@ -50,25 +51,25 @@ async def get_users_page(
 
 
 @router.get('/{page}', name="users_paginated")
-async def users_paginated(
+def users_paginated(
     request: Request,
     templates: Jinja2Templates = Depends(get_templates),
     page: int = Path(..., ge=1),
     limit: int = Cookie(default=50, ge=1)
 ):
-    return await get_users_page(request, templates, page, limit)
+    return get_users_page(request, templates, page, limit)
 
 
 @router.get('/', name="users")
-async def users_root(
+def users_root(
     request: Request,
     templates: Jinja2Templates = Depends(get_templates),
     limit: int = Cookie(default=50, ge=1)
 ):
-    return await get_users_page(request, templates, 1, limit)
+    return get_users_page(request, templates, 1, limit)
 
 @router.get("/search/", name="search_users")
-async def search_users(
+def search_users(
     request: Request,
     q: str = Query(""),
     templates: Jinja2Templates = Depends(get_templates)
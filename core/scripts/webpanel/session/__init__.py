@@ -1 +1 @@
-from .session import SessionData, SessionStorage, SessionManager
+from .session import SessionData, SessionStorage, MongoSessionStorage, SessionManager
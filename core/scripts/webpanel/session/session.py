@@ -1,4 +1,6 @@
+import heapq
 import secrets
+import asyncio
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 
@@ -11,29 +13,136 @@ class SessionData(BaseModel):
 
 
 class SessionStorage:
-    '''Abstracts session storage (default: in-memory, can be replaced with Redis).'''
+    '''
+    In-memory session storage with bucketed expiry and a size cap.
 
-    def __init__(self):
-        # The sessions are now stored as a dictionary with SessionData as values
+    Sessions are grouped into fixed-width buckets by expiry time, so a sweep drops
+    whole buckets and costs O(1) per expired session regardless of how many live
+    sessions there are. When the cap is reached the session closest to expiry is evicted.
+    '''
+
+    def __init__(self, max_sessions: int = 10000, bucket_seconds: int = 60):
         self.sessions: dict[str, SessionData] = {}
+        self.max_sessions = max_sessions
+        self.bucket_seconds = bucket_seconds
+        self.__buckets: dict[int, set[str]] = {}
+        self.__bucket_heap: list[int] = []
+        self.__session_bucket: dict[str, int] = {}
+
+    def __bucket_of(self, expires_at: datetime) -> int:
+        # Round up so a bucket is only swept once every session in it has expired.
+        return -(-int(expires_at.timestamp()) // self.bucket_seconds)
+
+    def __unlink(self, session_id: str):
+        bucket = self.__session_bucket.pop(session_id, None)
+        if bucket is not None:
+            members = self.__buckets.get(bucket)
+            if members is not None:
+                members.discard(session_id)
+
+    def __evict_one(self):
+        while self.__bucket_heap:
+            members = self.__buckets.get(self.__bucket_heap[0])
+            if members:
+                self.delete(next(iter(members)))
+                return
+            self.__buckets.pop(heapq.heappop(self.__bucket_heap), None)
 
     def set(self, session_id: str, data: SessionData):
         '''Store the session data with the session_id.'''
+        self.__unlink(session_id)
+        if session_id not in self.sessions and len(self.sessions) >= self.max_sessions:
+            self.sweep()
+            if len(self.sessions) >= self.max_sessions:
+                self.__evict_one()
+
+        bucket = self.__bucket_of(data.expires_at)
+        if bucket not in self.__buckets:
+            self.__buckets[bucket] = set()
+            heapq.heappush(self.__bucket_heap, bucket)
+        self.__buckets[bucket].add(session_id)
+        self.__session_bucket[session_id] = bucket
         self.sessions[session_id] = data
 
     def get(self, session_id: str) -> SessionData | None:
-        '''Retrieve session data by session_id.'''
-        return self.sessions.get(session_id)
+        '''Retrieve session data by session_id. Expired sessions are dropped on access.'''
+        data = self.sessions.get(session_id)
+        if data and data.expires_at <= datetime.now(timezone.utc):
+            self.delete(session_id)
+            return None
+        return data
 
     def delete(self, session_id: str):
         '''Delete a session from storage.'''
+        self.__unlink(session_id)
         self.sessions.pop(session_id, None)
 
+    def sweep(self) -> int:
+        '''Remove every session in buckets that have fully expired. Returns the number removed.'''
+        now_bucket = int(datetime.now(timezone.utc).timestamp()) // self.bucket_seconds
+        removed = 0
+        while self.__bucket_heap and self.__bucket_heap[0] <= now_bucket:
+            for session_id in self.__buckets.pop(heapq.heappop(self.__bucket_heap), ()):
+                self.__session_bucket.pop(session_id, None)
+                if self.sessions.pop(session_id, None) is not None:
+                    removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+class MongoSessionStorage:
+    '''
+    MongoDB-backed session storage, so sessions survive restarts and are shared
+    between webpanel worker processes. A TTL index lets MongoDB remove expired sessions.
+    '''
+
+    def __init__(self, db_name: str = 'blitz_panel', collection_name: str = 'webpanel_sessions', max_sessions: int = 10000):
+        import pymongo
+        # Shares the process-wide client, so sessions use the MONGO_* settings from .configs.env.
+        from db.database import get_client
+
+        self.__pymongo = pymongo
+        self.collection = get_client()[db_name][collection_name]
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+        self.max_sessions = max_sessions
+
+    def set(self, session_id: str, data: SessionData):
+        '''Store the session data with the session_id.'''
+        self.collection.replace_one({'_id': session_id}, {'_id': session_id, **data.model_dump()}, upsert=True)
+        overflow = self.collection.estimated_document_count() - self.max_sessions
+        if overflow > 0:
+            oldest = self.collection.find({}, {'_id': 1}).sort('expires_at', self.__pymongo.ASCENDING).limit(overflow)
+            self.collection.delete_many({'_id': {'$in': [doc['_id'] for doc in oldest]}})
+
+    def get(self, session_id: str) -> SessionData | None:
+        '''Retrieve session data by session_id.'''
+        doc = self.collection.find_one({'_id': session_id, 'expires_at': {'$gt': datetime.now(timezone.utc)}})
+        if not doc:
+            return None
+        doc.pop('_id')
+        for field in ('created_at', 'expires_at'):
+            # pymongo returns naive UTC datetimes unless the client is tz_aware.
+            doc[field] = doc[field].replace(tzinfo=timezone.utc)
+        return SessionData(**doc)
+
+    def delete(self, session_id: str):
+        '''Delete a session from storage.'''
+        self.collection.delete_one({'_id': session_id})
+
+    def sweep(self) -> int:
+        '''Remove expired sessions now instead of waiting for the TTL monitor.'''
+        return self.collection.delete_many({'expires_at': {'$lte': datetime.now(timezone.utc)}}).deleted_count
+
+    def __len__(self) -> int:
+        return self.collection.estimated_document_count()
+
 
 class SessionManager:
     '''Manages user authentication with session storage.'''
 
-    def __init__(self, storage: SessionStorage, expiration_minutes: int = 60):
+    def __init__(self, storage: SessionStorage | MongoSessionStorage, expiration_minutes: int = 60):
         self.storage = storage
         self.expiration = timedelta(minutes=expiration_minutes)
 
@@ -53,3 +162,21 @@ class SessionManager:
     def revoke_session(self, session_id: str):
         '''Removes session from storage.'''
         self.storage.delete(session_id)
+
+    def sweep(self) -> int:
+        '''Removes expired sessions from storage.'''
+        return self.storage.sweep()
+
+    async def run_sweeper(self, interval_seconds: int):
+        '''Periodically sweeps expired sessions until cancelled.'''
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                if isinstance(self.storage, MongoSessionStorage):
+                    # A delete_many round-trip; keep it off the event loop.
+                    await asyncio.to_thread(self.sweep)
+                else:
+                    # The in-memory heap is only touched from the loop, and sweeping it doesn't block.
+                    self.sweep()
+            except Exception as e:
+                print(f'Session sweep failed: {e}')
@@ -417,6 +417,38 @@ change_expiration() {
     fi
 }
 
+change_workers() {
+    local new_workers=$1
+
+    if ! [[ "$new_workers" =~ ^[1-9][0-9]*$ ]]; then
+        echo -e "${red}Usage: $0 changeworkers <WORKER_COUNT>${NC}"
+        exit 1
+    fi
+
+    if [ ! -f "$WEBPANEL_ENV_FILE" ]; then
+        echo -e "${red}Error: Web panel .env file not found. Is the web panel configured?${NC}"
+        exit 1
+    fi
+
+    echo "Setting web panel worker processes to: $new_workers"
+    sudo sed -i "/^WORKERS=/d" "$WEBPANEL_ENV_FILE"
+    echo "WORKERS=$new_workers" | sudo tee -a "$WEBPANEL_ENV_FILE" > /dev/null
+    if [ "$new_workers" -gt 1 ]; then
+        # Sessions must live in MongoDB so every worker can validate them.
+        sudo sed -i "/^SESSION_BACKEND=/d" "$WEBPANEL_ENV_FILE"
+        echo "SESSION_BACKEND=mongo" | sudo tee -a "$WEBPANEL_ENV_FILE" > /dev/null
+    fi
+    # A single worker keeps whatever SESSION_BACKEND is set, so an explicit
+    # SESSION_BACKEND=mongo still keeps logins across restarts.
+
+    echo "Restarting web panel service to apply changes..."
+    if systemctl restart hysteria-webpanel.service; then
+        echo -e "${green}Web panel worker count updated successfully.${NC}"
+    else
+        echo -e "${red}Failed to restart hysteria-webpanel service. Please restart it manually.${NC}"
+    fi
+}
+
 change_root_path() {
     local new_root_path=$1
 
@@ -578,6 +610,9 @@ case "$1" in
     changeroot)
         change_root_path "$2"
         ;;
+    changeworkers)
+        change_workers "$2"
+        ;;
     changedomain)
         shift
         change_port_domain "$@"
@@ -589,7 +624,7 @@ case "$1" in
         show_webpanel_api_token
         ;;
     *)
-        echo -e "${red}Usage: $0 {start|stop|decoy|stopdecoy|resetcreds|changeexp|changeroot|changedomain|url|api-token} [options]${NC}"
+        echo -e "${red}Usage: $0 {start|stop|decoy|stopdecoy|resetcreds|changeexp|changeroot|changeworkers|changedomain|url|api-token} [options]${NC}"
         echo -e "${yellow}start <DOMAIN> <PORT> [ADMIN_USERNAME] [ADMIN_PASSWORD] [EXPIRATION_MINUTES] [DEBUG] [DECOY_PATH]${NC}"
         echo -e "${yellow}stop${NC}"
         echo -e "${yellow}decoy <DOMAIN> <PATH_TO_DECOY_SITE>${NC}"
@@ -597,6 +632,7 @@ case "$1" in
         echo -e "${yellow}resetcreds [-u new_username] [-p new_password]${NC}"
         echo -e "${yellow}changeexp <NEW_EXPIRATION_MINUTES>${NC}"
         echo -e "${yellow}changeroot [NEW_ROOT_PATH] # Generates random if not provided${NC}"
+        echo -e "${yellow}changeworkers <WORKER_COUNT>${NC}"
         echo -e "${yellow}changedomain [-d new_domain] [-p new_port]${NC}"
         echo -e "${yellow}url${NC}"
         echo -e "${yellow}api-token${NC}"
@@ -1,27 +1,45 @@
 #!/usr/bin/env python3
 
-import json
 import os
 import sys
 import fcntl
+import time
 import datetime
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Tuple, NamedTuple
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(SCRIPT_DIR, 'scripts'))
 
-from hysteria2_api import Hysteria2Client
 from db.database import db
+import hysteria_api
+import metrics
+import profiler
 
 CONFIG_FILE = '/etc/hysteria/config.json'
 API_BASE_URL = 'http://127.0.0.1:25413'
 LOCKFILE = "/tmp/hysteria_traffic.lock"
+# Serializes reading and applying stats between the full pass and targeted flushes.
+FLUSH_LOCKFILE = "/tmp/hysteria_traffic_flush.lock"
 
 STATUS_ONLINE = "Online"
 STATUS_OFFLINE = "Offline"
 STATUS_ON_HOLD = "On-hold"
 
+# The tick runs in a fresh process every minute, so its metrics are gauges for the
+# last tick, written to a textfile that the scheduler serves.
+TICK_METRICS = metrics.Registry()
+TICK_DURATION = TICK_METRICS.gauge('blitz_traffic_tick_duration_seconds', 'Duration of the last full traffic pass.')
+TICK_USERS = TICK_METRICS.gauge('blitz_traffic_tick_users', 'Users processed by the last full traffic pass.')
+TICK_ACTIVE_USERS = TICK_METRICS.gauge('blitz_traffic_tick_active_users', 'Users with traffic in the last full traffic pass.')
+TICK_TIMESTAMP = TICK_METRICS.gauge('blitz_traffic_tick_timestamp_seconds', 'Unix time the last full traffic pass finished.')
+TICK_ERRORS = TICK_METRICS.gauge('blitz_traffic_tick_failed', '1 if the last full traffic pass failed to read stats.')
+
+# The user fields each pass reads, so notes, passwords and the rest are never transferred.
+TRAFFIC_FIELDS = ['upload_bytes', 'download_bytes', 'online_count', 'status', 'account_creation_date']
+EXPIRY_FIELDS = TRAFFIC_FIELDS + ['expiration_days', 'max_download_bytes']
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def format_bytes(bytes_val: int) -> str:
@@ -54,27 +72,30 @@ def display_traffic_data(data: Dict[str, Dict[str, Any]]):
         print(f"{user:<15} {green}{formatted_tx:<15}{nc} {cyan}{formatted_rx:<15}{nc} {status:<10}")
         print(separator)
 
+class TrafficDelta(NamedTuple):
+    upload_bytes: int
+    download_bytes: int
+
+@contextmanager
+def flush_lock():
+    with open(FLUSH_LOCKFILE, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 class TrafficManager:
     def __init__(self, db_conn, api_base_url: str):
         self.db = db_conn
-        if self.db is None:
+        if not self.db:
             raise ValueError("Database connection is not available.")
-        self.secret = self._get_secret()
-        if not self.secret:
-            raise ValueError(f"Secret not found or failed to read {CONFIG_FILE}.")
-        self.client = Hysteria2Client(base_url=api_base_url, secret=self.secret)
+        try:
+            self.client = hysteria_api.get_client(base_url=api_base_url, config_path=CONFIG_FILE)
+        except (FileNotFoundError, KeyError, ValueError) as e:
+            raise ValueError(f"Secret not found or failed to read {CONFIG_FILE}: {e}")
         self.today_date = datetime.datetime.now().strftime("%Y-%m-%d")
 
-    @staticmethod
-    def _get_secret() -> Optional[str]:
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-            return config.get('trafficStats', {}).get('secret')
-        except (json.JSONDecodeError, FileNotFoundError):
-            logging.error(f"Could not read or parse secret from {CONFIG_FILE}")
-            return None
-            
     def _get_online_connection_count(self, user_status_from_api: Any) -> int:
         if not hasattr(user_status_from_api, 'is_online') or not user_status_from_api.is_online:
             return 0
@@ -87,15 +108,18 @@ class TrafficManager:
         except TypeError:
             return int(connections_attr) if isinstance(connections_attr, int) else 1
 
-    def process_and_update_traffic(self) -> Dict[str, Any]:
-        try:
-            live_traffic = self.client.get_traffic_stats(clear=True)
-            live_status = self.client.get_online_clients()
-            db_users = {u['_id']: u for u in self.db.get_all_users()}
-        except Exception as e:
-            logging.error(f"Error communicating with Hysteria2 API or DB: {e}")
-            return {}
-
+    @staticmethod
+    def _subtract_offsets(live_traffic: Dict, offsets: Dict[str, Dict]) -> Dict[str, TrafficDelta]:
+        deltas = {}
+        for username, stats in live_traffic.items():
+            offset = offsets.get(username, {})
+            deltas[username] = TrafficDelta(
+                max(stats.upload_bytes - offset.get('upload_bytes', 0), 0),
+                max(stats.download_bytes - offset.get('download_bytes', 0), 0)
+            )
+        return deltas
+
+    def _apply_updates(self, db_users: Dict[str, Dict], live_traffic: Dict, live_status: Dict):
         users_to_update: List[Tuple[str, Dict[str, Any]]] = []
         for username, user_data in db_users.items():
             updates = self._calculate_user_updates(username, user_data, live_traffic, live_status)
@@ -103,12 +127,79 @@ class TrafficManager:
                 users_to_update.append((username, updates))
 
         if users_to_update:
-            for username, update_data in users_to_update:
-                try:
-                    self.db.update_user(username, update_data)
-                    db_users[username].update(update_data)
-                except Exception as e:
-                    logging.error(f"Failed to update user {username} in DB: {e}")
+            with self.db.revision() as rev:
+                for username, update_data in users_to_update:
+                    try:
+                        self.db.update_user(username, update_data, rev=rev)
+                        db_users[username].update(update_data)
+                    except Exception as e:
+                        logging.error(f"Failed to update user {username} in DB: {e}")
+
+        try:
+            self.db.record_traffic({
+                username: (delta.upload_bytes, delta.download_bytes)
+                for username, delta in live_traffic.items() if username in db_users
+            })
+        except Exception as e:
+            logging.error(f"Failed to record traffic history: {e}")
+
+    def process_and_update_traffic(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        # The profile is written before the lock is released, so waiting on the
+        # lock is enough to know a profiled pass has been recorded.
+        with flush_lock(), profiler.profile_if_requested('traffic'):
+            try:
+                live_traffic = self.client.get_traffic_stats(clear=True)
+                live_status = self.client.get_online_clients()
+                db_users = {u['_id']: u for u in self.db.iter_users(fields=TRAFFIC_FIELDS)}
+                # Bytes already applied by targeted flushes since the last clear.
+                live_traffic = self._subtract_offsets(live_traffic, self.db.get_traffic_offsets())
+                self.db.clear_traffic_offsets()
+            except Exception as e:
+                logging.error(f"Error communicating with Hysteria2 API or DB: {e}")
+                TICK_ERRORS.set(1)
+                self._write_tick_metrics()
+                return {}
+
+            self._apply_updates(db_users, live_traffic, live_status)
+
+        TICK_ERRORS.set(0)
+        TICK_DURATION.set(time.perf_counter() - start)
+        TICK_USERS.set(len(db_users))
+        TICK_ACTIVE_USERS.set(len(live_traffic))
+        self._write_tick_metrics()
+        return db_users
+
+    def _write_tick_metrics(self):
+        TICK_TIMESTAMP.set(time.time())
+        try:
+            metrics.write_textfile('traffic', TICK_METRICS)
+        except OSError as e:
+            logging.warning(f"Could not write traffic metrics: {e}")
+
+    def flush_users(self, usernames: List[str]) -> Dict[str, Any]:
+        """
+        Applies unflushed traffic for the given users only.
+
+        The stats API can only clear all counters at once, so this reads them without
+        clearing and records how much was applied per user as an offset. The next full
+        pass subtracts the offsets before adding its deltas and then drops them.
+        """
+        usernames = [username.lower() for username in usernames]
+        with flush_lock():
+            try:
+                live_traffic = {u: s for u, s in self.client.get_traffic_stats(clear=False).items() if u in usernames}
+                live_status = self.client.get_online_clients()
+                db_users = {u['_id']: u for u in self.db.get_users(usernames, fields=TRAFFIC_FIELDS)}
+                offsets = self.db.get_traffic_offsets(list(live_traffic))
+            except Exception as e:
+                logging.error(f"Error communicating with Hysteria2 API or DB: {e}")
+                return {}
+
+            self._apply_updates(db_users, self._subtract_offsets(live_traffic, offsets), live_status)
+            self.db.set_traffic_offsets({
+                username: (stats.upload_bytes, stats.download_bytes) for username, stats in live_traffic.items()
+            })
         return db_users
 
     def _calculate_user_updates(self, username: str, user_data: Dict, live_traffic: Dict, live_status: Dict) -> Dict[str, Any]:
@@ -121,6 +212,7 @@ class TrafficManager:
         if username in live_traffic:
             updates['upload_bytes'] = user_data.get('upload_bytes', 0) + live_traffic[username].upload_bytes
             updates['download_bytes'] = user_data.get('download_bytes', 0) + live_traffic[username].download_bytes
+            updates['total_bytes'] = updates['upload_bytes'] + updates['download_bytes']
 
         is_activated = "account_creation_date" in user_data
         has_activity = is_online or (username in live_traffic and (live_traffic[username].upload_bytes > 0 or live_traffic[username].download_bytes > 0))
@@ -139,7 +231,9 @@ class TrafficManager:
 
     def kick_expired_users(self):
         try:
-            all_users = self.db.get_all_users()
+            # Blocked and never-activated users can't expire, so they are skipped by the query.
+            all_users = list(self.db.iter_users(
+                fields=EXPIRY_FIELDS, filter={'blocked': {'$ne': True}, 'account_creation_date': {'$exists': True}}))
         except Exception as e:
             logging.error(f"Failed to fetch users for expiration check: {e}")
             return
@@ -163,19 +257,18 @@ class TrafficManager:
             except (ValueError, TypeError): continue
         
         if users_to_block:
-            for username in users_to_block:
-                self.db.update_user(username, {'blocked': True, 'status': STATUS_OFFLINE, 'online_count': 0})
+            with self.db.revision() as rev:
+                for username in users_to_block:
+                    self.db.update_user(username, {'blocked': True, 'status': STATUS_OFFLINE, 'online_count': 0}, rev=rev)
         
         if users_to_kick:
-            for i in range(0, len(users_to_kick), 50):
-                self._kick_api_call(users_to_kick[i:i+50])
-
-    def _kick_api_call(self, usernames: List[str]):
-        try:
-            self.client.kick_clients(usernames)
-            logging.info(f"Successfully kicked users: {', '.join(usernames)}")
-        except Exception as e:
-            logging.error(f"Failed to kick users via API: {e}")
+            failures = hysteria_api.kick_clients(users_to_kick, client=self.client)
+            for batch, e in failures:
+                logging.error(f"Failed to kick users via API: {', '.join(batch)}: {e}")
+            failed = {username for batch, _ in failures for username in batch}
+            kicked = [username for username in users_to_kick if username not in failed]
+            if kicked:
+                logging.info(f"Successfully kicked users: {', '.join(kicked)}")
 
 
 def traffic_status(no_gui=False) -> Optional[Dict[str, Any]]:
@@ -193,6 +286,18 @@ def traffic_status(no_gui=False) -> Optional[Dict[str, Any]]:
         logging.critical(str(e))
         return None
 
+def flush_users_traffic(usernames: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Saves unflushed traffic for just these users, without a full pass over every user.
+    Meant to run before a user is edited or removed.
+    """
+    try:
+        manager = TrafficManager(db_conn=db, api_base_url=API_BASE_URL)
+        return manager.flush_users(usernames)
+    except ValueError as e:
+        logging.critical(str(e))
+        return None
+
 def kick_expired_users():
     """
     Finds and kicks users who have expired by date or traffic limit.
@@ -307,11 +307,9 @@ migrate_json_to_mongo
 # ========== Systemd Services ==========
 info "Ensuring systemd services are configured..."
 if source "$HYSTERIA_INSTALL_DIR/core/scripts/scheduler.sh"; then
-    if ! check_auth_server_service; then
-        setup_hysteria_auth_server && success "Auth server service configured." || warn "Auth server setup failed."
-    else
-        success "Auth server service already configured."
-    fi
+    # The unit is rewritten even when the service is running, so installs that predate
+    # its EnvironmentFile line pick up MONGO_URI from .configs.env on the restart below.
+    setup_hysteria_auth_server && success "Auth server service configured." || warn "Auth server setup failed."
 
     if ! check_scheduler_service; then
         setup_hysteria_scheduler && success "Scheduler service configured." || warn "Scheduler setup failed."